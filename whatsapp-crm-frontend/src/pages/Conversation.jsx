@@ -180,14 +180,22 @@ export default function ConversationsPage() {
   const inputRef = useRef(null);
   const { accessToken } = useAuth();
 
+  // Last stream position seen; reconnects resume from it instead of reloading the conversation.
+  const lastSeqRef = useRef(null);
+
   // WebSocket Setup
   const getSocketUrl = useCallback(() => {
     if (accessToken && selectedContact?.id) {
-      return `${API_BASE_URL.replace(/^http/, 'ws')}/ws/conversations/${selectedContact.id}/?token=${accessToken}`;
+      const since = lastSeqRef.current ? `&since=${lastSeqRef.current}` : '';
+      return `${API_BASE_URL.replace(/^http/, 'ws')}/ws/conversations/${selectedContact.id}/?token=${accessToken}${since}`;
     }
     return null;
   }, [accessToken, selectedContact]);
 
+  useEffect(() => {
+    lastSeqRef.current = null;
+  }, [selectedContact?.id]);
+
   const { sendJsonMessage, lastJsonMessage, readyState } = useWebSocket(getSocketUrl, {
     onOpen: () => console.log(`WebSocket opened for contact ${selectedContact?.id}`),
     onClose: () => console.log(`WebSocket closed for contact ${selectedContact?.id}`),
@@ -241,18 +249,39 @@ export default function ConversationsPage() {
   useEffect(() => {
     if (!lastJsonMessage) return;
 
-    const { type, message, contact: updatedContactData } = lastJsonMessage;
+    const { type, message, messages: messageBatch, contact: updatedContactData, seq } = lastJsonMessage;
+    if (seq && seq > (lastSeqRef.current || 0)) {
+      lastSeqRef.current = seq;
+    }
+
+    const upsertMessages = (incoming) => {
+      setMessages(prevMessages => {
+        const updatedMessages = [...prevMessages];
+        incoming.forEach(message => {
+          const existingMessageIndex = updatedMessages.findIndex(msg => msg.id === message.id);
+          if (existingMessageIndex !== -1) {
+            updatedMessages[existingMessageIndex] = { ...updatedMessages[existingMessageIndex], ...message };
+          } else {
+            updatedMessages.push(message);
+          }
+        });
+        return updatedMessages;
+      });
+    };
 
     if (type === 'new_message' && message) {
+      upsertMessages([message]);
+    } else if (type === 'new_messages' && Array.isArray(messageBatch)) {
+      upsertMessages(messageBatch);
+    } else if (type === 'message_updates' && Array.isArray(messageBatch)) {
+      // Status deltas only apply to messages already on screen.
       setMessages(prevMessages => {
-        const existingMessageIndex = prevMessages.findIndex(msg => msg.id === message.id);
-        if (existingMessageIndex !== -1) {
-          const updatedMessages = [...prevMessages];
-          updatedMessages[existingMessageIndex] = message;
-          return updatedMessages;
-        }
-        return [...prevMessages, message];
+        const updatesById = new Map(messageBatch.map(update => [update.id, update]));
+        return prevMessages.map(msg => updatesById.has(msg.id) ? { ...msg, ...updatesById.get(msg.id) } : msg);
       });
+    } else if (type === 'resync_required' && selectedContact?.id) {
+      // Too much was missed while disconnected to catch up incrementally.
+      fetchMessages(selectedContact.id);
     } else if (type === 'contact_updated' && updatedContactData && selectedContact?.id === updatedContactData.id) {
       // Update the selected contact in the main panel
       setSelectedContact(updatedContactData);
@@ -261,7 +290,7 @@ export default function ConversationsPage() {
         prevContacts.map(c => c.id === updatedContactData.id ? { ...c, ...updatedContactData } : c)
       );
     }
-  }, [lastJsonMessage, selectedContact?.id, setContacts, setSelectedContact]);
+  }, [lastJsonMessage, selectedContact?.id, setContacts, setSelectedContact, fetchMessages]);
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
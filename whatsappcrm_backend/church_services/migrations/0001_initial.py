@@ -0,0 +1,101 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('conversations', '0004_message_payload_split'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField(blank=True, null=True)),
+                ('location', models.CharField(blank=True, max_length=255)),
+                ('registration_fee', models.DecimalField(decimal_places=2, default=0.0, help_text='Set to 0 for free events.', max_digits=10)),
+                ('payment_instructions', models.TextField(blank=True, help_text='Specific payment instructions for this event. If blank, the default church giving details will be used in flows.', null=True, verbose_name='Payment Instructions')),
+                ('registration_link', models.URLField(blank=True, help_text='Optional link for more info or external registration.', null=True, verbose_name='External Registration Link')),
+                ('is_active', models.BooleanField(default=True, help_text='Whether the event is publicly visible.')),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, help_text='Optional: Latitude for the event location.', max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, help_text='Optional: Longitude for the event location.', max_digits=10, null=True)),
+                ('flyer', models.ImageField(blank=True, help_text='Optional flyer or picture for the event.', null=True, upload_to='event_flyers/%Y/%m/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Event',
+                'verbose_name_plural': 'Events',
+                'ordering': ['start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Ministry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150)),
+                ('description', models.TextField()),
+                ('leader_name', models.CharField(blank=True, max_length=150)),
+                ('contact_info', models.CharField(blank=True, help_text='e.g., Phone number or email', max_length=150)),
+                ('meeting_schedule', models.CharField(blank=True, help_text="e.g., 'Tuesdays at 7 PM in the main hall'", max_length=255)),
+                ('is_active', models.BooleanField(default=True, help_text='Whether the ministry is currently active and listed.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Ministry',
+                'verbose_name_plural': 'Ministries',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Sermon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('preacher', models.CharField(max_length=150)),
+                ('sermon_date', models.DateField()),
+                ('video_link', models.URLField(blank=True, help_text='Link to YouTube, Vimeo, etc.', max_length=500)),
+                ('audio_link', models.URLField(blank=True, max_length=500)),
+                ('description', models.TextField(blank=True)),
+                ('is_published', models.BooleanField(default=False, help_text='Make this sermon visible to the public.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Sermon',
+                'verbose_name_plural': 'Sermons',
+                'ordering': ['-sermon_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EventBooking',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('booking_reference', models.CharField(blank=True, editable=False, help_text='Unique, human-readable reference for the booking.', max_length=20, null=True, unique=True)),
+                ('number_of_tickets', models.PositiveIntegerField(default=1, help_text='The number of tickets booked in this transaction.', verbose_name='Number of Tickets')),
+                ('booking_date', models.DateTimeField(auto_now_add=True)),
+                ('booking_source', models.CharField(choices=[('whatsapp_flow', 'WhatsApp Flow'), ('admin_panel', 'Admin Panel'), ('web_form', 'Web Form'), ('other', 'Other')], default='whatsapp_flow', help_text='How this booking was created.', max_length=20)),
+                ('status', models.CharField(choices=[('confirmed', 'Confirmed'), ('pending_payment_verification', 'Pending Payment Verification'), ('cancelled', 'Cancelled'), ('attended', 'Attended')], default='confirmed', max_length=30)),
+                ('check_in_time', models.DateTimeField(blank=True, help_text='Timestamp of when the contact was checked in at the event.', null=True)),
+                ('notes', models.TextField(blank=True, help_text='Internal notes about the booking.', null=True)),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_bookings', to='conversations.contact')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='church_services.event')),
+            ],
+            options={
+                'verbose_name': 'Event Booking',
+                'verbose_name_plural': 'Event Bookings',
+                'ordering': ['-booking_date'],
+            },
+        ),
+    ]
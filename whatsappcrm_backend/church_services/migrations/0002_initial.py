@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('church_services', '0001_initial'),
+        ('customer_data', '0003_members_payments_and_prayer_requests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventbooking',
+            name='payment',
+            field=models.OneToOneField(blank=True, help_text='Link to the payment record for this booking, if applicable.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='event_booking', to='customer_data.payment'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventbooking',
+            unique_together={('event', 'contact')},
+        ),
+    ]
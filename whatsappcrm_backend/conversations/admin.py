@@ -1,20 +1,23 @@
 # whatsappcrm_backend/conversations/admin.py
 
 from django.contrib import admin
-from .models import Contact, Message, Broadcast, BroadcastRecipient
+from django.contrib.admin.views.main import ChangeList
+from .models import Contact, Message, Broadcast, BroadcastRecipient, ArchiveSegment
+from .services import get_live_broadcast_counters, load_buffered_broadcast_counters
 
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ('whatsapp_id', 'name', 'user', 'first_seen', 'last_seen', 'is_blocked', 'associated_app_config_name')
     search_fields = ('whatsapp_id', 'name', 'user__username', 'user__email')
     list_filter = ('is_blocked', 'last_seen', 'first_seen', 'associated_app_config') # Add 'associated_app_config' if using the FK
-    readonly_fields = ('first_seen', 'last_seen')
+    readonly_fields = ('first_seen', 'last_seen', 'last_message_at', 'last_message_preview', 'last_message_direction', 'unread_inbound_count')
     autocomplete_fields = ['user']
     fieldsets = (
         (None, {'fields': ('whatsapp_id', 'name', 'is_blocked')}),
         ('Association', {'fields': ('associated_app_config', 'user')}),
         # ('Details', {'fields': ('custom_fields',)}),
         ('Timestamps', {'fields': ('first_seen', 'last_seen'), 'classes': ('collapse',)}),
+        ('Inbox Summary', {'fields': ('last_message_at', 'last_message_preview', 'last_message_direction', 'unread_inbound_count'), 'classes': ('collapse',)}),
     )
 
     def associated_app_config_name(self, obj):
@@ -42,12 +45,16 @@ class MessageInline(admin.TabularInline): # Or admin.StackedInline for a differe
         return "N/A"
     text_content_preview.short_description = "Content Preview"
 
+    def get_queryset(self, request):
+        # The preview of non-text messages reads their payload.
+        return super().get_queryset(request).select_related('payload')
+
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('id', 'contact_link', 'direction', 'message_type', 'status', 'timestamp', 'wamid_short', 'app_config')
     list_filter = ('timestamp', 'direction', 'message_type', 'status', 'contact__name', 'app_config') # Add 'app_config' if using the FK
-    search_fields = ('wamid', 'text_content', 'contact__whatsapp_id', 'contact__name', 'content_payload') # Be careful with JSON search
+    search_fields = ('wamid', 'text_content', 'contact__whatsapp_id', 'contact__name', 'payload__content_payload') # Be careful with JSON search
     readonly_fields = ('contact', 'app_config', 'wamid', 'direction', 'message_type', 'content_payload', 'timestamp', 'status_timestamp', 'error_details') # 'app_config'
     date_hierarchy = 'timestamp'
     list_per_page = 25
@@ -89,13 +96,43 @@ class BroadcastRecipientInline(admin.TabularInline):
     def has_add_permission(self, request, obj=None):
         return False
 
+class BroadcastChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # One Redis pipeline for the page's live counters instead of a round trip per row.
+        load_buffered_broadcast_counters(self.result_list)
+
 @admin.register(Broadcast)
 class BroadcastAdmin(admin.ModelAdmin):
-    list_display = ('name', 'template_name', 'status', 'total_recipients', 'sent_count', 'delivered_count', 'read_count', 'failed_count', 'created_at', 'created_by')
+    list_display = ('name', 'template_name', 'status', 'total_recipients', 'sent_count', 'delivered_count', 'read_count', 'failed_count', 'live_progress', 'created_at', 'created_by')
     list_filter = ('status', 'template_name', 'created_at')
     search_fields = ('name', 'template_name', 'created_by__username')
-    readonly_fields = ('created_at', 'created_by', 'total_recipients', 'pending_dispatch_count', 'sent_count', 'delivered_count', 'read_count', 'failed_count')
+    readonly_fields = ('created_at', 'created_by', 'total_recipients', 'pending_dispatch_count', 'sent_count', 'delivered_count', 'read_count', 'failed_count', 'live_progress')
     inlines = [BroadcastRecipientInline]
 
+    @admin.display(description="Live Progress")
+    def live_progress(self, obj):
+        # Includes counter deltas not yet flushed from Redis.
+        counters = get_live_broadcast_counters(obj)
+        return (
+            f"{counters['sent_count']} sent / {counters['delivered_count']} delivered / "
+            f"{counters['read_count']} read / {counters['failed_count']} failed "
+            f"({counters['pending_dispatch_count']} pending)"
+        )
+
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('created_by')
+
+    def get_changelist(self, request, **kwargs):
+        return BroadcastChangeList
+
+
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ('path', 'kind', 'month', 'row_count', 'first_timestamp', 'last_timestamp', 'created_at')
+    list_filter = ('kind', 'month')
+    search_fields = ('path',)
+    readonly_fields = [field.name for field in ArchiveSegment._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,277 @@
+# whatsappcrm_backend/conversations/archive.py
+
+import gzip
+import json
+import logging
+import tempfile
+import time
+from datetime import date
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, InvalidStorageError, storages
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+
+from .models import PAYLOAD_FIELDS, ArchiveSegment, Contact, Message, save_message_payloads
+
+logger = logging.getLogger(__name__)
+
+# Rows go to gzipped JSON Lines files, one or more per month and table:
+#   <kind>/<YYYY>/<MM>/<first id>-<last id>.jsonl.gz
+# Each file is recorded as an ArchiveSegment together with the WhatsApp IDs of the
+# contacts it covers, so restoring one contact only reads the files that hold it.
+# Rows are only deleted once the file holding them has been stored.
+
+FETCH_BATCH_SIZE = 1000
+MAX_ROWS_PER_FILE = getattr(settings, 'ARCHIVE_MAX_ROWS_PER_FILE', 50000)
+
+
+def archive_storage():
+    # An 'archive' entry in STORAGES (e.g. an S3 bucket through django-storages) takes
+    # precedence; otherwise files go to ARCHIVE_ROOT on local disk.
+    try:
+        return storages['archive']
+    except InvalidStorageError:
+        return FileSystemStorage(location=getattr(settings, 'ARCHIVE_ROOT', settings.BASE_DIR / 'archive'))
+
+
+def _archive_specs() -> dict:
+    from meta_integration.models import WebhookEventLog
+    # kind -> (model, time field, lookup of the contact's WhatsApp ID)
+    return {
+        ArchiveSegment.KIND_MESSAGE: (Message, 'timestamp', 'contact__whatsapp_id'),
+        ArchiveSegment.KIND_WEBHOOK_EVENT_LOG: (WebhookEventLog, 'received_at', 'message__contact__whatsapp_id'),
+    }
+
+
+def _archived_columns(model) -> tuple:
+    """Field names and extra value expressions of an archived row; messages carry their payload."""
+    field_names = [field.attname for field in model._meta.concrete_fields if not field.attname.startswith('legacy_')]
+    expressions = {}
+    if model is Message:
+        expressions = {name: Coalesce(f'payload__{name}', f'legacy_{name}') for name in PAYLOAD_FIELDS}
+    return field_names, expressions
+
+
+class _SegmentWriter:
+    """One archive file being written: rows of a single month, gzipped to a temporary file."""
+
+    def __init__(self, kind: str, month: date):
+        self.kind = kind
+        self.month = month
+        self.ids = []
+        self.contact_wa_ids = set()
+        self.first_timestamp = self.last_timestamp = None
+        self._tmp = tempfile.TemporaryFile()
+        self._gzip = gzip.GzipFile(fileobj=self._tmp, mode='wb')
+
+    def write(self, row: dict, timestamp, contact_wa_id: Optional[str]):
+        self._gzip.write(json.dumps(row, default=str, separators=(',', ':')).encode() + b'\n')
+        self.ids.append(row['id'])
+        if contact_wa_id:
+            self.contact_wa_ids.add(contact_wa_id)
+        self.first_timestamp = self.first_timestamp or timestamp
+        self.last_timestamp = timestamp
+
+    def store(self, storage) -> ArchiveSegment:
+        self._gzip.close()
+        self._tmp.seek(0)
+        path = f"{self.kind}/{self.month:%Y/%m}/{self.ids[0]}-{self.ids[-1]}.jsonl.gz"
+        stored_path = storage.save(path, File(self._tmp, name=path))
+        self._tmp.close()
+        return ArchiveSegment.objects.create(
+            kind=self.kind, month=self.month, path=stored_path, row_count=len(self.ids),
+            first_id=self.ids[0], last_id=self.ids[-1],
+            first_timestamp=self.first_timestamp, last_timestamp=self.last_timestamp,
+            contact_whatsapp_ids=sorted(self.contact_wa_ids),
+        )
+
+    def discard(self):
+        self._gzip.close()
+        self._tmp.close()
+
+
+def _delete_in_batches(model, ids: list, batch_size: int, pause_seconds: float) -> int:
+    """Deletes `ids` in small, separately committed batches, pausing between them."""
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            count, _ = model.objects.filter(pk__in=ids[start:start + batch_size]).delete()
+        deleted += count
+        if pause_seconds:
+            time.sleep(pause_seconds)
+    return deleted
+
+
+def model_for_kind(kind: str):
+    return _archive_specs()[kind][0]
+
+
+def kind_for_model(model) -> str:
+    return next(kind for kind, (spec_model, _, _) in _archive_specs().items() if spec_model is model)
+
+
+def archive_expired_rows(kind: str, cutoff, delete_batch_size: int = 500, pause_seconds: float = 0.1,
+                         dry_run: bool = False, progress: Callable[[str], None] = None,
+                         since=None, delete_rows: bool = True) -> dict:
+    """
+    Streams the rows of `kind` older than `cutoff` (and not older than `since`, if
+    given) in (time, id) order into monthly archive files, and deletes each file's
+    rows once the file is stored, unless `delete_rows` is False because the caller
+    drops them another way (see conversations.partitioning).
+    Returns {'archived': rows, 'deleted': rows incl. cascades, 'segments': files}.
+    """
+    model, time_field, contact_lookup = _archive_specs()[kind]
+    field_names, expressions = _archived_columns(model)
+    storage = None if dry_run else archive_storage()
+    queryset = model.objects.filter(**{f'{time_field}__lt': cutoff}).order_by(time_field, 'id')
+    if since is not None:
+        queryset = queryset.filter(**{f'{time_field}__gte': since})
+    stats = {'archived': 0, 'deleted': 0, 'segments': 0}
+
+    def finish(writer: _SegmentWriter):
+        segment = writer.store(storage)
+        deleted = _delete_in_batches(model, writer.ids, delete_batch_size, pause_seconds) if delete_rows else 0
+        stats['archived'] += segment.row_count
+        stats['deleted'] += deleted
+        stats['segments'] += 1
+        if progress:
+            progress(f"Archived {segment.row_count} {kind} row(s) to {segment.path}.")
+
+    writer, position = None, None
+    try:
+        while True:
+            batch_qs = queryset
+            if position:
+                last_time, last_id = position
+                batch_qs = queryset.filter(Q(**{f'{time_field}__gt': last_time}) | Q(**{time_field: last_time, 'id__gt': last_id}))
+            rows = list(batch_qs.values(*field_names, contact_lookup, **expressions)[:FETCH_BATCH_SIZE])
+            if not rows:
+                break
+            position = (rows[-1][time_field], rows[-1]['id'])
+
+            if dry_run:
+                stats['archived'] += len(rows)
+                continue
+
+            for row in rows:
+                timestamp = row[time_field]
+                contact_wa_id = row.pop(contact_lookup)
+                month = timestamp.date().replace(day=1)
+                if writer and (writer.month != month or len(writer.ids) >= MAX_ROWS_PER_FILE):
+                    finish(writer)
+                    writer = None
+                if writer is None:
+                    writer = _SegmentWriter(kind, month)
+                row['contact_whatsapp_id'] = contact_wa_id
+                writer.write(row, timestamp, contact_wa_id)
+        if writer:
+            finish(writer)
+            writer = None
+    finally:
+        if writer:
+            # Never stored, so none of its rows were deleted.
+            writer.discard()
+    return stats
+
+
+def delete_empty_contacts(cutoff, batch_size: int = 500, dry_run: bool = False) -> int:
+    """
+    Deletes contacts not seen since `cutoff` that have no messages left, found
+    with one anti-join per batch instead of an exists() query per contact.
+    """
+    from django.db.models import Exists, OuterRef
+
+    empty = Contact.objects.filter(last_seen__lt=cutoff).filter(
+        ~Exists(Message.objects.filter(contact=OuterRef('pk')))
+    ).order_by('id')
+    if dry_run:
+        return empty.count()
+
+    deleted, last_id = 0, 0
+    while True:
+        ids = list(empty.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            Contact.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+        last_id = ids[-1]
+    return deleted
+
+
+# --- Restore ---
+def _read_segment(storage, segment: ArchiveSegment):
+    with storage.open(segment.path, 'rb') as stored, gzip.GzipFile(fileobj=stored, mode='rb') as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def restore_contact_messages(whatsapp_id: str, since: Optional[date] = None, until: Optional[date] = None,
+                             batch_size: int = 500) -> int:
+    """
+    Brings a contact's archived messages back into the Message table, keeping their
+    original IDs (rows already present are skipped). The contact is recreated if it
+    was deleted. References to rows that no longer exist (flow steps, app configs,
+    replied-to messages) are cleared. Returns the number of messages restored.
+    """
+    from flows.models import FlowStep
+    from meta_integration.models import MetaAppConfig
+
+    segments = ArchiveSegment.objects.filter(
+        kind=ArchiveSegment.KIND_MESSAGE, contact_whatsapp_ids__contains=[whatsapp_id]
+    ).order_by('month', 'first_id')
+    if since:
+        segments = segments.filter(month__gte=since.replace(day=1))
+    if until:
+        segments = segments.filter(month__lte=until.replace(day=1))
+
+    fields = {field.attname: field for field in Message._meta.concrete_fields}
+    references = {
+        'app_config_id': MetaAppConfig.objects,
+        'triggered_by_flow_step_id': FlowStep.objects,
+        'related_incoming_message_id': Message.objects,
+    }
+    storage = archive_storage()
+    restored = []
+    contact = None
+
+    def flush():
+        for attname, manager in references.items():
+            wanted = {getattr(m, attname) for m in restored if getattr(m, attname)}
+            existing = set(manager.filter(pk__in=wanted).values_list('pk', flat=True)) if wanted else set()
+            # A message replied to in the same restore is inserted alongside it.
+            if attname == 'related_incoming_message_id':
+                existing |= {m.pk for m in restored}
+            for message in restored:
+                if getattr(message, attname) not in existing:
+                    setattr(message, attname, None)
+        with transaction.atomic():
+            Message.objects.bulk_create(restored, ignore_conflicts=True)
+            save_message_payloads(restored)
+        count = len(restored)
+        restored.clear()
+        return count
+
+    total = 0
+    for segment in segments:
+        for row in _read_segment(storage, segment):
+            if row.get('contact_whatsapp_id') != whatsapp_id:
+                continue
+            if contact is None:
+                contact, _ = Contact.objects.get_or_create(whatsapp_id=whatsapp_id)
+            message = Message(
+                **{name: fields[name].to_python(value) for name, value in row.items() if name in fields},
+                **{name: row[name] for name in PAYLOAD_FIELDS if name in row},
+            )
+            message.contact_id = contact.pk
+            restored.append(message)
+            if len(restored) >= batch_size:
+                total += flush()
+    if restored:
+        total += flush()
+    logger.info(f"Restored {total} archived message(s) for contact {whatsapp_id}.")
+    return total
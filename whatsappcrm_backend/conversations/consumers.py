@@ -1,17 +1,27 @@
 # whatsappcrm_backend/conversations/consumers.py
 import json
 import logging
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
+from django.db import transaction
 from django.utils import timezone
 
 from .models import Contact, Message
 from .serializers import ContactDetailSerializer, MessageSerializer
+from .realtime import (
+    join_conversation, leave_conversation, buffered_events_since, current_stream_seq, messages_changed_since,
+)
 from meta_integration.tasks import send_whatsapp_message_task
-from meta_integration.models import MetaAppConfig
+from meta_integration.utils import get_active_meta_config_for_sending
+from outbox.services import enqueue_task
 
 logger = logging.getLogger(__name__)
 
+# Channel layer event types as the client sees them, for replaying buffered events.
+CLIENT_EVENT_TYPES = {'chat.messages': 'new_messages', 'message.updates': 'message_updates'}
+
 @database_sync_to_async
 def get_contact_for_user(contact_id, user):
     """
@@ -30,21 +40,22 @@ def create_and_dispatch_message(contact, user, message_text):
     Creates an outgoing message and schedules it for sending.
     """
     try:
-        active_config = MetaAppConfig.objects.get_active_config()
+        active_config = get_active_meta_config_for_sending()
         if not active_config:
             logger.error(f"No active MetaAppConfig found. Cannot send message from user {user.id} to contact {contact.id}.")
             return None
         
-        message = Message.objects.create(
-            contact=contact,
-            direction='out',
-            message_type='text',
-            content_payload={'body': message_text},
-            status='pending_dispatch',
-        )
-        # The post_save signal on the Message model will broadcast this.
-        # We can also explicitly trigger the send task here.
-        send_whatsapp_message_task.delay(message.id, active_config.id)
+        with transaction.atomic():
+            message = Message.objects.create(
+                contact=contact,
+                direction='out',
+                message_type='text',
+                content_payload={'body': message_text},
+                status='pending_dispatch',
+            )
+            # The post_save signal on the Message model will broadcast this.
+            # The send task is published by the outbox relay once the message is committed.
+            enqueue_task(send_whatsapp_message_task, args=[message.id, active_config.id])
         return message
     except Exception as e:
         logger.error(f"Error creating/dispatching message from user {user.id} to contact {contact.id}: {e}", exc_info=True)
@@ -63,7 +74,9 @@ def toggle_intervention_status(contact_id: int):
         else:
             # Set the timestamp when intervention is requested
             contact.intervention_requested_at = timezone.now()
-        contact.save(update_fields=['needs_human_intervention', 'intervention_requested_at', 'last_seen'])
+        # A manual toggle is a staff decision: it never times out on its own.
+        contact.intervention_timeout_at = None
+        contact.save(update_fields=['needs_human_intervention', 'intervention_requested_at', 'intervention_timeout_at', 'last_seen'])
         
         # Use the detail serializer to ensure the frontend gets the full object
         serializer = ContactDetailSerializer(contact)
@@ -93,14 +106,43 @@ class ConversationConsumer(AsyncJsonWebsocketConsumer):
 
         self.group_name = f'conversation_{self.contact_id}'
 
-        # Join conversation group
+        # Join conversation group; presence tells the realtime publisher someone is watching.
         await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await sync_to_async(join_conversation)(int(self.contact_id), self.channel_name)
         await self.accept()
         logger.info(f"User {self.user.id} connected to conversation WebSocket for contact {self.contact_id}.")
 
+        since = parse_qs(self.scope.get('query_string', b'').decode()).get('since')
+        if since and since[0].isdigit():
+            await self.resume_from(int(since[0]))
+
+    async def resume_from(self, since: int):
+        """
+        Sends what a reconnecting client missed after stream position `since`:
+        the buffered events if the Redis ring buffer still covers it, otherwise
+        the messages changed since then from the database. Live events may
+        overlap with the backfill; clients merge messages by id.
+        """
+        contact_id = int(self.contact_id)
+        events = await sync_to_async(buffered_events_since)(contact_id, since)
+        if events is not None:
+            for event in events:
+                await self.send_json({'type': CLIENT_EVENT_TYPES.get(event['type'], event['type']), 'messages': event['messages'], 'seq': event['seq']})
+            logger.debug(f"Resumed conversation {contact_id} from seq {since} with {len(events)} buffered event(s).")
+            return
+
+        seq = await sync_to_async(current_stream_seq)(contact_id)
+        messages = await database_sync_to_async(messages_changed_since)(contact_id, since)
+        if messages is None:
+            await self.send_json({'type': 'resync_required', 'seq': seq})
+        elif messages:
+            await self.send_json({'type': 'new_messages', 'messages': messages, 'seq': seq})
+        logger.debug(f"Resumed conversation {contact_id} from seq {since} via the database.")
+
     async def disconnect(self, close_code):
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await sync_to_async(leave_conversation)(int(self.contact_id), self.channel_name)
             logger.info(f"User {self.user.id} disconnected from conversation WebSocket for contact {self.contact_id}.")
 
     async def receive_json(self, content):
@@ -149,4 +191,18 @@ class ConversationConsumer(AsyncJsonWebsocketConsumer):
         of the system that may use this type, ensuring compatibility.
         """
         await self.new_message(event)
- 
\ No newline at end of file
+ 
+
+    async def chat_messages(self, event):
+        """
+        Handles a batch of messages broadcast with the 'chat.messages' type, e.g. all
+        replies produced by a single flow turn.
+        """
+        await self.send_json({'type': 'new_messages', 'messages': event['messages'], 'seq': event.get('seq')})
+
+    async def message_updates(self, event):
+        """
+        Handles status deltas ({id, status, status_timestamp}) for messages the
+        client already has; they are merged into the existing messages.
+        """
+        await self.send_json({'type': 'message_updates', 'messages': event['messages'], 'seq': event.get('seq')})
@@ -0,0 +1,60 @@
+# conversations/management/commands/backfill_inbox_summaries.py
+
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery, Count, Value, IntegerField
+from django.db.models.functions import Coalesce, Left
+from conversations.models import Contact, Message, UNREAD_INBOUND_STATUS
+
+class Command(BaseCommand):
+    """
+    Rebuilds the inbox summary columns on Contact (last_message_at, last_message_preview,
+    last_message_direction, unread_inbound_count) from the messages themselves.
+
+    Run it once after the columns are added, and again after bulk operations that skip
+    Message.save(), such as queryset.update() on statuses or delete_old_conversations.
+    Contacts are processed in primary key order, one batch per query.
+    """
+    help = 'Recomputes the denormalized inbox summary columns on contacts from their messages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Contacts updated per batch. Default is 1000.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        latest = Message.objects.filter(contact=OuterRef('pk')).order_by('-timestamp', '-id')
+        unread = (
+            Message.objects.filter(contact=OuterRef('pk'), direction='in', status=UNREAD_INBOUND_STATUS)
+            .order_by().values('contact').annotate(total=Count('id')).values('total')
+        )
+
+        last_id, total_updated = 0, 0
+        while True:
+            batch = list(
+                Contact.objects.filter(id__gt=last_id).order_by('id')
+                .annotate(
+                    latest_at=Subquery(latest.values('timestamp')[:1]),
+                    latest_preview=Subquery(latest.annotate(preview=Left('text_content', 255)).values('preview')[:1]),
+                    latest_direction=Subquery(latest.values('direction')[:1]),
+                    unread_total=Coalesce(Subquery(unread, output_field=IntegerField()), Value(0)),
+                )
+                .only('id')[:batch_size]
+            )
+            if not batch:
+                break
+
+            for contact in batch:
+                contact.last_message_at = contact.latest_at
+                contact.last_message_preview = contact.latest_preview or None
+                contact.last_message_direction = contact.latest_direction
+                contact.unread_inbound_count = contact.unread_total
+            Contact.objects.bulk_update(
+                batch, ['last_message_at', 'last_message_preview', 'last_message_direction', 'unread_inbound_count']
+            )
+
+            total_updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"Updated {total_updated} contact(s) so far...")
+            if len(batch) < batch_size:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt inbox summaries for {total_updated} contact(s)."))
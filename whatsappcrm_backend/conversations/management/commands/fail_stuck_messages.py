@@ -4,14 +4,17 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from conversations.models import Message
+from meta_integration.circuit_breaker import graph_api_breaker
+from meta_integration.dead_letters import dead_letter_messages
 
 class Command(BaseCommand):
     """
     A Django management command to find messages that have been in the 'pending_dispatch'
     state for too long and mark them as 'failed'. This is useful for cleaning up
     tasks that may have gotten stuck in the queue due to a worker shutdown or other error.
+    Failed messages are moved to the dead-letter store so they can be requeued later.
     """
-    help = 'Finds messages stuck in "pending_dispatch" for too long and marks them as "failed".'
+    help = 'Finds messages stuck in "pending_dispatch" for too long, marks them as "failed" and dead-letters them.'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -37,7 +40,15 @@ class Command(BaseCommand):
         stuck_messages_qs = Message.objects.filter(
             status='pending_dispatch',
             timestamp__lt=stuck_threshold_time
+        ).exclude(
+            # Requeued dead letters keep their original timestamp; give them the same grace period.
+            dead_letter__requeued_at__gte=stuck_threshold_time
         )
+        # Messages parked during a Meta API outage are waiting on purpose, not stuck.
+        parked_ids = graph_api_breaker.parked_message_ids()
+        if parked_ids:
+            self.stdout.write(self.style.NOTICE(f"Skipping {len(parked_ids)} message(s) parked by the Meta API circuit breaker."))
+            stuck_messages_qs = stuck_messages_qs.exclude(id__in=parked_ids)
 
         count = stuck_messages_qs.count()
 
@@ -51,11 +62,11 @@ class Command(BaseCommand):
             self.stdout.write(self.style.NOTICE("This is a dry run. No changes will be made."))
             return
 
-        updated_count = stuck_messages_qs.update(
-            status='failed',
-            status_timestamp=timezone.now(),
+        updated_count = dead_letter_messages(
+            stuck_messages_qs.only('id', 'app_config_id'),
+            reason='stuck',
             error_details={'error': f'Manually marked as failed by management command at {timezone.now().isoformat()}'}
         )
 
-        self.stdout.write(self.style.SUCCESS(f"Successfully updated {updated_count} message(s) to 'failed' status."))
+        self.stdout.write(self.style.SUCCESS(f"Successfully updated {updated_count} message(s) to 'failed' status and dead-lettered them."))
 
@@ -0,0 +1,56 @@
+# conversations/management/commands/move_message_payloads.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from conversations.models import Message, MessagePayload
+
+class Command(BaseCommand):
+    """
+    Moves content_payload and error_details of messages created before the
+    MessagePayload split out of the legacy Message columns, then clears those
+    columns so Message rows are narrow. Safe to re-run and to run while the app is
+    serving traffic: a payload written since the split is kept over the legacy copy.
+    Messages are processed in primary key order, one committed batch at a time.
+    """
+    help = 'Moves legacy message payloads from the Message table into MessagePayload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Messages moved per batch. Default is 1000.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = Message.objects.filter(
+            Q(legacy_content_payload__isnull=False) | Q(legacy_error_details__isnull=False)
+        ).order_by('id')
+
+        last_id, total_moved = 0, 0
+        while True:
+            batch = list(
+                pending.filter(id__gt=last_id)
+                .values_list('id', 'legacy_content_payload', 'legacy_error_details')[:batch_size]
+            )
+            if not batch:
+                break
+            with transaction.atomic():
+                MessagePayload.objects.bulk_create(
+                    [
+                        MessagePayload(
+                            message_id=message_id,
+                            content_payload=content_payload if content_payload is not None else {},
+                            error_details=error_details,
+                        )
+                        for message_id, content_payload, error_details in batch
+                    ],
+                    ignore_conflicts=True,
+                )
+                Message.objects.filter(id__in=[row[0] for row in batch]).update(
+                    legacy_content_payload=None, legacy_error_details=None
+                )
+            total_moved += len(batch)
+            last_id = batch[-1][0]
+            self.stdout.write(f"Moved payloads of {total_moved} message(s) so far...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved the payloads of {total_moved} message(s). Run VACUUM on conversations_message to reclaim the space."
+        ))
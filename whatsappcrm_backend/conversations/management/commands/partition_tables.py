@@ -0,0 +1,64 @@
+# whatsappcrm_backend/conversations/management/commands/partition_tables.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from conversations.partitioning import (
+    PartitioningError, convert_to_partitioned, ensure_partitions, is_partitioned,
+    list_partitions, partitioned_models,
+)
+
+
+class Command(BaseCommand):
+    """
+    Shows and maintains the monthly partitions of Message and WebhookEventLog.
+
+    Run it with --convert once, after `migrate`, to turn the existing tables into
+    partitioned ones; the current rows stay where they are as the <table>_legacy
+    partition. Afterwards the ensure_table_partitions_task beat task keeps future
+    partitions created, and delete_old_conversations drops expired months.
+    """
+    help = 'Converts Message and WebhookEventLog to monthly partitioned tables and creates upcoming partitions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Convert tables that are not partitioned yet. Takes a brief exclusive lock per table.'
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=None,
+            help='Months of future partitions to create. Defaults to settings.PARTITION_MONTHS_AHEAD.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Table partitioning needs PostgreSQL.")
+        ensure_kwargs = {} if options['months_ahead'] is None else {'months_ahead': options['months_ahead']}
+
+        for model, column in partitioned_models():
+            table = model._meta.db_table
+            if not is_partitioned(model):
+                if not options['convert']:
+                    self.stdout.write(self.style.WARNING(f"{table} is not partitioned. Run with --convert to convert it."))
+                    continue
+                try:
+                    convert_to_partitioned(model, progress=self.stdout.write)
+                except PartitioningError as e:
+                    raise CommandError(str(e))
+                self.stdout.write(self.style.SUCCESS(f"Converted {table} to monthly partitions on {column}."))
+
+            created = ensure_partitions(model, **ensure_kwargs)
+            if created:
+                self.stdout.write(self.style.SUCCESS(f"Created partitions: {', '.join(created)}"))
+
+            self.stdout.write(self.style.NOTICE(f"Partitions of {table}:"))
+            for partition in list_partitions(model):
+                if partition['is_default']:
+                    bounds = 'DEFAULT'
+                else:
+                    lower = f"{partition['lower']:%Y-%m-%d}" if partition['lower'] else 'MINVALUE'
+                    bounds = f"{lower} .. {partition['upper']:%Y-%m-%d}"
+                self.stdout.write(f"  {partition['name']}: {bounds}")
@@ -0,0 +1,39 @@
+# whatsappcrm_backend/conversations/management/commands/restore_contact_history.py
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from conversations.archive import restore_contact_messages
+
+
+def _month(value: str):
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise CommandError(f"Invalid month '{value}'. Use YYYY-MM.")
+
+
+class Command(BaseCommand):
+    """
+    Restores a contact's messages from the archive written by delete_old_conversations.
+    Messages keep their original IDs, so running it twice restores nothing new.
+    """
+    help = "Restores a contact's archived messages into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('whatsapp_id', help="The contact's WhatsApp ID (phone number).")
+        parser.add_argument('--since', help='First month to restore, as YYYY-MM.')
+        parser.add_argument('--until', help='Last month to restore, as YYYY-MM.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Messages inserted per transaction. Default is 500.')
+
+    def handle(self, *args, **options):
+        since = _month(options['since']) if options['since'] else None
+        until = _month(options['until']) if options['until'] else None
+        restored = restore_contact_messages(
+            options['whatsapp_id'], since=since, until=until, batch_size=options['batch_size'],
+        )
+        if restored:
+            self.stdout.write(self.style.SUCCESS(f"Restored {restored} message(s) for {options['whatsapp_id']}."))
+        else:
+            self.stdout.write(self.style.WARNING(f"No archived messages found for {options['whatsapp_id']}."))
@@ -0,0 +1,49 @@
+import uuid
+
+from django.db import migrations, models
+
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def backfill_idempotency_keys(apps, schema_editor):
+    # AddField with default=uuid.uuid4 evaluates the default once, so every existing
+    # row would share one key. The column is added nullable and filled row by row here.
+    if schema_editor.connection.vendor == 'postgresql':
+        # md5() of per-row values gives a distinct UUID without needing pgcrypto.
+        schema_editor.execute(
+            "UPDATE conversations_message "
+            "SET idempotency_key = md5(id::text || random()::text || clock_timestamp()::text)::uuid "
+            "WHERE idempotency_key IS NULL"
+        )
+        return
+
+    Message = apps.get_model('conversations', 'Message')
+    while True:
+        batch = list(Message.objects.filter(idempotency_key__isnull=True).only('id')[:BACKFILL_BATCH_SIZE])
+        if not batch:
+            break
+        for message in batch:
+            message.idempotency_key = uuid.uuid4()
+        Message.objects.bulk_update(batch, ['idempotency_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0002_contact_intervention_requested_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='idempotency_key',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_idempotency_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='message',
+            name='idempotency_key',
+            field=models.UUIDField(db_index=True, default=uuid.uuid4, editable=False, help_text='Stable key for outgoing messages. Guards against handing the same message to Meta twice and is echoed back by Meta in status webhooks (biz_opaque_callback_data).'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Moves Message.content_payload / error_details to MessagePayload. The existing
+    columns are kept in place, under their old names, as legacy_content_payload /
+    legacy_error_details until `manage.py move_message_payloads` has copied them;
+    nothing is dropped, so no payload is lost. content_payload only loses NOT NULL,
+    because new messages leave it empty.
+    """
+
+    dependencies = [
+        ('conversations', '0003_message_idempotency_key'),
+    ]
+
+    operations = [
+        # Pin the column names first, so the renames below only change model state.
+        migrations.AlterField(
+            model_name='message',
+            name='content_payload',
+            field=models.JSONField(blank=True, db_column='content_payload', editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='error_details',
+            field=models.JSONField(blank=True, db_column='error_details', editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name='message',
+                    old_name='content_payload',
+                    new_name='legacy_content_payload',
+                ),
+                migrations.RenameField(
+                    model_name='message',
+                    old_name='error_details',
+                    new_name='legacy_error_details',
+                ),
+            ],
+            database_operations=[],
+        ),
+        migrations.CreateModel(
+            name='MessagePayload',
+            fields=[
+                ('message', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='conversations.message')),
+                ('content_payload', models.JSONField(default=dict, help_text='Raw message payload from/to Meta API.')),
+                ('error_details', models.JSONField(blank=True, help_text='Error details if message sending failed.', null=True)),
+            ],
+            options={
+                'verbose_name': 'Message Payload',
+                'verbose_name_plural': 'Message Payloads',
+            },
+        ),
+    ]
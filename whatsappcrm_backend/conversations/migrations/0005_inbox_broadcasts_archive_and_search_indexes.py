@@ -0,0 +1,210 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Adds broadcasts, archive segments, the denormalised inbox columns on Contact and
+    the indexes the inbox, search and partitioning code look up by name. Existing
+    contacts start with empty inbox columns; run `manage.py backfill_inbox_summaries`
+    after migrating.
+    """
+
+    dependencies = [
+        ('conversations', '0004_message_payload_split'),
+        ('flows', '0002_alter_contactflowstate_unique_together_and_more'),
+        ('meta_integration', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # contact_name_trgm / contact_whatsapp_id_trgm below use gin_trgm_ops.
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('message', 'Messages'), ('webhook_event_log', 'Webhook Event Logs')], max_length=30)),
+                ('month', models.DateField(help_text='First day of the month the archived rows belong to.')),
+                ('path', models.CharField(help_text='Path of the file in the archive storage.', max_length=500, unique=True)),
+                ('row_count', models.PositiveIntegerField()),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('contact_whatsapp_ids', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), blank=True, default=list, size=None)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archive Segment',
+                'verbose_name_plural': 'Archive Segments',
+                'ordering': ['kind', 'month', 'first_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Broadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='An internal name for this broadcast campaign.', max_length=255)),
+                ('template_name', models.CharField(help_text='The name of the Meta template used for this broadcast.', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], db_index=True, default='pending', max_length=20)),
+                ('total_recipients', models.PositiveIntegerField(default=0)),
+                ('pending_dispatch_count', models.PositiveIntegerField(default=0)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('delivered_count', models.PositiveIntegerField(default=0)),
+                ('read_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Broadcast',
+                'verbose_name_plural': 'Broadcasts',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BroadcastRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending_dispatch', 'Pending Dispatch'), ('sent', 'Sent to Meta'), ('delivered', 'Delivered to User'), ('read', 'Read by User'), ('failed', 'Failed to Send'), ('deleted', 'Deleted'), ('received', 'Received')], default='pending_dispatch', max_length=20)),
+                ('status_timestamp', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['broadcast', 'contact'],
+            },
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='associated_app_config',
+            field=models.ForeignKey(blank=True, help_text='The Meta App Configuration this contact is associated with.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='meta_integration.metaappconfig'),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='intervention_timeout_at',
+            field=models.DateTimeField(blank=True, help_text='When an automatic (flow) handover times out and the bot takes over again. Empty for interventions started manually by staff, which never time out.', null=True),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, help_text="Timestamp of the contact's latest message.", null=True),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='last_message_direction',
+            field=models.CharField(blank=True, help_text="Direction ('in' or 'out') of the latest message.", max_length=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='last_message_preview',
+            field=models.CharField(blank=True, help_text="Start of the latest message's text content.", max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='unread_inbound_count',
+            field=models.PositiveIntegerField(default=0, help_text="Incoming messages still in 'received' status."),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='user',
+            field=models.OneToOneField(blank=True, help_text='The system user account associated with this WhatsApp contact, if any.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='whatsapp_contact', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='app_config',
+            field=models.ForeignKey(blank=True, help_text='The Meta App Configuration used for sending/receiving this message.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='meta_integration.metaappconfig'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation_id_from_meta',
+            field=models.CharField(blank=True, help_text='The conversation ID from Meta for this message.', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='flow_processed_at',
+            field=models.DateTimeField(blank=True, help_text='Timestamp when this message was processed by the flow engine.', null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='is_system_notification',
+            field=models.BooleanField(db_index=True, default=False, help_text='True if this is a system-generated notification (e.g., to an admin).'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='pricing_model_from_meta',
+            field=models.CharField(blank=True, help_text="The pricing model from Meta (e.g., 'CBP').", max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='related_incoming_message',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='The incoming message that this message is a reply to.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='replies', to='conversations.message'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='triggered_by_flow_step',
+            field=models.ForeignKey(blank=True, help_text='The flow step that triggered this outgoing message.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='triggered_messages', to='flows.flowstep'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='status',
+            field=models.CharField(choices=[('pending_dispatch', 'Pending Dispatch'), ('sent', 'Sent to Meta'), ('delivered', 'Delivered to User'), ('read', 'Read by User'), ('failed', 'Failed to Send'), ('deleted', 'Deleted'), ('received', 'Received')], default='pending_dispatch', help_text='Status of the message.', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(condition=models.Q(('needs_human_intervention', True)), fields=['intervention_timeout_at'], name='contact_intervention_timeout'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(models.OrderBy(models.F('last_message_at'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='contact_inbox_order'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass('name', name='gin_trgm_ops'), name='contact_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass('whatsapp_id', name='gin_trgm_ops'), name='contact_whatsapp_id_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('text_content', config='simple'), name='message_text_search'),
+        ),
+        migrations.AddIndex(
+            model_name='archivesegment',
+            index=models.Index(fields=['kind', 'month'], name='archive_segment_kind_month'),
+        ),
+        migrations.AddIndex(
+            model_name='archivesegment',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['contact_whatsapp_ids'], name='archive_segment_contacts'),
+        ),
+        migrations.AddField(
+            model_name='broadcast',
+            name='created_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='broadcasts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='broadcastrecipient',
+            name='broadcast',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipients', to='conversations.broadcast'),
+        ),
+        migrations.AddField(
+            model_name='broadcastrecipient',
+            name='contact',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='broadcasts_received', to='conversations.contact'),
+        ),
+        migrations.AddField(
+            model_name='broadcastrecipient',
+            name='message',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='broadcast_recipient', to='conversations.message'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='broadcastrecipient',
+            unique_together={('broadcast', 'contact')},
+        ),
+    ]
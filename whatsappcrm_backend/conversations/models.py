@@ -1,6 +1,11 @@
 # whatsappcrm_backend/conversations/models.py
-from django.db.models import F
-from django.db import models
+import uuid
+from django.db.models import F, Q, Case, When, Value
+from django.db.models.functions import Greatest
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -51,11 +56,25 @@ class Contact(models.Model):
         null=True, blank=True,
         help_text="Timestamp of when human intervention was last requested."
     )
+    intervention_timeout_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="When an automatic (flow) handover times out and the bot takes over again. "
+                  "Empty for interventions started manually by staff, which never time out."
+    )
     first_seen = models.DateTimeField(auto_now_add=True, help_text="Timestamp of when the contact was first created.")
     last_seen = models.DateTimeField(auto_now=True, help_text="Timestamp of the last interaction (message) with this contact.")
     # You can add more fields like email, company, notes, tags, etc.
     # custom_fields = models.JSONField(default=dict, blank=True, help_text="Custom fields for this contact.")
     is_blocked = models.BooleanField(default=False, help_text="If the CRM has blocked this contact.")
+
+    # --- Inbox summary ---
+    # Denormalized from the contact's messages so the inbox list needs no per-contact
+    # subqueries. Kept current by Message.save() and update_inbox_summaries() (for
+    # bulk_create callers); backfill_inbox_summaries rebuilds them from the messages.
+    last_message_at = models.DateTimeField(null=True, blank=True, help_text="Timestamp of the contact's latest message.")
+    last_message_preview = models.CharField(max_length=255, null=True, blank=True, help_text="Start of the latest message's text content.")
+    last_message_direction = models.CharField(max_length=3, null=True, blank=True, help_text="Direction ('in' or 'out') of the latest message.")
+    unread_inbound_count = models.PositiveIntegerField(default=0, help_text="Incoming messages still in 'received' status.")
     # current_flow_state = models.JSONField(default=dict, blank=True, help_text="Stores the current state of the contact within a flow.")
 
 
@@ -66,6 +85,22 @@ class Contact(models.Model):
         ordering = ['-last_seen']
         verbose_name = "Contact"
         verbose_name_plural = "Contacts"
+        indexes = [
+            # Serves the handover timeout sweeper; only contacts waiting for a human are indexed.
+            models.Index(
+                fields=['intervention_timeout_at'],
+                condition=models.Q(needs_human_intervention=True),
+                name='contact_intervention_timeout',
+            ),
+            # Serves the inbox list, which orders by latest message.
+            models.Index(
+                F('last_message_at').desc(nulls_last=True), F('id').desc(),
+                name='contact_inbox_order',
+            ),
+            # Trigram indexes for contact search (conversations.search); they need pg_trgm.
+            GinIndex(OpClass('name', name='gin_trgm_ops'), name='contact_name_trgm'),
+            GinIndex(OpClass('whatsapp_id', name='gin_trgm_ops'), name='contact_whatsapp_id_trgm'),
+        ]
 
 
 class Message(models.Model):
@@ -136,9 +171,12 @@ class Message(models.Model):
         default='text',
         help_text="Type of WhatsApp message."
     )
-    # Store the raw message object from Meta for incoming, or the payload sent for outgoing.
-    # This is useful for debugging, reprocessing, or accessing fields not explicitly modeled.
-    content_payload = models.JSONField(help_text="Raw message payload from/to Meta API.")
+    # The raw payload from/to Meta and any send error live in MessagePayload (see the
+    # content_payload and error_details properties), so that inbox lists, stats and status
+    # updates only read and rewrite narrow rows. These two columns still hold the payloads
+    # of messages from before the split until `manage.py move_message_payloads` has run.
+    legacy_content_payload = models.JSONField(null=True, blank=True, editable=False, db_column='content_payload')
+    legacy_error_details = models.JSONField(null=True, blank=True, editable=False, db_column='error_details')
     
     # For quick access to text content if it's a text message
     text_content = models.TextField(blank=True, null=True, help_text="Text content if it's a text message.")
@@ -153,7 +191,13 @@ class Message(models.Model):
         help_text="Status of the message."
     )
     status_timestamp = models.DateTimeField(null=True, blank=True, help_text="Timestamp of the last status update.")
-    error_details = models.JSONField(null=True, blank=True, help_text="Error details if message sending failed.")
+    idempotency_key = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        db_index=True,
+        help_text="Stable key for outgoing messages. Guards against handing the same message to Meta twice "
+                  "and is echoed back by Meta in status webhooks (biz_opaque_callback_data)."
+    )
 
     # --- Flow & Conversation Threading ---
     triggered_by_flow_step = models.ForeignKey(
@@ -170,6 +214,7 @@ class Message(models.Model):
         null=True,
         blank=True,
         related_name='replies',
+        db_constraint=False,
         help_text="The incoming message that this message is a reply to."
     )
 
@@ -203,19 +248,103 @@ class Message(models.Model):
         contact_name = self.contact.name or self.contact.whatsapp_id
         return f"Msg {self.id} {direction_arrow} {contact_name} ({self.message_type}) at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
 
-    def save(self, *args, **kwargs):
-        # If it's a text message and text_content is not set, try to populate it from content_payload
+    def populate_text_content(self):
+        """
+        If it's a text message and text_content is not set, populate it from content_payload.
+        Called by save(); bulk_create skips save(), so bulk callers must call it themselves.
+        """
         if self.message_type == 'text' and not self.text_content and isinstance(self.content_payload, dict):
             if self.direction == 'in': # Incoming message structure
                 self.text_content = self.content_payload.get('text', {}).get('body')
             elif self.direction == 'out': # Outgoing message structure
                 self.text_content = self.content_payload.get('body') # Assuming 'body' is at the top level of the text object
 
-        # Update contact's last_seen timestamp
-        if self.contact_id: # Ensure contact is associated
-            Contact.objects.filter(pk=self.contact_id).update(last_seen=self.timestamp)
+    # --- Raw payloads ---
+    def _stored_payload(self):
+        """The MessagePayload row, loaded on first access; None if the message has none."""
+        if self._state.adding and not Message.payload.is_cached(self):
+            # Not loaded from the database, so nothing is stored for it yet.
+            return None
+        try:
+            return self.payload
+        except MessagePayload.DoesNotExist:
+            return None
+
+    def _writable_payload(self):
+        payload = self._stored_payload()
+        if payload is None:
+            payload = MessagePayload(
+                content_payload=self.legacy_content_payload if self.legacy_content_payload is not None else {},
+                error_details=self.legacy_error_details,
+            )
+            self.payload = payload
+        self._payload_changed = True
+        return payload
+
+    @property
+    def content_payload(self):
+        """Raw message payload from/to Meta API."""
+        payload = self._stored_payload()
+        return payload.content_payload if payload is not None else self.legacy_content_payload
+
+    @content_payload.setter
+    def content_payload(self, value):
+        if value != self.content_payload:
+            self._writable_payload().content_payload = value
+
+    @property
+    def error_details(self):
+        """Error details if message sending failed."""
+        payload = self._stored_payload()
+        return payload.error_details if payload is not None else self.legacy_error_details
+
+    @error_details.setter
+    def error_details(self, value):
+        if value != self.error_details:
+            self._writable_payload().error_details = value
+
+    def _save_payload(self):
+        payload = self.payload
+        payload.message = self
+        payload.save(force_insert=payload._state.adding)
+        self._payload_changed = False
+
+    @property
+    def counts_as_unread(self) -> bool:
+        return self.direction == 'in' and self.status == UNREAD_INBOUND_STATUS
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so save() can tell whether the contact's unread count changes.
+        # Left unset when direction/status were deferred, to avoid loading them here.
+        if 'direction' in instance.__dict__ and 'status' in instance.__dict__:
+            instance._loaded_as_unread = instance.counts_as_unread
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.populate_text_content()
+        is_new = self._state.adding
+        if kwargs.get('update_fields') is not None:
+            # Payload fields are not columns of this table; a changed payload is saved below.
+            kwargs['update_fields'] = [name for name in kwargs['update_fields'] if name not in PAYLOAD_FIELDS]
         super().save(*args, **kwargs)
+        if getattr(self, '_payload_changed', False):
+            self._save_payload()
+
+        if self.contact_id: # Ensure contact is associated
+            if is_new:
+                unread_delta = int(self.counts_as_unread)
+            elif hasattr(self, '_loaded_as_unread'):
+                unread_delta = int(self.counts_as_unread) - int(self._loaded_as_unread)
+            else:
+                unread_delta = 0
+            # Status-only updates (delivery webhooks, sends) leave the contact row alone.
+            if is_new or unread_delta:
+                Contact.objects.filter(pk=self.contact_id).update(**inbox_summary_updates(self, unread_delta))
+            if is_new and self.direction == 'in':
+                _record_contact_seen_on_commit(self.contact_id, self.timestamp)
+        self._loaded_as_unread = self.counts_as_unread
 
     class Meta:
         ordering = ['timestamp'] # Order messages chronologically by default
@@ -226,9 +355,127 @@ class Message(models.Model):
             models.Index(fields=['wamid']),
             models.Index(fields=['message_type']),
             models.Index(fields=['status', 'direction']),
+            # Full-text search over message text. Must match conversations.search.MESSAGE_SEARCH_VECTOR.
+            GinIndex(SearchVector('text_content', config='simple'), name='message_text_search'),
         ]
 
 
+class MessagePayload(models.Model):
+    """
+    The wide part of a Message: the raw payload exchanged with Meta and any send
+    error. Read through Message.content_payload / Message.error_details, which load
+    it on first access; use select_related('payload') or load_message_payloads()
+    when many messages need it.
+    """
+    message = models.OneToOneField(
+        Message,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='payload',
+        # No database constraint: Message may be partitioned (conversations.partitioning).
+        db_constraint=False,
+    )
+    # Store the raw message object from Meta for incoming, or the payload sent for outgoing.
+    # This is useful for debugging, reprocessing, or accessing fields not explicitly modeled.
+    content_payload = models.JSONField(default=dict, help_text="Raw message payload from/to Meta API.")
+    error_details = models.JSONField(null=True, blank=True, help_text="Error details if message sending failed.")
+
+    def __str__(self):
+        return f"Payload of message {self.message_id}"
+
+    class Meta:
+        verbose_name = "Message Payload"
+        verbose_name_plural = "Message Payloads"
+
+
+PAYLOAD_FIELDS = ('content_payload', 'error_details')
+
+
+def load_message_payloads(messages):
+    """Loads the payloads of `messages` that are not loaded yet, in one query."""
+    models.prefetch_related_objects([message for message in messages if message.pk], 'payload')
+
+
+def save_message_payloads(messages):
+    """
+    Inserts the payloads of messages created with bulk_create(), which bypasses
+    Message.save(). Call it right after bulk_create().
+    """
+    payloads = []
+    for message in messages:
+        if getattr(message, '_payload_changed', False):
+            payload = message.payload
+            payload.message = message
+            payloads.append(payload)
+            message._payload_changed = False
+    if payloads:
+        MessagePayload.objects.bulk_create(payloads, ignore_conflicts=True)
+
+
+def update_message_error_details(message_ids, error_details):
+    """Sets error_details on many saved messages at once, like queryset.update() would."""
+    message_ids = list(message_ids)
+    MessagePayload.objects.filter(message_id__in=message_ids).update(error_details=error_details)
+    # Messages whose payload has not been moved out of the legacy columns yet.
+    Message.objects.filter(id__in=message_ids, payload__isnull=True).update(legacy_error_details=error_details)
+
+
+# --- Inbox summary maintenance ---
+# Incoming messages in this status count towards Contact.unread_inbound_count.
+UNREAD_INBOUND_STATUS = 'received'
+
+
+def inbox_summary_updates(message: Message, unread_delta: int = 0) -> dict:
+    """
+    Returns Contact update() kwargs that record `message` as the contact's latest
+    message, unless a newer one is already recorded, and shift the unread count
+    by `unread_delta`.
+    """
+    is_latest = Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.timestamp)
+    preview = (message.text_content or '')[:255] or None
+    updates = {
+        'last_message_at': Case(When(is_latest, then=Value(message.timestamp)), default=F('last_message_at')),
+        'last_message_preview': Case(
+            When(is_latest, then=Value(preview, output_field=models.CharField())),
+            default=F('last_message_preview'),
+        ),
+        'last_message_direction': Case(
+            When(is_latest, then=Value(message.direction, output_field=models.CharField())),
+            default=F('last_message_direction'),
+        ),
+    }
+    if unread_delta:
+        updates['unread_inbound_count'] = Greatest(F('unread_inbound_count') + unread_delta, 0)
+    return updates
+
+
+def update_inbox_summaries(messages):
+    """
+    Brings the inbox summary of every contact in `messages` up to date; for
+    callers that create messages with bulk_create(), which bypasses Message.save().
+    Inbound messages also record the contact's last_seen, as save() does.
+    """
+    by_contact = {}
+    for message in messages:
+        latest, unread, latest_inbound = by_contact.get(message.contact_id, (None, 0, None))
+        if latest is None or message.timestamp >= latest.timestamp:
+            latest = message
+        if message.direction == 'in' and (latest_inbound is None or message.timestamp > latest_inbound):
+            latest_inbound = message.timestamp
+        by_contact[message.contact_id] = (latest, unread + int(message.counts_as_unread), latest_inbound)
+
+    for contact_id, (latest, unread, latest_inbound) in by_contact.items():
+        Contact.objects.filter(pk=contact_id).update(**inbox_summary_updates(latest, unread))
+        if latest_inbound:
+            _record_contact_seen_on_commit(contact_id, latest_inbound)
+
+
+def _record_contact_seen_on_commit(contact_id: int, timestamp):
+    # last_seen is buffered and flushed in batches (conversations.services.record_contact_seen).
+    from .services import record_contact_seen
+    transaction.on_commit(lambda: record_contact_seen(contact_id, timestamp))
+
+
 class Broadcast(models.Model):
     """
     Represents a broadcast job initiated by a user. This acts as a parent
@@ -281,7 +528,8 @@ class BroadcastRecipient(models.Model):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
-        related_name='broadcast_recipient'
+        related_name='broadcast_recipient',
+        db_constraint=False,
     )
     status = models.CharField(
         max_length=20,
@@ -296,3 +544,40 @@ class BroadcastRecipient(models.Model):
     class Meta:
         unique_together = ('broadcast', 'contact')
         ordering = ['broadcast', 'contact']
+
+
+class ArchiveSegment(models.Model):
+    """
+    One compressed archive file of expired rows (see conversations.archive), with
+    the WhatsApp IDs of the contacts it covers so a contact's history can be
+    restored without reading every file.
+    """
+    KIND_MESSAGE = 'message'
+    KIND_WEBHOOK_EVENT_LOG = 'webhook_event_log'
+    KIND_CHOICES = [
+        (KIND_MESSAGE, 'Messages'),
+        (KIND_WEBHOOK_EVENT_LOG, 'Webhook Event Logs'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    month = models.DateField(help_text="First day of the month the archived rows belong to.")
+    path = models.CharField(max_length=500, unique=True, help_text="Path of the file in the archive storage.")
+    row_count = models.PositiveIntegerField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    contact_whatsapp_ids = ArrayField(models.CharField(max_length=50), default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.month:%Y-%m} ({self.row_count} rows): {self.path}"
+
+    class Meta:
+        ordering = ['kind', 'month', 'first_id']
+        verbose_name = "Archive Segment"
+        verbose_name_plural = "Archive Segments"
+        indexes = [
+            models.Index(fields=['kind', 'month'], name='archive_segment_kind_month'),
+            GinIndex(fields=['contact_whatsapp_ids'], name='archive_segment_contacts'),
+        ]
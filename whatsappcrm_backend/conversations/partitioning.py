@@ -0,0 +1,366 @@
+# whatsappcrm_backend/conversations/partitioning.py
+
+import logging
+import re
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+# Tables range-partitioned by month on a time column, once converted with
+# `manage.py partition_tables --convert`. Until then they stay plain tables and
+# everything here is a no-op, so development databases need nothing special.
+#
+# Layout of a converted table <table>:
+#   <table>_legacy        the original table, attached as-is for everything before the conversion
+#   <table>_pYYYY_MM      one partition per month, created ahead of time by ensure_partitions
+#   <table>_default       catches rows outside every range; expected to stay empty
+#
+# Postgres requires the primary key and unique indexes of a partitioned table to
+# include the partition column, so the primary key becomes (id, <column>), and
+# foreign keys can no longer point at these tables; models referencing them use
+# db_constraint=False and Django still applies on_delete itself.
+PARTITIONED_MODELS = {
+    'conversations.Message': 'timestamp',
+    'meta_integration.WebhookEventLog': 'received_at',
+}
+
+PARTITION_MONTHS_AHEAD = getattr(settings, 'PARTITION_MONTHS_AHEAD', 3)
+LOCK_TIMEOUT = getattr(settings, 'PARTITION_LOCK_TIMEOUT', '10s')
+
+_BOUND_RE = re.compile(r"FOR VALUES FROM \((?P<lower>[^)]*)\) TO \((?P<upper>[^)]*)\)")
+
+
+class PartitioningError(Exception):
+    """Raised when a table cannot be converted or maintained as a partitioned table."""
+    pass
+
+
+def partitioned_models() -> list:
+    """(model, partition column) for each table in PARTITIONED_MODELS."""
+    return [(apps.get_model(label), column) for label, column in PARTITIONED_MODELS.items()]
+
+
+def partition_column(model) -> Optional[str]:
+    return PARTITIONED_MODELS.get(model._meta.label)
+
+
+def _qn(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+
+def month_start(value: datetime) -> datetime:
+    value = value.astimezone(dt_timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _parse_bound(bound: str) -> Optional[datetime]:
+    bound = bound.strip()
+    if bound in ('MINVALUE', 'MAXVALUE'):
+        return None
+    # Postgres prints bounds like '2026-11-01 00:00:00+00', which datetime.fromisoformat()
+    # only accepts from Python 3.11 on.
+    value = parse_datetime(bound.strip("'"))
+    if value is None:
+        raise PartitioningError(f"Unrecognised partition bound: {bound}")
+    return value
+
+
+def is_partitioned(model) -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [model._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(model) -> list:
+    """
+    Partitions of `model`'s table, oldest first, as dicts with `name`, `lower` and
+    `upper` (None for an open bound) and `is_default`.
+    """
+    if not is_partitioned(model):
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [model._meta.db_table],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound or '')
+        partitions.append({
+            'name': name,
+            'lower': _parse_bound(match.group('lower')) if match else None,
+            'upper': _parse_bound(match.group('upper')) if match else None,
+            'is_default': not match,
+        })
+    # Defaults last; MINVALUE lower bounds first.
+    return sorted(partitions, key=lambda p: (p['is_default'], p['lower'] is not None, p['lower'] or datetime.min.replace(tzinfo=dt_timezone.utc)))
+
+
+# --- Future partitions ---
+def ensure_partitions(model, months_ahead: int = PARTITION_MONTHS_AHEAD, now: Optional[datetime] = None) -> list:
+    """
+    Creates the monthly partitions of `model`'s table from the current month up to
+    `months_ahead` months ahead, plus the default partition. Returns the names of
+    the partitions created. Does nothing for tables that are not partitioned.
+    """
+    if not is_partitioned(model):
+        return []
+    table = model._meta.db_table
+    existing = list_partitions(model)
+    covered_until = max((p['upper'] for p in existing if p['upper']), default=None)
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        if not any(p['is_default'] for p in existing):
+            cursor.execute(f"CREATE TABLE {_qn(table + '_default')} PARTITION OF {_qn(table)} DEFAULT")
+            created.append(table + '_default')
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if covered_until and month < covered_until:
+                continue
+            name = f"{table}_p{month:%Y_%m}"
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {_qn(name)} PARTITION OF {_qn(table)} FOR VALUES FROM (%s) TO (%s)",
+                [month, add_months(month, 1)],
+            )
+            created.append(name)
+    if created:
+        logger.info(f"Created partitions of {table}: {', '.join(created)}")
+    return created
+
+
+# --- Conversion ---
+def _index_definitions(cursor, table: str) -> list:
+    """(name, definition, is_unique) of every index on `table` except the primary key."""
+    cursor.execute(
+        """
+        SELECT index_class.relname, pg_get_indexdef(pg_index.indexrelid), pg_index.indisunique
+        FROM pg_index
+        JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+        WHERE pg_index.indrelid = to_regclass(%s) AND NOT pg_index.indisprimary
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def convert_to_partitioned(model, progress: Callable[[str], None] = None) -> bool:
+    """
+    Turns `model`'s table into a table partitioned by month on its partition column,
+    without copying rows: the existing table becomes the `<table>_legacy` partition
+    for everything before next month, and monthly partitions take over from there.
+
+    The slow parts (building the (id, column) unique index and validating the range
+    check) run first without blocking writes; the swap itself holds an exclusive
+    lock only for catalog changes. Returns False if the table is already partitioned.
+    """
+    if connection.vendor != 'postgresql':
+        raise PartitioningError("Table partitioning needs PostgreSQL.")
+    if is_partitioned(model):
+        return False
+    report = progress or logger.info
+    table, column = model._meta.db_table, partition_column(model)
+    if column is None:
+        raise PartitioningError(f"{model._meta.label} is not listed in PARTITIONED_MODELS.")
+    pk_column = model._meta.pk.column
+    legacy = f"{table}_legacy"
+    boundary = add_months(month_start(datetime.now(dt_timezone.utc)), 1)
+    key_index = f"{table[:50]}_partkey"
+    range_check = f"{table[:50]}_legacy_range"
+
+    with connection.cursor() as cursor:
+        unique_indexes = [name for name, definition, is_unique in _index_definitions(cursor, table)
+                          if is_unique and column not in definition and name != key_index]
+        if unique_indexes:
+            raise PartitioningError(
+                f"Unique indexes on {table} must include '{column}' before partitioning: {', '.join(unique_indexes)}."
+            )
+
+        report(f"Building unique index ({pk_column}, {column}) on {table}...")
+        cursor.execute(f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {_qn(key_index)} ON {_qn(table)} ({_qn(pk_column)}, {_qn(column)})")
+        report(f"Validating that every row of {table} is before {boundary:%Y-%m-%d}...")
+        cursor.execute(f"ALTER TABLE {_qn(table)} DROP CONSTRAINT IF EXISTS {_qn(range_check)}")
+        cursor.execute(f"ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(range_check)} CHECK ({_qn(column)} < %s) NOT VALID", [boundary])
+        cursor.execute(f"ALTER TABLE {_qn(table)} VALIDATE CONSTRAINT {_qn(range_check)}")
+
+    report(f"Swapping {table} for a partitioned table...")
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(f"LOCK TABLE {_qn(table)} IN ACCESS EXCLUSIVE MODE")
+
+        # Foreign keys cannot reference a partitioned table.
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE confrelid = to_regclass(%s) AND contype = 'f'",
+            [table],
+        )
+        for referencing_table, constraint in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {referencing_table} DROP CONSTRAINT {_qn(constraint)}")
+
+        # Outgoing foreign keys and indexes are recreated on the parent under their
+        # original names; the legacy partition's own copies are then attached to them.
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        indexes = [(name, definition) for name, definition, _ in _index_definitions(cursor, table) if name != key_index]
+
+        # Partitioned tables cannot have identity columns before PostgreSQL 17, so the
+        # id moves to a plain sequence continuing where the identity left off.
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = %s",
+            [table, pk_column],
+        )
+        if cursor.fetchone()[0]:
+            cursor.execute(f"SELECT COALESCE(MAX({_qn(pk_column)}), 0) FROM {_qn(table)}")
+            max_id = cursor.fetchone()[0]
+            cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [table, pk_column])
+            cursor.execute(f"SELECT last_value FROM {cursor.fetchone()[0]}")
+            next_id = max(max_id, cursor.fetchone()[0]) + 1
+            cursor.execute(f"ALTER TABLE {_qn(table)} ALTER COLUMN {_qn(pk_column)} DROP IDENTITY")
+            sequence = f"{table}_{pk_column}_seq"
+            cursor.execute(f"CREATE SEQUENCE {_qn(sequence)} START WITH {int(next_id)}")
+            cursor.execute(f"ALTER TABLE {_qn(table)} ALTER COLUMN {_qn(pk_column)} SET DEFAULT nextval('{sequence}')")
+
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'", [table],
+        )
+        primary_key = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {_qn(table)} DROP CONSTRAINT {_qn(primary_key)}")
+        cursor.execute(f"ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(legacy[:55] + '_pkey')} PRIMARY KEY USING INDEX {_qn(key_index)}")
+
+        cursor.execute(f"ALTER TABLE {_qn(table)} RENAME TO {_qn(legacy)}")
+        for name, _ in indexes:
+            cursor.execute(f"ALTER INDEX {_qn(name)} RENAME TO {_qn(name[:56] + '_legacy')}")
+
+        cursor.execute(
+            f"CREATE TABLE {_qn(table)} (LIKE {_qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE INCLUDING COMMENTS) "
+            f"PARTITION BY RANGE ({_qn(column)})"
+        )
+        cursor.execute(f"ALTER TABLE {_qn(table)} DROP CONSTRAINT {_qn(range_check)}")
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [legacy, pk_column])
+        owned_sequence = cursor.fetchone()[0]
+        if owned_sequence:
+            cursor.execute(f"ALTER SEQUENCE {owned_sequence} OWNED BY {_qn(table)}.{_qn(pk_column)}")
+        else:
+            cursor.execute(f"ALTER SEQUENCE {_qn(f'{table}_{pk_column}_seq')} OWNED BY {_qn(table)}.{_qn(pk_column)}")
+        cursor.execute(f"ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(table[:58] + '_pkey')} PRIMARY KEY ({_qn(pk_column)}, {_qn(column)})")
+        for name, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(name)} {definition}")
+
+        # The validated check lets Postgres attach the old table without scanning it.
+        cursor.execute(f"ALTER TABLE {_qn(table)} ATTACH PARTITION {_qn(legacy)} FOR VALUES FROM (MINVALUE) TO (%s)", [boundary])
+        cursor.execute(f"ALTER TABLE {_qn(legacy)} DROP CONSTRAINT {_qn(range_check)}")
+
+    ensure_partitions(model)
+    report(f"{table} is now partitioned by month on {column}.")
+    return True
+
+
+# --- Retention ---
+def _release_references(model, partition: str, batch_size: int, pause_seconds: float):
+    """
+    Applies on_delete for rows referencing the rows of `partition`, which a DROP
+    would otherwise leave dangling (the references have no database constraints).
+    """
+    relations = [rel for rel in model._meta.related_objects if rel.on_delete in (models.CASCADE, models.SET_NULL)]
+    if not relations:
+        return
+    last_id = 0
+    pk_column = model._meta.pk.column
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {_qn(pk_column)} FROM {_qn(partition)} WHERE {_qn(pk_column)} > %s ORDER BY {_qn(pk_column)} LIMIT %s",
+                [last_id, batch_size],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return
+        with transaction.atomic():
+            for rel in relations:
+                referencing = rel.related_model._base_manager.filter(**{f'{rel.field.attname}__in': ids})
+                if rel.on_delete is models.SET_NULL:
+                    referencing.update(**{rel.field.attname: None})
+                else:
+                    referencing.delete()
+        last_id = ids[-1]
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+
+def drop_expired_partitions(model, cutoff: datetime, archive: bool = True, batch_size: int = 500,
+                            pause_seconds: float = 0.1, dry_run: bool = False,
+                            progress: Callable[[str], None] = None) -> list:
+    """
+    Drops the partitions of `model`'s table whose whole range is before `cutoff`,
+    oldest first. Their rows are archived first (see conversations.archive) and
+    rows of other tables referencing them get their on_delete applied.
+    Returns the names of the partitions dropped (or that would be, on a dry run).
+    """
+    from .archive import archive_expired_rows, kind_for_model
+
+    table = model._meta.db_table
+    expired = [p for p in list_partitions(model) if not p['is_default'] and p['upper'] and p['upper'] <= cutoff]
+    if dry_run:
+        return [p['name'] for p in expired]
+
+    dropped = []
+    for partition in expired:
+        if archive:
+            stats = archive_expired_rows(
+                kind_for_model(model), partition['upper'], since=partition['lower'],
+                delete_rows=False, progress=progress,
+            )
+            logger.info(f"Archived {stats['archived']} row(s) of partition {partition['name']} before dropping it.")
+        _release_references(model, partition['name'], batch_size, pause_seconds)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            cursor.execute(f"ALTER TABLE {_qn(table)} DETACH PARTITION {_qn(partition['name'])}")
+            cursor.execute(f"DROP TABLE {_qn(partition['name'])}")
+        dropped.append(partition['name'])
+        if progress:
+            progress(f"Dropped partition {partition['name']}.")
+    return dropped
+
+
+def row_retention_cutoff(model, cutoff: datetime) -> Optional[datetime]:
+    """
+    The cutoff row-by-row retention should use for `model`: `cutoff` itself for a
+    plain table. For a partitioned table, monthly partitions are only ever dropped
+    whole, so row deletes are limited to the legacy partition; None if there is none.
+    """
+    if not is_partitioned(model):
+        return cutoff
+    legacy = next((p for p in list_partitions(model) if p['name'] == f"{model._meta.db_table}_legacy"), None)
+    if legacy is None:
+        return None
+    return min(cutoff, legacy['upper'])
@@ -0,0 +1,324 @@
+# whatsappcrm_backend/conversations/realtime.py
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = getattr(settings, 'REALTIME_FLUSH_INTERVAL_MS', 100) / 1000
+MAX_BUFFERED_EVENTS = getattr(settings, 'REALTIME_MAX_BUFFERED_EVENTS', 10000)
+
+# Presence: one sorted set per conversation holding the channel names of consumers.
+# Connected consumers score +inf; on disconnect the score becomes the disconnect
+# time, so the conversation still counts as watched for RESUME_GRACE_SECONDS and a
+# client reconnecting after a network blip finds the events it missed in the
+# stream buffer. A worker that dies without disconnecting leaves its entries
+# behind until the key expires, which only costs unneeded publishes.
+PRESENCE_KEY = "conversation_presence:{contact_id}"
+PRESENCE_TTL_SECONDS = 86400
+RESUME_GRACE_SECONDS = getattr(settings, 'REALTIME_RESUME_GRACE_SECONDS', 120)
+
+# Stream: every published event gets a per-conversation sequence number and is kept
+# in a short Redis ring buffer (a sorted set scored by seq) so reconnecting clients
+# can resume with ?since=<seq>. Sequence numbers are millisecond timestamps made
+# strictly increasing (max(previous + 1, now)), so a seq older than the buffer can
+# still be turned into a point in time for the database fallback.
+STREAM_KEY = "conversation_stream:{contact_id}"
+STREAM_SEQ_KEY = "conversation_stream:seq:{contact_id}"
+STREAM_TRIMMED_KEY = "conversation_stream:trimmed:{contact_id}"
+STREAM_BUFFER_SIZE = getattr(settings, 'REALTIME_STREAM_BUFFER_SIZE', 200)
+STREAM_BUFFER_TTL_SECONDS = getattr(settings, 'REALTIME_STREAM_BUFFER_TTL_SECONDS', 3600)
+STREAM_SEQ_TTL_SECONDS = 30 * 86400
+
+# KEYS: seq, buffer, trimmed marker. ARGV: event JSON without seq, now (ms), buffer size, buffer TTL, seq TTL.
+# Returns the event's seq. The highest trimmed seq is remembered so a resume from
+# before it is known to be incomplete.
+_APPEND_EVENT_SCRIPT = """
+local seq = math.max(tonumber(redis.call('GET', KEYS[1]) or '0') + 1, tonumber(ARGV[2]))
+redis.call('SET', KEYS[1], seq, 'EX', ARGV[5])
+local event = '{"seq":' .. seq .. ',' .. string.sub(ARGV[1], 2)
+redis.call('ZADD', KEYS[2], seq, event)
+local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[3])
+if excess > 0 then
+    local trimmed = redis.call('ZRANGE', KEYS[2], excess - 1, excess - 1, 'WITHSCORES')
+    redis.call('SET', KEYS[3], trimmed[2], 'EX', ARGV[4])
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, excess - 1)
+end
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return seq
+"""
+_append_event_script = None
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+# --- Presence ---
+def join_conversation(contact_id: int, channel_name: str):
+    key = PRESENCE_KEY.format(contact_id=contact_id)
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        pipe.zadd(key, {channel_name: float('inf')})
+        pipe.expire(key, PRESENCE_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not record presence in conversation {contact_id}: {e}")
+
+
+def leave_conversation(contact_id: int, channel_name: str):
+    key = PRESENCE_KEY.format(contact_id=contact_id)
+    now = time.time()
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        pipe.zadd(key, {channel_name: now})
+        pipe.zremrangebyscore(key, '-inf', now - RESUME_GRACE_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not clear presence in conversation {contact_id}: {e}")
+
+
+def watched_conversations(contact_ids) -> set:
+    """
+    Returns the subset of `contact_ids` with a connected consumer, or one that
+    disconnected less than RESUME_GRACE_SECONDS ago.
+    """
+    contact_ids = list(contact_ids)
+    cutoff = time.time() - RESUME_GRACE_SECONDS
+    try:
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        for contact_id in contact_ids:
+            pipe.zcount(PRESENCE_KEY.format(contact_id=contact_id), cutoff, '+inf')
+        return {contact_id for contact_id, count in zip(contact_ids, pipe.execute()) if count}
+    except Exception as e:
+        # Without presence information, publish everything rather than drop events.
+        logger.warning(f"Presence lookup failed, publishing to all conversations. Error: {e}")
+        return set(contact_ids)
+
+
+# --- Stream ---
+def append_to_stream(contact_id: int, event: dict) -> int:
+    """Stores `event` in the conversation's ring buffer and returns its seq (None if Redis is unavailable)."""
+    global _append_event_script
+    try:
+        redis_conn = get_redis_connection("default")
+        if _append_event_script is None:
+            _append_event_script = redis_conn.register_script(_APPEND_EVENT_SCRIPT)
+        keys = [key.format(contact_id=contact_id) for key in (STREAM_SEQ_KEY, STREAM_KEY, STREAM_TRIMMED_KEY)]
+        args = [json.dumps(event, separators=(',', ':')), _now_ms(), STREAM_BUFFER_SIZE, STREAM_BUFFER_TTL_SECONDS, STREAM_SEQ_TTL_SECONDS]
+        return int(_append_event_script(keys=keys, args=args, client=redis_conn))
+    except Exception as e:
+        logger.warning(f"Could not append event to the stream of conversation {contact_id}: {e}")
+        return None
+
+
+def current_stream_seq(contact_id: int) -> int:
+    try:
+        return int(get_redis_connection("default").get(STREAM_SEQ_KEY.format(contact_id=contact_id)) or 0)
+    except Exception as e:
+        logger.warning(f"Could not read the stream position of conversation {contact_id}: {e}")
+        return 0
+
+
+def buffered_events_since(contact_id: int, since: int):
+    """
+    Returns the buffered events after `since`, oldest first, or None if the
+    buffer cannot prove it holds all of them: `since` is older than the
+    resume grace period (events may have been skipped while nobody was
+    watching), or older than events already trimmed from the buffer.
+    """
+    if since < _now_ms() - RESUME_GRACE_SECONDS * 1000:
+        return None
+    try:
+        redis_conn = get_redis_connection("default")
+        pipe = redis_conn.pipeline(transaction=True)
+        pipe.get(STREAM_TRIMMED_KEY.format(contact_id=contact_id))
+        pipe.zrangebyscore(STREAM_KEY.format(contact_id=contact_id), f"({since}", '+inf')
+        trimmed, raw_events = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not read the stream buffer of conversation {contact_id}: {e}")
+        return None
+    if trimmed is not None and since < int(trimmed):
+        return None
+    return [json.loads(raw) for raw in raw_events]
+
+
+# Messages carry Meta's timestamp, which can trail the moment they were published,
+# so the database fallback looks back a little further than the seq it resumes from.
+RESUME_DB_MARGIN_SECONDS = 300
+RESUME_DB_LIMIT = 200
+
+
+def messages_changed_since(contact_id: int, since: int):
+    """
+    Database fallback for a resume the buffer cannot serve: created deltas of the
+    conversation's messages created or updated since seq `since`, oldest first,
+    or None if there are more than RESUME_DB_LIMIT (the client should reload).
+    """
+    from .models import Message
+
+    changed_after = datetime.fromtimestamp(since / 1000, tz=dt_timezone.utc) - timedelta(seconds=RESUME_DB_MARGIN_SECONDS)
+    messages = list(
+        Message.objects.filter(contact_id=contact_id)
+        .filter(Q(timestamp__gt=changed_after) | Q(status_timestamp__gt=changed_after))
+        .order_by('timestamp', 'id')[:RESUME_DB_LIMIT + 1]
+    )
+    if len(messages) > RESUME_DB_LIMIT:
+        return None
+    return [message_created_delta(message) for message in messages]
+
+
+# --- Deltas ---
+def message_created_delta(message) -> dict:
+    """The fields a conversation view needs to render a new message bubble."""
+    from .serializers import MessageListSerializer
+
+    delta = {
+        'id': message.id,
+        'direction': message.direction,
+        'message_type': message.message_type,
+        'text_content': message.text_content,
+        'content_preview': MessageListSerializer().get_content_preview(message),
+        'timestamp': message.timestamp.isoformat() if message.timestamp else None,
+        'status': message.status,
+        'is_internal_note': message.is_internal_note,
+    }
+    if message.message_type == 'interactive':
+        delta['content_payload'] = message.content_payload
+    return delta
+
+
+def message_updated_delta(message) -> dict:
+    """An existing message only ever changes status after it is created."""
+    delta = {
+        'id': message.id,
+        'status': message.status,
+        'status_timestamp': message.status_timestamp.isoformat() if message.status_timestamp else None,
+    }
+    if message.status == 'failed' and message.error_details:
+        delta['error_details'] = message.error_details
+    return delta
+
+
+# --- Publisher ---
+class RealtimePublisher:
+    """
+    Buffers conversation events and publishes them from one background thread
+    with its own event loop, instead of a new event loop and a blocking
+    group_send per Message save.
+
+    Every FLUSH_INTERVAL_SECONDS the buffer is drained, events are grouped per
+    conversation, conversations nobody is watching are skipped, and each
+    remaining conversation gets at most one 'chat.messages' (new messages) and
+    one 'message.updates' (status deltas) event. A message created and updated
+    within the same flush goes out once, as created with its latest status.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._thread = None
+        self._pid = None
+
+    def publish(self, contact_id: int, kind: str, delta: dict):
+        if not contact_id:
+            return
+        with self._lock:
+            if len(self._buffer) >= MAX_BUFFERED_EVENTS:
+                logger.warning(f"Realtime buffer full ({MAX_BUFFERED_EVENTS} events); dropping event for conversation {contact_id}.")
+                return
+            self._buffer.append((contact_id, kind, delta))
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        # Started lazily, and again in forked worker processes, which do not inherit threads.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='realtime-publisher', daemon=True)
+            self._thread.start()
+
+    def _drain(self) -> list:
+        with self._lock:
+            events, self._buffer = self._buffer, []
+        return events
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while True:
+            time.sleep(FLUSH_INTERVAL_SECONDS)
+            events = self._drain()
+            if not events:
+                continue
+            try:
+                loop.run_until_complete(self._publish(events))
+            except Exception as e:
+                logger.error(f"Error publishing {len(events)} realtime event(s): {e}", exc_info=True)
+
+    def flush(self):
+        """Publishes whatever is buffered right now, on the calling thread."""
+        events = self._drain()
+        if events:
+            try:
+                asyncio.run(self._publish(events))
+            except Exception as e:
+                logger.error(f"Error flushing {len(events)} realtime event(s): {e}", exc_info=True)
+
+    @staticmethod
+    def _group(events: list) -> dict:
+        by_contact = defaultdict(lambda: {'created': {}, 'updated': {}})
+        for contact_id, kind, delta in events:
+            conversation = by_contact[contact_id]
+            if kind == 'updated' and delta['id'] in conversation['created']:
+                conversation['created'][delta['id']].update(delta)
+            else:
+                conversation[kind].setdefault(delta['id'], {}).update(delta)
+        return by_contact
+
+    async def _publish(self, events: list):
+        by_contact = self._group(events)
+        watched = watched_conversations(by_contact.keys())
+        channel_layer = get_channel_layer()
+        for contact_id in watched:
+            conversation = by_contact[contact_id]
+            group_name = f"conversation_{contact_id}"
+            try:
+                for event_type, kind in (('chat.messages', 'created'), ('message.updates', 'updated')):
+                    if not conversation[kind]:
+                        continue
+                    messages = list(conversation[kind].values())
+                    seq = append_to_stream(contact_id, {'type': event_type, 'messages': messages})
+                    await channel_layer.group_send(group_name, {'type': event_type, 'messages': messages, 'seq': seq})
+            except Exception as e:
+                logger.error(f"Error publishing to group {group_name}: {e}", exc_info=True)
+        skipped = len(by_contact) - len(watched)
+        if skipped:
+            logger.debug(f"Skipped realtime events for {skipped} unwatched conversation(s).")
+
+
+publisher = RealtimePublisher()
+atexit.register(publisher.flush)
+
+
+def publish_message_created(message):
+    publisher.publish(message.contact_id, 'created', message_created_delta(message))
+
+
+def publish_message_updated(message):
+    publisher.publish(message.contact_id, 'updated', message_updated_delta(message))
@@ -0,0 +1,81 @@
+# whatsappcrm_backend/conversations/search.py
+
+import logging
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import F, Q, Subquery
+from django.db.models.functions import Greatest
+
+from .models import Contact, Message
+
+logger = logging.getLogger(__name__)
+
+# Messages mix English and Shona, so words are indexed as written: no stemming, no stop words.
+# MESSAGE_SEARCH_VECTOR must stay identical to the expression of the 'message_text_search'
+# index on Message, or Postgres will not use the index.
+TEXT_SEARCH_CONFIG = 'simple'
+MESSAGE_SEARCH_VECTOR = SearchVector('text_content', config=TEXT_SEARCH_CONFIG)
+
+# Only the newest matches are ranked, so a very common word costs a bounded amount of work.
+MESSAGE_RANK_CANDIDATES = getattr(settings, 'SEARCH_MESSAGE_RANK_CANDIDATES', 1000)
+MAX_RESULTS = 50
+MIN_PHONE_DIGITS = 3
+
+
+def _clamp_limit(limit: int) -> int:
+    return max(1, min(limit or 20, MAX_RESULTS))
+
+
+def contact_search_filter(term: str) -> Q:
+    """
+    Contacts whose name is close to `term` (trigram word similarity, so typos and
+    partial names match) or whose phone number contains its digits. Both use
+    the trigram GIN indexes on Contact.
+    """
+    condition = Q(name__trigram_word_similar=term)
+    digits = re.sub(r'\D', '', term)
+    if len(digits) >= MIN_PHONE_DIGITS:
+        condition |= Q(whatsapp_id__contains=digits)
+    return condition
+
+
+def search_contacts(term: str, limit: int = 20):
+    """Contacts matching `term`, best match first."""
+    term = (term or '').strip()
+    if not term:
+        return Contact.objects.none()
+    queryset = Contact.objects.filter(contact_search_filter(term)).annotate(
+        rank=Greatest(TrigramWordSimilarity(term, 'name'), TrigramWordSimilarity(term, 'whatsapp_id')),
+    )
+    return queryset.order_by('-rank', F('last_message_at').desc(nulls_last=True))[:_clamp_limit(limit)]
+
+
+def search_messages(term: str, contact_id: int = None, limit: int = 20):
+    """
+    Messages whose text matches `term` (web search syntax: quoted phrases, OR,
+    -exclusions), ranked by relevance among the newest MESSAGE_RANK_CANDIDATES
+    matches. Each result carries `rank` and a `headline` with the matched
+    words marked <b>...</b>.
+    """
+    term = (term or '').strip()
+    if not term:
+        return Message.objects.none()
+    query = SearchQuery(term, config=TEXT_SEARCH_CONFIG, search_type='websearch')
+
+    matches = Message.objects.annotate(search=MESSAGE_SEARCH_VECTOR).filter(search=query)
+    if contact_id:
+        matches = matches.filter(contact_id=contact_id)
+    candidate_ids = matches.order_by('-timestamp').values('id')[:MESSAGE_RANK_CANDIDATES]
+
+    return (
+        Message.objects.filter(id__in=Subquery(candidate_ids))
+        .select_related('contact')
+        .annotate(
+            rank=SearchRank(MESSAGE_SEARCH_VECTOR, query),
+            headline=SearchHeadline('text_content', query, config=TEXT_SEARCH_CONFIG, max_words=20, min_words=8),
+        )
+        .order_by('-rank', '-timestamp')[:_clamp_limit(limit)]
+    )
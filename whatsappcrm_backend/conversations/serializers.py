@@ -1,8 +1,10 @@
 # whatsappcrm_backend/conversations/serializers.py
 
 from datetime import timezone
+from django.db import models
 from rest_framework import serializers
-from .models import Contact, Message, Broadcast, BroadcastRecipient
+from .models import Contact, Message, Broadcast, BroadcastRecipient, load_message_payloads
+from .services import get_live_broadcast_counters, get_conversation_window, load_buffered_broadcast_counters
 from customer_data.serializers import MemberProfileSerializer
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -45,6 +47,9 @@ class MessageSerializer(serializers.ModelSerializer):
     message_type_display = serializers.CharField(source='get_message_type_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     direction_display = serializers.CharField(source='get_direction_display', read_only=True)
+    # Stored in MessagePayload; see Message.content_payload.
+    content_payload = serializers.JSONField()
+    error_details = serializers.JSONField(read_only=True)
 
     class Meta:
         model = Message
@@ -100,13 +105,29 @@ class MessageSerializer(serializers.ModelSerializer):
             
         return message
 
+# Message types whose list rendering (preview, interactive bubbles) needs the raw payload.
+# Lists load payloads for these types only, in one query per page.
+PAYLOAD_PREVIEW_TYPES = {'document', 'interactive', 'button', 'system'}
+
+
+class MessagePayloadLoadingListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        messages = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        load_message_payloads([m for m in messages if m.message_type in PAYLOAD_PREVIEW_TYPES])
+        return super().to_representation(messages)
+
+
 class MessageListSerializer(MessageSerializer):
     """
-    A more concise serializer for listing Messages, excluding bulky fields like full content_payload.
+    A more concise serializer for listing Messages. The raw content_payload is only
+    included for types listed in PAYLOAD_PREVIEW_TYPES; text and media messages are
+    rendered from text_content and content_preview.
     """
     content_preview = serializers.SerializerMethodField()
+    content_payload = serializers.SerializerMethodField()
 
     class Meta(MessageSerializer.Meta):
+        list_serializer_class = MessagePayloadLoadingListSerializer
         # Override fields from MessageSerializer.Meta
         fields = [
             'id',
@@ -127,6 +148,9 @@ class MessageListSerializer(MessageSerializer):
         ]
         # read_only_fields are inherited and all listed fields are effectively read_only here.
 
+    def get_content_payload(self, obj: Message):
+        return obj.content_payload if obj.message_type in PAYLOAD_PREVIEW_TYPES else None
+
     def get_content_preview(self, obj: Message) -> str:
         if obj.text_content:
             return (obj.text_content[:75] + '...') if len(obj.text_content) > 75 else obj.text_content
@@ -161,32 +185,58 @@ class MessageListSerializer(MessageSerializer):
 class ContactListSerializer(ContactSerializer):
     """
     Serializer for the contact list view. It adds extra context like
-    the last message preview and unread count, which are expected to be
-    annotated onto the queryset by the view.
+    the last message preview and unread count, read from the inbox summary
+    columns kept on Contact.
     """
     last_message_preview = serializers.CharField(read_only=True, default="No messages yet")
-    unread_count = serializers.IntegerField(read_only=True, default=0)
+    unread_count = serializers.IntegerField(source='unread_inbound_count', read_only=True)
 
     class Meta(ContactSerializer.Meta):
         # Inherit all fields from the base ContactSerializer and add the new ones.
-        fields = ContactSerializer.Meta.fields + ['last_message_preview', 'unread_count']
+        fields = ContactSerializer.Meta.fields + ['last_message_preview', 'last_message_at', 'last_message_direction', 'unread_count']
+        read_only_fields = ContactSerializer.Meta.read_only_fields + ('last_message_at', 'last_message_direction')
+
+
+
+class ContactSearchResultSerializer(ContactListSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(ContactListSerializer.Meta):
+        fields = ContactListSerializer.Meta.fields + ['rank']
 
 
+class MessageSearchResultSerializer(MessageListSerializer):
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(read_only=True)
+
+    class Meta(MessageListSerializer.Meta):
+        fields = [field for field in MessageListSerializer.Meta.fields if field != 'content_payload'] + ['rank', 'headline']
+
 
 class ContactDetailSerializer(ContactSerializer):
     """
     Contact serializer that includes the nested CustomerProfile 
-    and a list of recent messages for detailed views.
+    and the latest window of messages for detailed views.
     """
     # The `source` attribute points to the related model manager on the Contact model.
     # `member_profile` is the likely `related_name` from a OneToOneField on MemberProfile.
     customer_profile = MemberProfileSerializer(source='member_profile', read_only=True)
-    # The `source` for recent_messages should be 'messages' to use the Prefetch from the view.
-    recent_messages = MessageListSerializer(many=True, read_only=True, source='messages')
 
     class Meta(ContactSerializer.Meta):
         # Inherit fields from ContactSerializer and add new ones
-        fields = ContactSerializer.Meta.fields + ['customer_profile', 'recent_messages']
+        fields = ContactSerializer.Meta.fields + ['customer_profile']
+
+    def to_representation(self, instance):
+        # Only the latest messages are included (see get_conversation_window);
+        # older ones load from the contact's messages endpoint using the cursor.
+        data = super().to_representation(instance)
+        window = get_conversation_window(
+            instance, size=self.context.get('message_window'), request=self.context.get('request')
+        )
+        data['recent_messages'] = window['messages']
+        data['older_messages_cursor'] = window['older_messages_cursor']
+        data['older_messages_url'] = window['older_messages_url']
+        return data
 
 class BroadcastCreateSerializer(serializers.Serializer):
     """
@@ -226,15 +276,30 @@ class BroadcastRecipientSerializer(serializers.ModelSerializer):
         fields = ['id', 'contact', 'status', 'status_timestamp']
 
 
+class BroadcastCounterLoadingListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        broadcasts = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        load_buffered_broadcast_counters(broadcasts)
+        return super().to_representation(broadcasts)
+
+
 class BroadcastSerializer(serializers.ModelSerializer):
     """Serializer for displaying the details and aggregate status of a Broadcast job."""
-    recipients = BroadcastRecipientSerializer(many=True, read_only=True, help_text="A list of recipients and their individual statuses.")
+    # Recipients are served paginated from BroadcastViewSet.recipients; nesting them
+    # here would load every row just to render the progress counters.
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
 
     class Meta:
         model = Broadcast
+        list_serializer_class = BroadcastCounterLoadingListSerializer
         fields = [
             'id', 'name', 'template_name', 'created_by_username', 'created_at', 'status',
             'total_recipients', 'pending_dispatch_count', 'sent_count', 'delivered_count',
             'read_count', 'failed_count'
-        ]
\ No newline at end of file
+        ]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Overlay counter deltas that are still buffered in Redis so progress is live.
+        data.update(get_live_broadcast_counters(instance))
+        return data
\ No newline at end of file
@@ -1,7 +1,17 @@
 # whatsappcrm_backend/conversations/services.py
 
 import logging
-from .models import Contact
+from django.conf import settings
+from django.core.cache import cache
+from datetime import datetime, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import F, Case, When, Value, DateTimeField
+from django.db.models.functions import Greatest
+from django.urls import reverse
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from .models import Contact, Message, Broadcast, BroadcastRecipient, save_message_payloads, update_inbox_summaries
 from meta_integration.models import MetaAppConfig # Keep for type hinting, even if not used directly on model
 
 logger = logging.getLogger(__name__)
@@ -41,4 +51,393 @@ def get_or_create_contact_by_wa_id(wa_id: str, name: str = None, meta_app_config
             # last_seen is auto_now, so it will be updated automatically on save.
             contact.save(update_fields=['name'])
 
-    return contact, created
\ No newline at end of file
+    return contact, created
+
+# --- Broadcast Delivery Counters ---
+# Status webhooks for a large broadcast arrive in bursts of thousands. Rather than
+# issuing an UPDATE against the same Broadcast row for every webhook (a hot-row
+# lock), each counter change is buffered in a Redis hash and folded into the
+# database periodically by `flush_broadcast_counters` using F() expressions.
+#
+# Counters are cumulative: a message that has been read also counts as sent and
+# delivered, so `read_count <= delivered_count <= sent_count` always holds.
+
+BROADCAST_COUNTER_FIELDS = (
+    'pending_dispatch_count', 'sent_count', 'delivered_count', 'read_count', 'failed_count',
+)
+BROADCAST_COUNTER_KEY = "broadcast_counters:{broadcast_id}"
+BROADCAST_COUNTER_DIRTY_SET = "broadcast_counters:dirty"
+
+# Forward-only ordering of delivery states. 'failed' is terminal and handled separately.
+_BROADCAST_STATUS_RANK = {'pending_dispatch': 0, 'sent': 1, 'delivered': 2, 'read': 3}
+
+
+def _broadcast_counter_deltas(previous_status: str, new_status: str) -> dict:
+    """
+    Returns the counter changes caused by a recipient moving from `previous_status`
+    to `new_status`, or an empty dict if the transition should not be counted.
+    """
+    if previous_status == 'failed' or previous_status == new_status:
+        return {}
+
+    deltas = {}
+    if new_status == 'failed':
+        if previous_status == 'read':
+            return {}
+        deltas['failed_count'] = 1
+    else:
+        previous_rank = _BROADCAST_STATUS_RANK.get(previous_status, 0)
+        new_rank = _BROADCAST_STATUS_RANK.get(new_status)
+        if new_rank is None or new_rank <= previous_rank:
+            return {}
+        # Out-of-order webhooks (e.g. 'read' before 'delivered') still credit every
+        # intermediate state exactly once.
+        for status_value, rank in _BROADCAST_STATUS_RANK.items():
+            if previous_rank < rank <= new_rank:
+                deltas[f"{status_value}_count"] = 1
+
+    if previous_status == 'pending_dispatch':
+        deltas['pending_dispatch_count'] = -1
+    return deltas
+
+
+def _apply_broadcast_counter_deltas(broadcast_id: int, deltas: dict):
+    """Writes counter deltas straight to the Broadcast row using F() expressions."""
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not updates:
+        return
+    Broadcast.objects.filter(pk=broadcast_id).update(**updates)
+    # A broadcast is complete once nothing is left waiting for dispatch.
+    Broadcast.objects.filter(
+        pk=broadcast_id, status='in_progress', pending_dispatch_count=0
+    ).update(status='completed')
+
+
+def increment_broadcast_counters(broadcast_id: int, deltas: dict):
+    """
+    Buffers counter deltas for a broadcast in Redis. Falls back to a direct
+    database update if Redis is unavailable so no transition is lost.
+    """
+    if not deltas:
+        return
+    try:
+        redis_conn = get_redis_connection("default")
+        pipe = redis_conn.pipeline()
+        key = BROADCAST_COUNTER_KEY.format(broadcast_id=broadcast_id)
+        for field, delta in deltas.items():
+            pipe.hincrby(key, field, delta)
+        pipe.sadd(BROADCAST_COUNTER_DIRTY_SET, broadcast_id)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not buffer counters for Broadcast {broadcast_id} in Redis, writing directly. Error: {e}")
+        _apply_broadcast_counter_deltas(broadcast_id, deltas)
+
+
+def record_broadcast_status_transition(message_id: int, new_status: str, status_timestamp=None) -> bool:
+    """
+    Moves the BroadcastRecipient linked to `message_id` to `new_status` and buffers
+    the resulting counter changes.
+
+    The status change is a compare-and-swap on the recipient row, so duplicate or
+    concurrent webhooks for the same state are counted only once.
+    Returns True if a transition was recorded.
+    """
+    for _ in range(3):
+        recipient = BroadcastRecipient.objects.filter(message_id=message_id).values('id', 'broadcast_id', 'status').first()
+        if not recipient:
+            return False
+
+        deltas = _broadcast_counter_deltas(recipient['status'], new_status)
+        if not deltas:
+            return False
+
+        swapped = BroadcastRecipient.objects.filter(
+            pk=recipient['id'], status=recipient['status']
+        ).update(status=new_status, status_timestamp=status_timestamp)
+        if swapped:
+            increment_broadcast_counters(recipient['broadcast_id'], deltas)
+            return True
+        # Another worker moved the recipient in the meantime; re-read and try again.
+    logger.warning(f"Gave up recording broadcast transition to '{new_status}' for message {message_id} after repeated contention.")
+    return False
+
+
+def get_buffered_broadcast_counters(broadcast_id: int) -> dict:
+    """Returns counter deltas for a broadcast that have not been flushed to the database yet."""
+    try:
+        redis_conn = get_redis_connection("default")
+        raw = redis_conn.hgetall(BROADCAST_COUNTER_KEY.format(broadcast_id=broadcast_id))
+    except Exception as e:
+        logger.warning(f"Could not read buffered counters for Broadcast {broadcast_id}. Error: {e}")
+        return {}
+    return {field.decode(): int(value) for field, value in raw.items()}
+
+
+def load_buffered_broadcast_counters(broadcasts) -> None:
+    """
+    Fetches the buffered counter deltas of many broadcasts in one Redis pipeline and
+    caches them on the instances, so get_live_broadcast_counters() makes no further
+    round trips for them. Use it for list pages and admin changelists.
+    """
+    broadcasts = list(broadcasts)
+    if not broadcasts:
+        return
+    try:
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        for broadcast in broadcasts:
+            pipe.hgetall(BROADCAST_COUNTER_KEY.format(broadcast_id=broadcast.pk))
+        results = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not read buffered counters for {len(broadcasts)} broadcast(s). Error: {e}")
+        results = [{} for _ in broadcasts]
+    for broadcast, raw in zip(broadcasts, results):
+        broadcast._buffered_counters = {field.decode(): int(value) for field, value in raw.items()}
+
+
+def get_live_broadcast_counters(broadcast: Broadcast) -> dict:
+    """
+    Returns the broadcast's counters including not-yet-flushed deltas. This is a
+    single Redis round trip on top of the already loaded row, or none if
+    load_buffered_broadcast_counters() already fetched them.
+    """
+    buffered = getattr(broadcast, '_buffered_counters', None)
+    if buffered is None:
+        buffered = get_buffered_broadcast_counters(broadcast.pk)
+    return {
+        field: getattr(broadcast, field) + buffered.get(field, 0)
+        for field in BROADCAST_COUNTER_FIELDS
+    }
+
+
+def flush_broadcast_counters() -> int:
+    """
+    Folds all buffered broadcast counter deltas into the database.
+    Returns the number of broadcasts that were updated.
+    """
+    redis_conn = get_redis_connection("default")
+    flushed = 0
+    while True:
+        broadcast_id = redis_conn.spop(BROADCAST_COUNTER_DIRTY_SET)
+        if broadcast_id is None:
+            break
+        broadcast_id = int(broadcast_id)
+        key = BROADCAST_COUNTER_KEY.format(broadcast_id=broadcast_id)
+
+        # Read and clear the hash atomically so increments arriving meanwhile land in a fresh hash.
+        pipe = redis_conn.pipeline(transaction=True)
+        pipe.hgetall(key)
+        pipe.delete(key)
+        raw, _ = pipe.execute()
+        deltas = {field.decode(): int(value) for field, value in raw.items() if int(value)}
+        if not deltas:
+            continue
+
+        try:
+            _apply_broadcast_counter_deltas(broadcast_id, deltas)
+            flushed += 1
+        except Exception as e:
+            logger.error(f"Failed to flush counters for Broadcast {broadcast_id}, re-buffering. Error: {e}", exc_info=True)
+            increment_broadcast_counters(broadcast_id, deltas)
+            break
+    return flushed
+
+
+def dispatch_broadcast_messages(broadcast: Broadcast, contact_ids: list, template_name: str, language_code: str,
+                                components_template, active_config: MetaAppConfig):
+    """
+    Personalizes the template components for every contact, creates the
+    broadcast's messages and recipients and records their sends (on the bulk lane)
+    in the outbox, all in one transaction: a failure leaves nothing half-sent, and
+    a broadcast that already has recipients (e.g. a redelivered dispatch task) is
+    not sent again. Called from the send-template request for small audiences, and
+    from dispatch_broadcast_task on the CPU lane for large ones.
+    Returns (dispatched count, render stats).
+    """
+    # Local imports to avoid circular imports with rendering.py (flows.services), signals.py and meta_integration.tasks
+    from .rendering import render_broadcast_components
+    from .signals import broadcast_new_messages
+    from meta_integration.tasks import send_whatsapp_message_task
+    from outbox.services import enqueue_tasks
+
+    contacts_to_message = list(Contact.objects.filter(id__in=contact_ids).only('id', 'whatsapp_id'))
+
+    # Personalize the components for every recipient in one pass (template compiled once).
+    rendered_components, render_stats = {}, None
+    if components_template:
+        rendered_components, render_stats = render_broadcast_components(components_template, contact_ids)
+
+    now = timezone.now()
+    messages = []
+    for contact in contacts_to_message:
+        content_payload = {
+            "name": template_name,
+            "language": {"code": language_code}
+        }
+        components = rendered_components.get(contact.id)
+        if components:
+            content_payload["components"] = components
+        messages.append(Message(
+            contact=contact, app_config=active_config, direction='out',
+            message_type='template', content_payload=content_payload,
+            status='pending_dispatch', timestamp=now
+        ))
+
+    with transaction.atomic():
+        # A second dispatch of the same broadcast waits here, then finds the recipients and stops.
+        Broadcast.objects.select_for_update().filter(pk=broadcast.pk).first()
+        if BroadcastRecipient.objects.filter(broadcast=broadcast).exists():
+            logger.warning(f"Broadcast {broadcast.pk} was already dispatched. Not sending it again.")
+            return 0, render_stats
+
+        Message.objects.bulk_create(messages, batch_size=1000)
+        save_message_payloads(messages)
+        update_inbox_summaries(messages)
+        BroadcastRecipient.objects.bulk_create(
+            [BroadcastRecipient(broadcast=broadcast, contact_id=m.contact_id, message=m) for m in messages],
+            batch_size=1000,
+        )
+        # The audience may have changed since the broadcast was created; count what was actually queued.
+        Broadcast.objects.filter(pk=broadcast.pk).update(
+            status='in_progress', total_recipients=len(messages), pending_dispatch_count=len(messages)
+        )
+        # Sent through the bulk lane, so a large broadcast doesn't hold up conversational replies.
+        enqueue_tasks(
+            send_whatsapp_message_task, [[m.id, active_config.id] for m in messages], queue=settings.QUEUE_BULK_SENDS
+        )
+        transaction.on_commit(lambda: broadcast_new_messages(messages))
+
+    logger.info(f"Dispatched {len(messages)} template message(s) for Broadcast {broadcast.pk}.")
+    return len(messages), render_stats
+
+
+# --- Contact Last Seen ---
+# Contact.last_seen marks the contact's own activity, which is what the 24-hour
+# messaging window needs, so only inbound messages move it. Rather than an UPDATE
+# of the contact row per message, each inbound message records its timestamp in a
+# Redis sorted set (ZADD GT keeps the newest per contact), and
+# `flush_contact_last_seen` writes the whole set every few seconds in batched
+# UPDATEs that never move last_seen backwards.
+
+CONTACT_LAST_SEEN_KEY = "contact_last_seen:pending"
+CONTACT_LAST_SEEN_BATCH_SIZE = 500
+
+
+def _apply_contact_last_seen(seen: dict):
+    """Moves last_seen forward to the given {contact_id: datetime} in batched UPDATEs."""
+    items = list(seen.items())
+    for start in range(0, len(items), CONTACT_LAST_SEEN_BATCH_SIZE):
+        batch = dict(items[start:start + CONTACT_LAST_SEEN_BATCH_SIZE])
+        seen_at = Case(
+            *[When(pk=contact_id, then=Value(timestamp)) for contact_id, timestamp in batch.items()],
+            output_field=DateTimeField(),
+        )
+        Contact.objects.filter(pk__in=batch.keys(), last_seen__lt=seen_at).update(last_seen=Greatest(F('last_seen'), seen_at))
+
+
+def record_contact_seen(contact_id: int, timestamp: datetime):
+    """
+    Buffers an inbound message's timestamp as the contact's last_seen. Falls back
+    to a direct database update if Redis is unavailable.
+    """
+    try:
+        get_redis_connection("default").zadd(CONTACT_LAST_SEEN_KEY, {contact_id: timestamp.timestamp()}, gt=True)
+    except Exception as e:
+        logger.warning(f"Could not buffer last_seen for contact {contact_id} in Redis, writing directly. Error: {e}")
+        _apply_contact_last_seen({contact_id: timestamp})
+
+
+def flush_contact_last_seen() -> int:
+    """
+    Writes the buffered last_seen timestamps to the database.
+    Returns the number of contacts flushed.
+    """
+    redis_conn = get_redis_connection("default")
+    # Read and clear atomically so timestamps recorded meanwhile land in a fresh set.
+    pipe = redis_conn.pipeline(transaction=True)
+    pipe.zrange(CONTACT_LAST_SEEN_KEY, 0, -1, withscores=True)
+    pipe.delete(CONTACT_LAST_SEEN_KEY)
+    raw, _ = pipe.execute()
+    if not raw:
+        return 0
+
+    seen = {int(member): datetime.fromtimestamp(score, tz=dt_timezone.utc) for member, score in raw}
+    try:
+        _apply_contact_last_seen(seen)
+    except Exception:
+        # Re-buffer; GT keeps any newer timestamp recorded since the read.
+        redis_conn.zadd(CONTACT_LAST_SEEN_KEY, {contact_id: ts.timestamp() for contact_id, ts in seen.items()}, gt=True)
+        raise
+    return len(seen)
+
+
+# --- Conversation Window ---
+# The contact detail view shows only the latest messages; older history is paged
+# through the keyset messages endpoint. A window is cached per (contact, latest
+# message id, version); the version is bumped whenever one of the contact's
+# messages is saved, so status changes show up too. Writes that skip
+# Message.save() (queryset.update(), deletes) are picked up when the TTL expires.
+
+CONVERSATION_WINDOW_SIZE = getattr(settings, 'CONTACT_DETAIL_MESSAGE_WINDOW', 50)
+CONVERSATION_WINDOW_MAX_SIZE = 200
+CONVERSATION_WINDOW_CACHE_TTL_SECONDS = getattr(settings, 'CONTACT_DETAIL_CACHE_TTL_SECONDS', 300)
+
+
+def _conversation_window_version_key(contact_id: int) -> str:
+    return f"conversation_window:version:{contact_id}"
+
+
+def bump_conversation_window_version(contact_id: int):
+    key = _conversation_window_version_key(contact_id)
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+    except Exception as e:
+        logger.warning(f"Could not invalidate the cached conversation window of contact {contact_id}: {e}")
+
+
+def get_conversation_window(contact: Contact, size: int = None, request=None) -> dict:
+    """
+    Returns the latest `size` messages of `contact` in chronological order, plus a
+    cursor (and, given a request, a URL) for the messages endpoint to load older
+    history from. Both are None when the window holds the whole conversation.
+    """
+    from whatsappcrm_backend.pagination import MessageKeysetPagination
+    from .serializers import MessageListSerializer
+
+    size = max(1, min(size or CONVERSATION_WINDOW_SIZE, CONVERSATION_WINDOW_MAX_SIZE))
+    newest_first = Message.objects.filter(contact=contact).order_by('-timestamp', '-id')
+    latest_id = newest_first.values_list('id', flat=True).first()
+    if latest_id is None:
+        return {'messages': [], 'older_messages_cursor': None, 'older_messages_url': None}
+
+    key = None
+    try:
+        version = cache.get(_conversation_window_version_key(contact.pk)) or 0
+        key = f"conversation_window:{contact.pk}:{latest_id}:{version}:{size}"
+        window = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Conversation window cache unavailable for contact {contact.pk}, querying the database. Error: {e}")
+        window = None
+
+    if window is None:
+        rows = list(newest_first.select_related('contact')[:size + 1])
+        has_older = len(rows) > size
+        rows = rows[:size]
+        older_cursor = None
+        if has_older:
+            older_cursor = MessageKeysetPagination().encode_cursor(rows[-1].timestamp, rows[-1].id, newer=False)
+        rows.reverse()
+        window = {'messages': list(MessageListSerializer(rows, many=True).data), 'older_messages_cursor': older_cursor}
+        if key:
+            try:
+                cache.set(key, window, timeout=CONVERSATION_WINDOW_CACHE_TTL_SECONDS)
+            except Exception as e:
+                logger.warning(f"Could not cache the conversation window of contact {contact.pk}: {e}")
+
+    older_url = None
+    if window['older_messages_cursor'] and request is not None:
+        path = reverse('conversations_api:contact-list-messages-for-contact', args=[contact.pk])
+        older_url = request.build_absolute_uri(f"{path}?cursor={window['older_messages_cursor']}")
+    return {**window, 'older_messages_url': older_url}
@@ -1,51 +1,54 @@
 # conversations/signals.py
 # whatsappcrm_backend/conversations/signals.py
 
-import asyncio
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from channels.layers import get_channel_layer
 import logging
 
 from .models import Message
-from .serializers import MessageSerializer
+from .services import bump_conversation_window_version
+from .realtime import publish_message_created, publish_message_updated
+from meta_integration.signals import message_send_failed
 
 logger = logging.getLogger(__name__)
 
-def run_async(coro):
+@receiver(post_save, sender=Message)
+def on_new_or_updated_message(sender, instance, created, **kwargs):
     """
-    Runs a coroutine in a new event loop. This is a safe way to call async
-    code from a synchronous context (like a signal handler).
+    When a Message is saved, queue a compact delta for the conversation's
+    WebSocket group once the transaction commits. The realtime publisher sends
+    it in a batch, and only if someone is watching the conversation.
     """
-    try:
-        loop = asyncio.get_running_loop()
-        # If a loop is running, schedule the coroutine on it.
-        # This is crucial for environments like Celery with eventlet/gevent
-        # or an already running async server.
-        return asyncio.run_coroutine_threadsafe(coro, loop).result()
-    except RuntimeError:  # 'RuntimeError: There is no current event loop...'
-        # If no loop is running (e.g., standard sync Django request),
-        # create a new one to run the coroutine.
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        return loop.run_until_complete(coro)
+    if not instance.contact_id:
+        return
+    publish = publish_message_created if created else publish_message_updated
+    transaction.on_commit(lambda: publish(instance))
 
 @receiver(post_save, sender=Message)
-def on_new_or_updated_message(sender, instance, created, **kwargs):
+def invalidate_conversation_window(sender, instance, created, **kwargs):
+    # New messages already change the window's cache key (latest message id);
+    # updates such as status changes need the version bump.
+    if instance.contact_id and not created:
+        bump_conversation_window_version(instance.contact_id)
+
+def broadcast_new_messages(messages):
     """
-    When a Message is saved, serialize it and broadcast it to the
-    corresponding conversation group.
+    Publishes messages created with bulk_create (which fires no post_save).
+    Call it once the transaction has committed.
     """
-    async def send_message_to_group():
-        try:
-            channel_layer = get_channel_layer()
-            if not instance.contact_id:
-                return
-            group_name = f"conversation_{instance.contact.id}"
-            message_data = MessageSerializer(instance).data
-            await channel_layer.group_send(group_name, {"type": "chat.message", "message": message_data})
-            logger.info(f"Broadcasted message {instance.id} to group {group_name}")
-        except Exception as e:
-            logger.error(f"Error in on_new_or_updated_message signal for message {instance.id}: {e}", exc_info=True)
-            
-    run_async(send_message_to_group())
\ No newline at end of file
+    for message in messages:
+        if message.contact_id:
+            publish_message_created(message)
+
+@receiver(message_send_failed)
+def on_message_send_failed(sender, message_instance, **kwargs):
+    """
+    Messages that fail before reaching Meta never produce a status webhook,
+    so record the failure against the broadcast counters here.
+    """
+    from .services import record_broadcast_status_transition
+    try:
+        record_broadcast_status_transition(message_instance.id, 'failed', message_instance.status_timestamp)
+    except Exception as e:
+        logger.error(f"Error recording broadcast failure for message {message_instance.id}: {e}", exc_info=True)
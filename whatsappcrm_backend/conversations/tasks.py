@@ -16,4 +16,84 @@ def run_fail_stuck_messages_command():
         call_command('fail_stuck_messages')
         logger.info("Successfully executed fail_stuck_messages command.")
     except Exception as e:
-        logger.error(f"Error executing fail_stuck_messages command: {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"Error executing fail_stuck_messages command: {e}", exc_info=True)
+
+
+@shared_task(name="conversations.tasks.flush_broadcast_counters_task")
+def flush_broadcast_counters_task():
+    """
+    Periodically folds the Redis-buffered broadcast status counters into the
+    Broadcast rows. Scheduled by Celery Beat every few seconds.
+    """
+    from .services import flush_broadcast_counters
+    try:
+        flushed = flush_broadcast_counters()
+        if flushed:
+            logger.info(f"Flushed buffered delivery counters for {flushed} broadcast(s).")
+        return f"Flushed counters for {flushed} broadcast(s)."
+    except Exception as e:
+        logger.error(f"Error flushing broadcast counters: {e}", exc_info=True)
+
+
+@shared_task(name="conversations.tasks.flush_contact_last_seen_task")
+def flush_contact_last_seen_task():
+    """
+    Periodically writes the Redis-buffered contact last_seen timestamps to the
+    database. Scheduled by Celery Beat every few seconds.
+    """
+    from .services import flush_contact_last_seen
+    try:
+        flushed = flush_contact_last_seen()
+        if flushed:
+            logger.debug(f"Flushed last_seen for {flushed} contact(s).")
+        return f"Flushed last_seen for {flushed} contact(s)."
+    except Exception as e:
+        logger.error(f"Error flushing contact last_seen: {e}", exc_info=True)
+
+
+@shared_task(name="conversations.tasks.ensure_table_partitions_task")
+def ensure_table_partitions_task():
+    """
+    Creates the upcoming monthly partitions of partitioned tables (see
+    conversations.partitioning) ahead of time. Does nothing for tables that
+    have not been converted. Scheduled daily by Celery Beat.
+    """
+    from .partitioning import ensure_partitions, partitioned_models
+    created = []
+    for model, _ in partitioned_models():
+        try:
+            created += ensure_partitions(model)
+        except Exception as e:
+            logger.error(f"Error creating partitions for {model._meta.db_table}: {e}", exc_info=True)
+    return f"Created {len(created)} partition(s)."
+
+
+@shared_task(name="conversations.tasks.dispatch_broadcast_task")
+def dispatch_broadcast_task(broadcast_id: int, contact_ids: list, template_name: str, language_code: str,
+                            components_template, config_id: int):
+    """
+    Personalizes and dispatches a large broadcast off the request. Routed to the
+    cpu_intensive lane, since rendering the template for every recipient is CPU-bound.
+    """
+    from .models import Broadcast
+    from .services import dispatch_broadcast_messages
+    from meta_integration.models import MetaAppConfig
+
+    try:
+        broadcast = Broadcast.objects.get(pk=broadcast_id)
+        active_config = MetaAppConfig.objects.get(pk=config_id)
+    except (Broadcast.DoesNotExist, MetaAppConfig.DoesNotExist) as e:
+        logger.error(f"dispatch_broadcast_task: cannot dispatch Broadcast {broadcast_id}: {e}")
+        return
+
+    try:
+        dispatched_count, render_stats = dispatch_broadcast_messages(
+            broadcast, contact_ids, template_name, language_code, components_template, active_config
+        )
+    except Exception as e:
+        # The dispatch is all-or-nothing, so no message of this broadcast is waiting to be sent.
+        logger.error(f"Error dispatching Broadcast {broadcast_id}: {e}", exc_info=True)
+        Broadcast.objects.filter(pk=broadcast_id, recipients__isnull=True).update(status='failed', pending_dispatch_count=0)
+        return
+    logger.info(f"Dispatched {dispatched_count} message(s) for Broadcast {broadcast_id}. Render stats: {render_stats}")
+    return f"Dispatched {dispatched_count} message(s) for Broadcast {broadcast_id}."
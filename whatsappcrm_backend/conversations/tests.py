@@ -1,3 +1,136 @@
-from django.test import TestCase
+# whatsappcrm_backend/conversations/tests.py
 
-# Create your tests here.
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from django.db.models import Q
+from django.test import SimpleTestCase
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from whatsappcrm_backend.pagination import ContactInboxPagination
+from .models import Contact
+from .realtime import RealtimePublisher
+
+BASE_TIME = datetime(2025, 6, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+_LOOKUPS = {
+    'exact': lambda actual, value: actual == value,
+    'isnull': lambda actual, value: (actual is None) == value,
+    'lt': lambda actual, value: actual is not None and actual < value,
+    'lte': lambda actual, value: actual is not None and actual <= value,
+    'gt': lambda actual, value: actual is not None and actual > value,
+    'gte': lambda actual, value: actual is not None and actual >= value,
+}
+
+
+def _matches(q: Q, row: dict) -> bool:
+    """Evaluates the simple field lookups a keyset condition is made of against `row`, as SQL would."""
+    results = []
+    for child in q.children:
+        if isinstance(child, Q):
+            results.append(_matches(child, row))
+        else:
+            lookup, value = child
+            field, _, operator = lookup.partition('__')
+            results.append(_LOOKUPS[operator or 'exact'](row[field], value))
+    result = all(results) if q.connector == Q.AND else any(results)
+    return not result if q.negated else result
+
+
+class KeysetPaginationTests(SimpleTestCase):
+
+    def setUp(self):
+        self.paginator = ContactInboxPagination()
+        # Newest first, NULLs last, ties broken by pk: the order the inbox is served in.
+        self.rows = [
+            {'pk': 9, 'last_message_at': BASE_TIME},
+            {'pk': 4, 'last_message_at': BASE_TIME},
+            {'pk': 7, 'last_message_at': BASE_TIME - timedelta(minutes=5)},
+            {'pk': 8, 'last_message_at': None},
+            {'pk': 2, 'last_message_at': None},
+        ]
+
+    def test_cursor_round_trip(self):
+        for value, pk, newer in ((BASE_TIME, 42, False), (BASE_TIME, 42, True), (None, 7, False)):
+            with self.subTest(value=value, newer=newer):
+                cursor = self.paginator.encode_cursor(value, pk, newer)
+                self.assertNotIn('=', cursor)
+                self.assertEqual(self.paginator.decode_cursor(cursor), (value, pk, newer))
+
+    def test_invalid_cursor_is_not_found(self):
+        missing_id = self.paginator.encode_cursor(BASE_TIME, 1, False)[:10]
+        for cursor in ('not-a-cursor', '', missing_id):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(NotFound):
+                    self.paginator.decode_cursor(cursor)
+
+    def test_older_and_newer_conditions_split_the_ordering_at_every_row(self):
+        for index, row in enumerate(self.rows):
+            with self.subTest(pk=row['pk']):
+                older = self.paginator._older_than(row['last_message_at'], row['pk'], nullable=True)
+                newer = self.paginator._newer_than(row['last_message_at'], row['pk'], nullable=True)
+                self.assertEqual([r for r in self.rows if _matches(older, r)], self.rows[index + 1:])
+                self.assertEqual([r for r in self.rows if _matches(newer, r)], self.rows[:index])
+
+    def test_anchor_with_direction_newer(self):
+        anchor = SimpleNamespace(pk=7, last_message_at=BASE_TIME - timedelta(minutes=5))
+        # Rows newer than the anchor, as the database returns them: oldest first.
+        fetched = [SimpleNamespace(pk=4, last_message_at=BASE_TIME), SimpleNamespace(pk=9, last_message_at=BASE_TIME)]
+        queryset = mock.MagicMock()
+        queryset.model = Contact
+        filtered = queryset.filter.return_value
+        filtered.values_list.return_value.first.return_value = (anchor.last_message_at, anchor.pk)
+        filtered.order_by.return_value.__getitem__.return_value = fetched
+
+        request = Request(APIRequestFactory().get('/contacts/', {'anchor': '7', 'direction': 'newer', 'page_size': '2'}))
+        page = self.paginator.paginate_queryset(queryset, request)
+
+        queryset.filter.assert_any_call(pk=7)
+        queryset.filter.assert_called_with(self.paginator._newer_than(anchor.last_message_at, anchor.pk, True))
+        self.assertFalse(any(expression.descending for expression in filtered.order_by.call_args.args))
+        self.assertEqual([row.pk for row in page], [9, 4])
+        # The anchor row itself is older than the page; nothing newer was left over.
+        self.assertTrue(self.paginator.has_older)
+        self.assertFalse(self.paginator.has_newer)
+        next_link = self.paginator.get_next_link()
+        self.assertIn('cursor=', next_link)
+        self.assertNotIn('anchor=', next_link)
+        self.assertIsNone(self.paginator.get_previous_link())
+
+
+class RealtimePublisherGroupTests(SimpleTestCase):
+
+    def test_update_after_create_is_merged_into_the_created_delta(self):
+        events = [
+            (1, 'created', {'id': 10, 'text_content': 'Hi', 'status': 'pending_dispatch'}),
+            (1, 'updated', {'id': 10, 'status': 'sent', 'status_timestamp': '2025-06-01T12:00:00+00:00'}),
+        ]
+        grouped = RealtimePublisher._group(events)
+        self.assertEqual(grouped[1]['created'], {10: {
+            'id': 10, 'text_content': 'Hi', 'status': 'sent', 'status_timestamp': '2025-06-01T12:00:00+00:00',
+        }})
+        self.assertEqual(grouped[1]['updated'], {})
+
+    def test_updates_to_the_same_message_keep_the_latest_status(self):
+        events = [
+            (1, 'updated', {'id': 10, 'status': 'delivered'}),
+            (1, 'updated', {'id': 10, 'status': 'read'}),
+            (1, 'updated', {'id': 11, 'status': 'sent'}),
+        ]
+        grouped = RealtimePublisher._group(events)
+        self.assertEqual(grouped[1]['updated'], {10: {'id': 10, 'status': 'read'}, 11: {'id': 11, 'status': 'sent'}})
+
+    def test_events_are_grouped_per_conversation(self):
+        events = [
+            (1, 'created', {'id': 10}),
+            (2, 'created', {'id': 20}),
+            (2, 'updated', {'id': 10, 'status': 'read'}),
+        ]
+        grouped = RealtimePublisher._group(events)
+        self.assertEqual(set(grouped), {1, 2})
+        self.assertEqual(grouped[1]['created'], {10: {'id': 10}})
+        # An update only merges into a message created in the same conversation.
+        self.assertEqual(grouped[2]['updated'], {10: {'id': 10, 'status': 'read'}})
@@ -14,6 +14,7 @@ router.register(r'broadcasts', views.BroadcastViewSet, basename='broadcast')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('search/', views.ConversationSearchView.as_view(), name='search'),
     # This will create URLs like:
     # /crm-api/conversations/contacts/
     # /crm-api/conversations/contacts/{id}/
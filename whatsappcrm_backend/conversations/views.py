@@ -1,16 +1,20 @@
 # whatsappcrm_backend/conversations/views.py
 
 from rest_framework import viewsets, permissions, status, mixins
+from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q, Prefetch, Subquery, OuterRef, Count, F
+from django.db import transaction
+from django.db.models import Q, F
+from django.contrib.postgres.search import SearchQuery
 from django.utils import timezone
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 import logging # Make sure logging is imported
 
-from .models import Contact, Message
+from .models import Contact, Message, Broadcast, BroadcastRecipient
 from .serializers import (
     ContactSerializer,
     MessageSerializer,
@@ -18,13 +22,23 @@ from .serializers import (
     ContactDetailSerializer,
     ContactListSerializer,
     BroadcastCreateSerializer,
+    BroadcastSerializer,
+    BroadcastRecipientSerializer,
+    ContactSearchResultSerializer,
+    MessageSearchResultSerializer,
 )
 # For dispatching Celery task
 from meta_integration.tasks import send_whatsapp_message_task
 # To get active MetaAppConfig for sending
 from meta_integration.models import MetaAppConfig
-# To personalize messages using flow template logic
-from flows.services import _resolve_value
+# To personalize and dispatch broadcast messages
+from .services import dispatch_broadcast_messages
+from .tasks import dispatch_broadcast_task
+from outbox.services import enqueue_task
+from whatsappcrm_backend.pagination import ContactInboxPagination, MessageKeysetPagination
+from .search import (
+    MESSAGE_SEARCH_VECTOR, TEXT_SEARCH_CONFIG, contact_search_filter, search_contacts, search_messages,
+)
 
 logger = logging.getLogger(__name__) # Standard way to get logger for current module
 
@@ -48,6 +62,7 @@ class ContactViewSet(viewsets.ModelViewSet):
     """
     queryset = Contact.objects.all().order_by('-last_seen')
     permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
+    pagination_class = ContactInboxPagination
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -59,35 +74,19 @@ class ContactViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """
         Dynamically filter and annotate the queryset based on the action.
-        - For 'list', add message previews and unread counts, and order by last message time.
-        - For 'retrieve', prefetch related data for a detailed view.
+        - For 'list', order by last message time.
+        - For 'retrieve', join the member profile; messages come windowed from the serializer.
         """
         queryset = Contact.objects.all()
 
         if self.action == 'list':
-            # Subquery to get the text content of the latest message for each contact
-            latest_message_subquery = Message.objects.filter(
-                contact=OuterRef('pk')
-            ).order_by('-timestamp')
-            
-            latest_message_preview = latest_message_subquery.values('text_content')[:1]
-            latest_message_timestamp = latest_message_subquery.values('timestamp')[:1]
-
-            queryset = queryset.annotate(
-                last_message_preview=Subquery(latest_message_preview),
-                # A simple unread count: incoming messages with 'received' status.
-                # A more complex implementation might track read status per agent.
-                unread_count=Count('messages', filter=Q(messages__direction='in', messages__status='received')),
-                # Annotate the latest message timestamp to order by it
-                latest_message_ts=Subquery(latest_message_timestamp)
-            ).order_by(F('latest_message_ts').desc(nulls_last=True), '-last_seen')
+            # Preview, unread count and ordering come from the inbox summary columns
+            # on Contact (see conversations.models.update_inbox_summaries).
+            queryset = queryset.order_by(F('last_message_at').desc(nulls_last=True), '-id')
 
             search_term = self.request.query_params.get('search', None)
             if search_term:
-                queryset = queryset.filter(
-                    Q(name__icontains=search_term) | 
-                    Q(whatsapp_id__icontains=search_term)
-                )
+                queryset = queryset.filter(contact_search_filter(search_term))
 
             needs_intervention_filter = self.request.query_params.get('needs_human_intervention', None)
             if needs_intervention_filter is not None:
@@ -97,29 +96,34 @@ class ContactViewSet(viewsets.ModelViewSet):
                     queryset = queryset.filter(needs_human_intervention=False)
 
         elif self.action == 'retrieve':
-            # For the detail view, prefetch messages in chronological order
-            queryset = queryset.prefetch_related(
-                Prefetch('messages', queryset=Message.objects.order_by('timestamp'))
-            )
+            # Messages are not prefetched: the detail serializer loads only the latest window.
+            queryset = queryset.select_related('member_profile')
         else:
             # Fallback for other actions, use default ordering
             queryset = queryset.order_by('-last_seen')
             
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            # ?messages=N sizes the window of latest messages in the detail response.
+            try:
+                context['message_window'] = int(self.request.query_params.get('messages', 0)) or None
+            except ValueError:
+                context['message_window'] = None
+        return context
+
     @action(detail=True, methods=['get'], url_path='messages', permission_classes=[permissions.IsAuthenticated])
     def list_messages_for_contact(self, request, pk=None):
         contact = get_object_or_404(Contact, pk=pk)
-        # Return messages in REVERSE chronological order for pagination (most recent first)
-        messages_queryset = Message.objects.filter(contact=contact).select_related('contact').order_by('-timestamp')
-        
-        page = self.paginate_queryset(messages_queryset)
-        if page is not None:
-            serializer = MessageListSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
+        # Messages come newest first, paged by (timestamp, id) keyset rather than the inbox paginator.
+        messages_queryset = Message.objects.filter(contact=contact).select_related('contact')
 
-        serializer = MessageListSerializer(messages_queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        paginator = MessageKeysetPagination()
+        page = paginator.paginate_queryset(messages_queryset, request, view=self)
+        serializer = MessageListSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'], url_path='toggle-block', permission_classes=[permissions.IsAuthenticated, IsAdminOrReadOnly])
     def toggle_block_status(self, request, pk=None):
@@ -141,14 +145,16 @@ class ContactViewSet(viewsets.ModelViewSet):
             contact.intervention_requested_at = None
         else:
             contact.intervention_requested_at = timezone.now()
-        contact.save(update_fields=['needs_human_intervention', 'intervention_requested_at', 'last_seen'])
+        # A manual toggle is a staff decision: it never times out on its own.
+        contact.intervention_timeout_at = None
+        contact.save(update_fields=['needs_human_intervention', 'intervention_requested_at', 'intervention_timeout_at', 'last_seen'])
         
         # --- Broadcast update via WebSocket ---
         channel_layer = get_channel_layer()
         group_name = f'conversation_{contact.id}'
         
         # Use the detail serializer to get the full, updated contact representation
-        serializer = ContactDetailSerializer(contact)
+        serializer = ContactDetailSerializer(contact, context={'request': request})
         
         async_to_sync(channel_layer.group_send)(
             group_name,
@@ -158,6 +164,39 @@ class ContactViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class ConversationSearchView(APIView):
+    """
+    Ranked search over contacts (name / phone number, typo tolerant) and message
+    text (full-text, web search syntax).
+
+    Query parameters: `q` (required), `type` ('all' (default), 'contacts' or
+    'messages'), `contact_id` to search one conversation's messages, `limit`
+    (default 20, max 50).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, format=None):
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            return Response({"error": "The 'q' parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        search_type = request.query_params.get('type', 'all')
+        if search_type not in ('all', 'contacts', 'messages'):
+            return Response({"error": "'type' must be one of: all, contacts, messages."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+            contact_id = int(request.query_params['contact_id']) if request.query_params.get('contact_id') else None
+        except ValueError:
+            return Response({"error": "'limit' and 'contact_id' must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = {}
+        context = {'request': request}
+        if search_type in ('all', 'contacts') and contact_id is None:
+            data['contacts'] = ContactSearchResultSerializer(search_contacts(term, limit), many=True, context=context).data
+        if search_type in ('all', 'messages'):
+            data['messages'] = MessageSearchResultSerializer(search_messages(term, contact_id, limit), many=True, context=context).data
+        return Response(data, status=status.HTTP_200_OK)
+
+
 class MessageViewSet(
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -166,15 +205,18 @@ class MessageViewSet(
 ):
     queryset = Message.objects.all().select_related('contact').order_by('-timestamp')
     permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly] # Adjust IsAdminOrReadOnly if non-staff should create messages
+    pagination_class = MessageKeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'list':
             return MessageListSerializer
         return MessageSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
         """
         Handles the creation of an outgoing message and dispatches it for sending via Celery.
+        The send is recorded in the outbox in the same transaction as the message.
         """
         # The serializer expects 'contact' (PK), 'message_type', and 'content_payload'.
         # 'direction' and 'status' are set here for outgoing messages.
@@ -200,7 +242,7 @@ class MessageViewSet(
             
             if active_config:
                 logger.info(f"Dispatching Celery task send_whatsapp_message_task for Message ID: {message.id} using Config ID: {active_config.id}")
-                send_whatsapp_message_task.delay(message.id, active_config.id)
+                enqueue_task(send_whatsapp_message_task, args=[message.id, active_config.id])
                 # The message status will be updated by the Celery task (e.g., to 'sent' or 'failed')
             else:
                 logger.error(f"No active MetaAppConfig found. Message {message.id} for contact {message.contact.whatsapp_id} cannot be dispatched.")
@@ -229,6 +271,10 @@ class MessageViewSet(
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            # The detail view shows the raw payload; lists load it only where needed.
+            queryset = queryset.select_related('payload')
+
         contact_id = self.request.query_params.get('contact_id')
         if contact_id:
             try:
@@ -239,20 +285,38 @@ class MessageViewSet(
         
         search_term = self.request.query_params.get('search')
         if search_term:
-            queryset = queryset.filter(
-                Q(text_content__icontains=search_term) |
-                Q(contact__name__icontains=search_term) |
-                Q(contact__whatsapp_id__icontains=search_term)
+            # Full-text match on the message text, or any message of a matching contact.
+            matching_contacts = Contact.objects.filter(contact_search_filter(search_term)).values('id')
+            queryset = queryset.annotate(search=MESSAGE_SEARCH_VECTOR).filter(
+                Q(search=SearchQuery(search_term, config=TEXT_SEARCH_CONFIG, search_type='websearch')) |
+                Q(contact_id__in=matching_contacts)
             )
         return queryset
 
 
-class BroadcastViewSet(viewsets.ViewSet):
+class BroadcastViewSet(viewsets.ReadOnlyModelViewSet):
     """
-    API endpoint for sending business-initiated template messages (broadcasts).
+    API endpoint for sending business-initiated template messages (broadcasts)
+    and for following their delivery progress.
     """
+    queryset = Broadcast.objects.select_related('created_by').all()
+    serializer_class = BroadcastSerializer
     permission_classes = [permissions.IsAdminUser] # Only admins can broadcast
 
+    @action(detail=True, methods=['get'], url_path='recipients')
+    def list_recipients(self, request, pk=None):
+        """
+        Lists the recipients of a broadcast with their individual delivery status.
+        """
+        broadcast = self.get_object()
+        queryset = BroadcastRecipient.objects.filter(broadcast=broadcast).select_related('contact').order_by('id')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = BroadcastRecipientSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = BroadcastRecipientSerializer(queryset, many=True)
+        return Response(serializer.data)
+
     @action(detail=False, methods=['post'], url_path='send-template')
     def send_template_message(self, request):
         """
@@ -277,34 +341,40 @@ class BroadcastViewSet(viewsets.ViewSet):
             logger.error(f"Broadcast failed: Could not get active Meta config. Error: {e}")
             return Response({"error": "Server configuration error: " + str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Fetch all contacts and their profiles in a single query to be efficient
-        contacts_to_message = Contact.objects.filter(id__in=contact_ids).select_related('member_profile')
-        
-        dispatched_count = 0
-        for contact in contacts_to_message:
-            # Construct the payload for this specific contact
-            components = _resolve_value(components_template, {}, contact) if components_template else None
-
-            content_payload = {
-                "name": template_name,
-                "language": {"code": language_code}
-            }
-            if components:
-                content_payload["components"] = components
-
-            # Create the Message object
-            message = Message.objects.create(
-                contact=contact, meta_app_config=active_config, direction='out',
-                message_type='template', content_payload=content_payload,
-                status='pending_dispatch', timestamp=timezone.now()
+        recipient_count = Contact.objects.filter(id__in=contact_ids).count()
+        # Personalizing a large audience is CPU-bound; do it on the CPU lane, not in the request.
+        render_in_task = bool(components_template) and recipient_count >= settings.BROADCAST_RENDER_TASK_THRESHOLD
+
+        with transaction.atomic():
+            # The Broadcast row is the parent record whose counters are kept up to date by status webhooks.
+            broadcast = Broadcast.objects.create(
+                name=validated_data.get('name') or template_name,
+                template_name=template_name,
+                created_by=request.user,
+                status='pending' if render_in_task else 'in_progress',
+                total_recipients=recipient_count,
+                pending_dispatch_count=recipient_count,
             )
+            if render_in_task:
+                # Published by the outbox relay only once the broadcast row is committed.
+                enqueue_task(
+                    dispatch_broadcast_task,
+                    args=[broadcast.id, contact_ids, template_name, language_code, components_template, active_config.id],
+                )
+            else:
+                dispatched_count, render_stats = dispatch_broadcast_messages(
+                    broadcast, contact_ids, template_name, language_code, components_template, active_config
+                )
 
-            # Dispatch the Celery task for sending
-            send_whatsapp_message_task.delay(message.id, active_config.id)
-            dispatched_count += 1
-            logger.info(f"Dispatched template broadcast message {message.id} to contact {contact.id} ({contact.whatsapp_id})")
+        if render_in_task:
+            return Response({
+                "message": f"Broadcast to {recipient_count} of {len(contact_ids)} requested contacts queued for personalization and dispatch.",
+                "broadcast_id": broadcast.id,
+                "render_stats": None,
+            }, status=status.HTTP_202_ACCEPTED)
 
         return Response({
             "message": f"Broadcast dispatch initiated for {dispatched_count} of {len(contact_ids)} requested contacts.",
+            "broadcast_id": broadcast.id,
+            "render_stats": render_stats,
         }, status=status.HTTP_202_ACCEPTED)
-        return queryset
\ No newline at end of file
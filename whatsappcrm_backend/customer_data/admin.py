@@ -7,12 +7,12 @@ from django.core.files.storage import default_storage
 from django.utils import timezone
 from datetime import timedelta
 from django.conf import settings
-from django.db import transaction
 import logging
 
 from conversations.models import Message
 from meta_integration.models import MetaAppConfig
 from meta_integration.tasks import send_whatsapp_message_task
+from outbox.services import enqueue_task
 from church_services.models import EventBooking
 from .exports import (
     export_members_to_excel, export_members_to_pdf,
@@ -257,9 +257,7 @@ class PendingVerificationPaymentAdmin(admin.ModelAdmin):
                 status='pending_dispatch',
                 timestamp=timezone.now()
             )
-            transaction.on_commit(
-                lambda: send_whatsapp_message_task.delay(message.id, active_config.id)
-            )
+            enqueue_task(send_whatsapp_message_task, args=[message.id, active_config.id])
             logger.info(f"Queued status notification for payment {payment.id} to contact {payment.contact.id}.")
             return True
         except Exception as e:
@@ -327,7 +325,7 @@ class PendingVerificationPaymentAdmin(admin.ModelAdmin):
                             message_type='text', content_payload={'body': booking_confirmation_message},
                             status='pending_dispatch', timestamp=timezone.now()
                         )
-                        transaction.on_commit(lambda: send_whatsapp_message_task.delay(booking_message.id, active_config.id))
+                        enqueue_task(send_whatsapp_message_task, args=[booking_message.id, active_config.id])
             except EventBooking.DoesNotExist:
                 # This is expected for payments not related to an event booking.
                 pass
@@ -401,7 +399,7 @@ class PendingVerificationPaymentAdmin(admin.ModelAdmin):
                             message_type='text', content_payload={'body': booking_cancellation_message},
                             status='pending_dispatch', timestamp=timezone.now()
                         )
-                        transaction.on_commit(lambda: send_whatsapp_message_task.delay(booking_message.id, active_config.id))
+                        enqueue_task(send_whatsapp_message_task, args=[booking_message.id, active_config.id])
             except EventBooking.DoesNotExist:
                 pass # Expected for non-event payments
             except Exception as e:
@@ -505,9 +503,7 @@ class PrayerRequestAdmin(admin.ModelAdmin):
 
         try:
             message = Message.objects.create(contact=prayer_request.contact, app_config=active_config, direction='out', message_type='text', content_payload={'body': message_text}, status='pending_dispatch', timestamp=timezone.now())
-            transaction.on_commit(
-                lambda: send_whatsapp_message_task.delay(message.id, active_config.id)
-            )
+            enqueue_task(send_whatsapp_message_task, args=[message.id, active_config.id])
             return True
         except Exception as e:
             self.message_user(request, f"Failed to create and dispatch notification for prayer request {prayer_request.id}. Error: {e}", level='ERROR')
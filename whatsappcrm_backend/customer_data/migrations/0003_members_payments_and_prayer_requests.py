@@ -0,0 +1,142 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0005_inbox_broadcasts_archive_and_search_indexes'),
+        ('customer_data', '0002_customerprofile_acquisition_source_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Family',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text="e.g., 'The Smith Family'", max_length=150, verbose_name='Family Name')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('head_of_household', models.ForeignKey(blank=True, help_text='The primary contact for this family unit.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='led_families', to='conversations.contact')),
+            ],
+            options={
+                'verbose_name': 'Family',
+                'verbose_name_plural': 'Families',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MemberProfile',
+            fields=[
+                ('contact', models.OneToOneField(help_text='The contact this member profile belongs to.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='member_profile', serialize=False, to='conversations.contact')),
+                ('first_name', models.CharField(blank=True, max_length=100, null=True, verbose_name='First Name')),
+                ('last_name', models.CharField(blank=True, max_length=100, null=True, verbose_name='Last Name')),
+                ('email', models.EmailField(blank=True, max_length=254, null=True, verbose_name='Email Address')),
+                ('secondary_phone_number', models.CharField(blank=True, help_text='An alternative phone number, if provided.', max_length=30, null=True, verbose_name='Secondary Phone')),
+                ('date_of_birth', models.DateField(blank=True, null=True, verbose_name='Date of Birth')),
+                ('gender', models.CharField(blank=True, choices=[('male', 'Male'), ('female', 'Female'), ('other', 'Other'), ('prefer_not_to_say', 'Prefer not to say')], max_length=20, null=True, verbose_name='Gender')),
+                ('marital_status', models.CharField(blank=True, choices=[('single', 'Single'), ('married', 'Married'), ('divorced', 'Divorced'), ('widowed', 'Widowed')], max_length=20, null=True, verbose_name='Marital Status')),
+                ('date_joined', models.DateField(blank=True, help_text='The date the person officially joined the church.', null=True, verbose_name='Date Joined')),
+                ('baptism_date', models.DateField(blank=True, null=True, verbose_name='Baptism Date')),
+                ('address_line_1', models.CharField(blank=True, max_length=255, null=True, verbose_name='Address Line 1')),
+                ('address_line_2', models.CharField(blank=True, max_length=255, null=True, verbose_name='Address Line 2')),
+                ('city', models.CharField(blank=True, max_length=100, null=True, verbose_name='City')),
+                ('state_province', models.CharField(blank=True, max_length=100, null=True, verbose_name='State/Province')),
+                ('postal_code', models.CharField(blank=True, max_length=20, null=True, verbose_name='Postal Code')),
+                ('country', models.CharField(blank=True, max_length=100, null=True, verbose_name='Country')),
+                ('membership_status', models.CharField(blank=True, choices=[('visitor', 'Visitor'), ('new_convert', 'New Convert'), ('member', 'Member'), ('leader', 'Leader'), ('inactive', 'Inactive'), ('other', 'Other')], default='visitor', max_length=50, null=True, verbose_name='Membership Status')),
+                ('acquisition_source', models.CharField(blank=True, help_text="How this person was reached, e.g., 'Outreach Event', 'Website', 'Referral'", max_length=150, null=True, verbose_name='Acquisition Source')),
+                ('tags', models.JSONField(blank=True, default=list, help_text="Descriptive tags for segmentation, e.g., ['youth_ministry', 'choir', 'volunteer']", verbose_name='Tags')),
+                ('notes', models.TextField(blank=True, help_text='General notes about the member, prayer requests, etc.', null=True, verbose_name='Notes')),
+                ('preferences', models.JSONField(blank=True, default=dict, help_text='Member preferences collected over time (e.g., communication preference, service time).')),
+                ('custom_attributes', models.JSONField(blank=True, default=dict, help_text='Arbitrary custom attributes collected for this member.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last time this profile record was updated.')),
+                ('last_updated_from_conversation', models.DateTimeField(blank=True, help_text='Last time data was explicitly updated from a conversation or flow.', null=True)),
+                ('family', models.ForeignKey(blank=True, help_text='The family unit this member belongs to.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='customer_data.family')),
+            ],
+            options={
+                'verbose_name': 'Member Profile',
+                'verbose_name_plural': 'Member Profiles',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Amount')),
+                ('currency', models.CharField(default='USD', max_length=10, verbose_name='Currency')),
+                ('payment_type', models.CharField(choices=[('tithe', 'Tithe'), ('offering', 'Offering'), ('pledge', 'Pledge'), ('event_registration', 'Event Registration'), ('other', 'Other')], default='offering', max_length=50, verbose_name='Payment Type')),
+                ('payment_method', models.CharField(blank=True, choices=[('ecocash', 'EcoCash'), ('manual_payment', 'Manual/Cash Payment'), ('omari', 'Omari (Coming Soon)'), ('innbucks', 'Innbucks (Coming Soon)')], max_length=50, verbose_name='Payment Method')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('pending_verification', 'Pending Verification'), ('completed', 'Completed'), ('failed', 'Failed'), ('refunded', 'Refunded')], default='pending', max_length=20, verbose_name='Status')),
+                ('transaction_reference', models.CharField(blank=True, help_text='Reference from payment gateway or bank.', max_length=255, null=True, verbose_name='Transaction Reference')),
+                ('external_data', models.JSONField(blank=True, default=dict, help_text='Data from external payment gateways, like Paynow poll_url or reference.', verbose_name='External Data')),
+                ('notes', models.TextField(blank=True, help_text='Internal notes about the payment.', null=True, verbose_name='Notes')),
+                ('proof_of_payment', models.ImageField(blank=True, help_text='The uploaded proof of payment image.', null=True, upload_to='payment_proofs/%Y/%m/', verbose_name='Proof of Payment')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('contact', models.ForeignKey(blank=True, help_text='The contact who initiated the payment, even if not a full member.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='initiated_payments', to='conversations.contact')),
+                ('member', models.ForeignKey(blank=True, help_text='The member profile associated with this payment, if one exists.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to='customer_data.memberprofile')),
+            ],
+            options={
+                'verbose_name': 'Payment',
+                'verbose_name_plural': 'Payments',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PendingVerificationPayment',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'Pending Manual Payment',
+                'verbose_name_plural': 'Pending Manual Payments',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('customer_data.payment',),
+        ),
+        migrations.CreateModel(
+            name='PaymentHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('pending_verification', 'Pending Verification'), ('completed', 'Completed'), ('failed', 'Failed'), ('refunded', 'Refunded')], help_text='The status of the payment at this point in time.', max_length=20, verbose_name='Status')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('notes', models.TextField(blank=True, help_text='Reason for the status change, if any.', null=True, verbose_name='Notes')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='customer_data.payment')),
+            ],
+            options={
+                'verbose_name': 'Payment History',
+                'verbose_name_plural': 'Payment Histories',
+                'ordering': ['-timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PrayerRequest',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('request_text', models.TextField(help_text='The content of the prayer request.', verbose_name='Prayer Request')),
+                ('category', models.CharField(blank=True, choices=[('healing', 'Healing'), ('family', 'Family & Relationships'), ('guidance', 'Guidance & Wisdom'), ('thanksgiving', 'Thanksgiving'), ('financial', 'Financial Provision'), ('other', 'Other')], max_length=50, null=True, verbose_name='Category')),
+                ('is_anonymous', models.BooleanField(default=False, help_text="If true, the submitter's name will not be shared publicly.", verbose_name='Submit Anonymously')),
+                ('submitted_as_member', models.BooleanField(default=False, help_text='Indicates if the user identified as a church member during submission.', verbose_name='Submitted as Member')),
+                ('status', models.CharField(choices=[('submitted', 'Submitted'), ('in_prayer', 'In Prayer'), ('answered', 'Answered'), ('closed', 'Closed')], default='submitted', max_length=20, verbose_name='Status')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('contact', models.ForeignKey(help_text='The contact who submitted the prayer request.', on_delete=django.db.models.deletion.CASCADE, related_name='prayer_requests', to='conversations.contact')),
+                ('member', models.ForeignKey(blank=True, help_text='The member profile associated with this prayer request, if available.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='prayer_requests', to='customer_data.memberprofile')),
+            ],
+            options={
+                'verbose_name': 'Prayer Request',
+                'verbose_name_plural': 'Prayer Requests',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.DeleteModel(
+            name='CustomerProfile',
+        ),
+    ]
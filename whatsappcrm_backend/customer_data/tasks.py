@@ -2,13 +2,16 @@
 
 import logging
 from celery import shared_task
+from django.db import transaction
 from django.utils import timezone
+from django.conf import settings
 from django.core.files.base import ContentFile
 from uuid import UUID
 
 from .models import Payment, MemberProfile
 from meta_integration.models import MetaAppConfig
 from meta_integration.utils import download_whatsapp_media
+from outbox.services import enqueue_task
 
 logger = logging.getLogger(__name__)
 
@@ -97,12 +100,15 @@ def send_birthday_whatsapp_message(self, member_profile_id: int):
             "Your Church Family"
         )
 
-        outgoing_msg = Message.objects.create(
-            contact=contact, app_config=active_config, direction='out',
-            message_type='text', content_payload={'body': message_text},
-            status='pending_dispatch', timestamp=timezone.now()
-        )
-        send_whatsapp_message_task.delay(outgoing_msg.id, active_config.id)
+        # The message and its send commit together, so a retry of this task never leaves a
+        # duplicate message behind.
+        with transaction.atomic():
+            outgoing_msg = Message.objects.create(
+                contact=contact, app_config=active_config, direction='out',
+                message_type='text', content_payload={'body': message_text},
+                status='pending_dispatch', timestamp=timezone.now()
+            )
+            enqueue_task(send_whatsapp_message_task, args=[outgoing_msg.id, active_config.id], queue=settings.QUEUE_BULK_SENDS)
         logger.info(f"Queued birthday message for MemberProfile {member.contact_id} ({contact.whatsapp_id}).")
 
     except MemberProfile.DoesNotExist:
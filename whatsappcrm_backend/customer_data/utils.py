@@ -8,6 +8,7 @@ from django.db import IntegrityError
 from conversations.models import Contact
 from .models import MemberProfile, Payment, PaymentHistory, PrayerRequest
 from .tasks import process_proof_of_payment_image
+from outbox.services import enqueue_task
 from church_services.models import Event, EventBooking
 
 logger = logging.getLogger(__name__)
@@ -95,10 +96,11 @@ def record_payment(
             
             # If proof of payment is provided, trigger the background download task
             if proof_of_payment_wamid and payment:
-                # Use transaction.on_commit to ensure the task runs only after the payment record is committed to the DB.
-                # This prevents a race condition where the Celery worker picks up the task before the transaction is complete.
-                transaction.on_commit(
-                    lambda: process_proof_of_payment_image.delay(payment_id=str(payment.id), wamid=proof_of_payment_wamid)
+                # The outbox row is committed together with the payment record, so the task runs only after
+                # the payment exists in the DB and is not lost if the process dies right after the commit.
+                enqueue_task(
+                    process_proof_of_payment_image,
+                    kwargs={'payment_id': str(payment.id), 'wamid': proof_of_payment_wamid}
                 )
                 logger.info(f"Scheduled background task to download proof of payment for payment {payment.id}.")
 
@@ -1,7 +1,7 @@
 # whatsappcrm_backend/flows/admin.py
 
 from django.contrib import admin
-from .models import Flow, FlowStep, FlowTransition, ContactFlowState #, MessageTemplate
+from .models import Flow, FlowStep, FlowTransition, ContactFlowState, FlowTimer #, MessageTemplate
 
 # @admin.register(MessageTemplate)
 # class MessageTemplateAdmin(admin.ModelAdmin):
@@ -19,7 +19,7 @@ class FlowStepInline(admin.TabularInline): # Or StackedInline
 
 @admin.register(Flow)
 class FlowAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description', 'is_active', 'created_at', 'updated_at') # 'app_config',
+    list_display = ('name', 'description', 'is_active', 'state_ttl_seconds', 'created_at', 'updated_at') # 'app_config',
     search_fields = ('name', 'description')
     list_filter = ('is_active', 'created_at') # 'app_config',
     inlines = [FlowStepInline]
@@ -112,3 +112,12 @@ class ContactFlowStateAdmin(admin.ModelAdmin):
     def current_step_name(self, obj):
         return obj.current_step.name
     current_step_name.short_description = "Current Step"
+
+
+@admin.register(FlowTimer)
+class FlowTimerAdmin(admin.ModelAdmin):
+    list_display = ('name', 'contact', 'flow', 'step', 'fire_at', 'cancel_on_reply', 'created_at')
+    list_filter = ('name', 'flow', 'cancel_on_reply')
+    search_fields = ('name', 'contact__whatsapp_id', 'contact__name')
+    raw_id_fields = ('contact', 'step')
+    list_select_related = ('contact', 'flow', 'step')
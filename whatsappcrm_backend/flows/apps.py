@@ -12,3 +12,6 @@ class FlowsConfig(AppConfig):
         import flows.signals
         # Import tasks here to ensure they are discovered by Celery
         import flows.tasks
+        # Shared query_model results are invalidated when the queried model changes
+        from flows.query_cache import connect_invalidation_signals
+        connect_invalidation_signals()
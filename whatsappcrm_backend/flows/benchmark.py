@@ -0,0 +1,279 @@
+# whatsappcrm_backend/flows/benchmark.py
+"""
+Micro-benchmark for the flow engine.
+
+Loads every definition in `flows.definitions`, then drives a scripted
+conversation through each flow with process_message_for_flow: it starts with the
+flow's first trigger keyword and answers every question the way a cooperative
+user would (first button / list option, a sample value that satisfies the
+question's validation). Each turn is measured for latency, DB queries and Jinja
+template compilations, both per flow (whole turns) and per step type (each
+_execute_step_actions call).
+
+Runs offline: Paynow is replaced by a stub, outgoing HTTP is refused, Celery
+publishing is a no-op and caches and channel layers are in-memory. Nothing is
+sent to Meta because the benchmark stops at the actions process_message_for_flow
+returns. Used by the benchmark_flows management command.
+"""
+
+import contextlib
+import io
+import logging
+import math
+import re
+import time
+from collections import defaultdict
+from typing import Optional
+from unittest import mock
+
+import requests
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from conversations.models import Contact, Message
+from flows import services
+from flows.models import ContactFlowState
+from flows.scripts.create_flow import discover_flow_definitions, _create_or_update_flow_from_definition
+
+logger = logging.getLogger(__name__)
+
+MAX_TURNS_PER_CONVERSATION = 30
+
+# Tried in order for free-text questions; the first that satisfies the question's
+# validation_regex is sent.
+SAMPLE_TEXT_ANSWERS = ['Benchmark User', '2000-01-01', '0771234567', '10', '1', 'skip']
+SAMPLE_EMAIL = 'benchmark@example.com'
+SAMPLE_MEDIA_ID = 'benchmark-media-id'
+
+
+# --- Offline stubs ---
+class OfflinePaynowService:
+    """Stands in for PaynowService; every express checkout is accepted."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def initiate_express_checkout_payment(self, **kwargs):
+        return {
+            'success': True,
+            'status': 'sent',
+            'paynow_reference': 'BENCHMARK',
+            'poll_url': 'https://paynow.invalid/poll',
+            'message': 'Stubbed for flow benchmarks.',
+        }
+
+
+def _refuse_network(*args, **kwargs):
+    raise requests.exceptions.ConnectionError("Network access is disabled while benchmarking flows.")
+
+
+@contextlib.contextmanager
+def offline_environment():
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(override_settings(
+            CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'flow-benchmark'},
+                'flow_context': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'flow-benchmark-context'},
+            },
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+        ))
+        stack.enter_context(mock.patch('flows.services.PaynowService', OfflinePaynowService))
+        stack.enter_context(mock.patch('requests.sessions.Session.request', _refuse_network))
+        stack.enter_context(mock.patch('celery.app.task.Task.apply_async', return_value=None))
+        yield
+
+
+# --- Measurement ---
+class _JinjaCompileCounter:
+    def __init__(self, env):
+        self.count = 0
+        self._compile = env.compile
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+        return self._compile(*args, **kwargs)
+
+
+class _Sample:
+    __slots__ = ('seconds', 'queries', 'compiles')
+
+    def __init__(self, seconds: float, queries: int, compiles: int):
+        self.seconds, self.queries, self.compiles = seconds, queries, compiles
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile.
+    index = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+
+def summarise(samples: list) -> dict:
+    latencies = sorted(sample.seconds * 1000 for sample in samples)
+    return {
+        'samples': len(samples),
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p95_ms': round(_percentile(latencies, 95), 3),
+        'p99_ms': round(_percentile(latencies, 99), 3),
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+        'queries': round(sum(sample.queries for sample in samples) / len(samples), 2) if samples else 0,
+        'jinja_compiles': round(sum(sample.compiles for sample in samples) / len(samples), 2) if samples else 0,
+    }
+
+
+# --- Scripted replies ---
+def _first_option_id(message_config: dict) -> Optional[tuple]:
+    """Returns (reply type, id) of the first selectable option of an interactive question."""
+    action = (message_config.get('interactive') or {}).get('action') or {}
+    for button in action.get('buttons') or []:
+        option_id = (button.get('reply') or {}).get('id')
+        if option_id and '{{' not in option_id:
+            return 'button_reply', option_id
+    for section in action.get('sections') or []:
+        for row in section.get('rows') or []:
+            option_id = row.get('id')
+            if option_id and '{{' not in option_id:
+                return 'list_reply', option_id
+    return None
+
+
+def scripted_reply(flow_state: ContactFlowState) -> Optional[dict]:
+    """Builds the message a cooperative user would send to the question the contact is waiting on."""
+    expectation = (flow_state.flow_context_data or {}).get('_question_awaiting_reply_for')
+    if not expectation:
+        return None
+    expected_type = expectation.get('expected_type')
+    validation_regex = expectation.get('validation_regex')
+
+    if expected_type == 'interactive_id':
+        option = _first_option_id((flow_state.current_step.config or {}).get('message_config') or {})
+        if not option:
+            return None
+        reply_type, option_id = option
+        return {'type': 'interactive', 'interactive': {'type': reply_type, reply_type: {'id': option_id, 'title': option_id}}}
+    if expected_type == 'image':
+        return {'type': 'image', 'image': {'id': SAMPLE_MEDIA_ID, 'mime_type': 'image/jpeg'}}
+    if expected_type == 'email':
+        return {'type': 'text', 'text': {'body': SAMPLE_EMAIL}}
+
+    candidates = ['10', '1'] + SAMPLE_TEXT_ANSWERS if expected_type == 'number' else SAMPLE_TEXT_ANSWERS
+    answer = next((c for c in candidates if not validation_regex or re.match(validation_regex, c)), candidates[0])
+    return {'type': 'text', 'text': {'body': answer}}
+
+
+# --- Runner ---
+class FlowBenchmark:
+
+    def __init__(self, iterations: int = 20, warmup: int = 2):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.turns_by_flow = defaultdict(list)
+        self.steps_by_type = defaultdict(list)
+        self.skipped_flows = {}
+        self._recording = False
+        self._compile_counter = None
+
+    def load_definitions(self) -> list:
+        definitions = discover_flow_definitions(verbose=False)
+        with contextlib.redirect_stdout(io.StringIO()), transaction.atomic():
+            for definition in definitions:
+                _create_or_update_flow_from_definition(definition)
+        return definitions
+
+    def _instrumented_execute_step_actions(self, original):
+        def wrapper(step, *args, **kwargs):
+            queries_before, compiles_before = len(connection.queries_log), self._compile_counter.count
+            started = time.perf_counter()
+            result = original(step, *args, **kwargs)
+            if self._recording:
+                self.steps_by_type[step.step_type].append(_Sample(
+                    time.perf_counter() - started,
+                    len(connection.queries_log) - queries_before,
+                    self._compile_counter.count - compiles_before,
+                ))
+            return result
+        return wrapper
+
+    def _send(self, contact: Contact, message_data: dict, flow_name: str):
+        incoming_message = Message.objects.create(
+            contact=contact, direction='in', message_type=message_data['type'],
+            content_payload=message_data, status='received', timestamp=timezone.now(),
+        )
+        connection.queries_log.clear()
+        compiles_before = self._compile_counter.count
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            services.process_message_for_flow(contact, message_data, incoming_message)
+            elapsed = time.perf_counter() - started
+        if self._recording:
+            self.turns_by_flow[flow_name].append(_Sample(elapsed, len(captured), self._compile_counter.count - compiles_before))
+
+    def _converse(self, definition: dict, run_number: int):
+        """One scripted conversation, rolled back afterwards so every run starts from the same data."""
+        flow_name = definition['name']
+        keyword = next((k for k in definition.get('trigger_keywords') or [] if isinstance(k, str) and k.strip()), None)
+        with transaction.atomic():
+            contact = Contact.objects.create(whatsapp_id=f"263700{run_number:06d}", name='Benchmark Contact')
+            self._send(contact, {'type': 'text', 'text': {'body': keyword}}, flow_name)
+            for _ in range(MAX_TURNS_PER_CONVERSATION - 1):
+                flow_state = ContactFlowState.objects.select_related('current_flow', 'current_step').filter(contact=contact).first()
+                reply = scripted_reply(flow_state) if flow_state else None
+                if reply is None:
+                    break
+                self._send(contact, reply, flow_state.current_flow.name)
+            transaction.set_rollback(True)
+
+    def run(self, flow_names: Optional[list] = None) -> dict:
+        with offline_environment():
+            definitions = self.load_definitions()
+            self._compile_counter = _JinjaCompileCounter(services.jinja_env)
+            with mock.patch.object(services.jinja_env, 'compile', self._compile_counter), \
+                    mock.patch.object(services, '_execute_step_actions', self._instrumented_execute_step_actions(services._execute_step_actions)):
+                run_number = 0
+                for definition in definitions:
+                    if flow_names and definition['name'] not in flow_names:
+                        continue
+                    if not definition.get('is_active', True):
+                        self.skipped_flows[definition['name']] = 'inactive'
+                        continue
+                    if not any(isinstance(k, str) and k.strip() for k in definition.get('trigger_keywords') or []):
+                        self.skipped_flows[definition['name']] = 'no trigger keyword (only reachable by switch_flow)'
+                        continue
+                    for iteration in range(self.warmup + self.iterations):
+                        self._recording = iteration >= self.warmup
+                        run_number += 1
+                        self._converse(definition, run_number)
+                self._recording = False
+        return self.report()
+
+    def report(self) -> dict:
+        return {
+            'iterations': self.iterations,
+            'flows': {name: summarise(samples) for name, samples in sorted(self.turns_by_flow.items())},
+            'step_types': {name: summarise(samples) for name, samples in sorted(self.steps_by_type.items())},
+            'skipped_flows': self.skipped_flows,
+        }
+
+
+def compare_to_baseline(report: dict, baseline: dict, latency_tolerance: float = 0.25, latency_floor_ms: float = 1.0) -> list:
+    """
+    Returns a list of regressions of `report` against `baseline`.
+
+    Query and Jinja compile counts are deterministic for a given tree, so any
+    increase is a regression. p95 latency may grow by `latency_tolerance`
+    (a fraction) and by at least `latency_floor_ms` before it counts.
+    """
+    regressions = []
+    for section in ('flows', 'step_types'):
+        for name, base in baseline.get(section, {}).items():
+            current = report.get(section, {}).get(name)
+            if current is None:
+                continue
+            for metric in ('queries', 'jinja_compiles'):
+                if current[metric] > base[metric] + 0.01:
+                    regressions.append(f"{section}/{name}: {metric} per turn {base[metric]} -> {current[metric]}")
+            if current['p95_ms'] > base['p95_ms'] * (1 + latency_tolerance) and current['p95_ms'] - base['p95_ms'] > latency_floor_ms:
+                regressions.append(f"{section}/{name}: p95 latency {base['p95_ms']}ms -> {current['p95_ms']}ms")
+    return regressions
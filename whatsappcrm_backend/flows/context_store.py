@@ -0,0 +1,172 @@
+# whatsappcrm_backend/flows/context_store.py
+
+import hashlib
+import json
+import logging
+from collections.abc import Sequence
+from datetime import timedelta
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+logger = logging.getLogger(__name__)
+
+# Marks a context value that was moved to the side cache. The stored value is a
+# small dict: {'__ctx_ref__': cache key, 'count': items, 'bytes': encoded size}.
+CONTEXT_REF_KEY = '__ctx_ref__'
+
+# Long strings are cut to this many characters when they exceed the value budget.
+SUMMARY_STRING_CHARS = 500
+
+MAX_CONTEXT_BYTES = getattr(settings, 'FLOW_CONTEXT_MAX_BYTES', 32 * 1024)
+MAX_VALUE_BYTES = getattr(settings, 'FLOW_CONTEXT_MAX_VALUE_BYTES', 4 * 1024)
+SIDE_CACHE_TTL_SECONDS = getattr(settings, 'FLOW_CONTEXT_SIDE_CACHE_TTL_SECONDS', 86400)
+
+
+def side_cache():
+    # The 'flow_context' alias stores values msgpack-encoded and compressed in Redis.
+    # Deployments without it fall back to the default cache.
+    try:
+        return caches['flow_context']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _encoded_size(value: Any) -> int:
+    return len(json.dumps(value, default=str, separators=(',', ':')))
+
+
+def is_context_ref(value: Any) -> bool:
+    return isinstance(value, dict) and CONTEXT_REF_KEY in value
+
+
+def side_cache_timeout(state_ttl: Optional[timedelta]) -> Optional[int]:
+    """
+    Side-cache timeout for the context of a flow state that expires after
+    `state_ttl` of idle time (None: never). A reference must stay readable for as
+    long as the state holding it can live, so this is never shorter than the state TTL.
+    """
+    if state_ttl is None:
+        return None
+    return max(SIDE_CACHE_TTL_SECONDS, int(state_ttl.total_seconds()))
+
+
+# --- Writing ---
+def _offload(contact_id: int, name: str, value: Any, size: int, timeout: Optional[int]) -> dict:
+    digest = hashlib.sha1(json.dumps(value, default=str, sort_keys=True).encode()).hexdigest()[:16]
+    key = f"{contact_id}:{name}:{digest}"
+    side_cache().set(key, value, timeout=timeout)
+    return {CONTEXT_REF_KEY: key, 'count': len(value), 'bytes': size}
+
+
+def compact_flow_context(contact_id: int, context: Optional[dict],
+                         timeout: Optional[int] = SIDE_CACHE_TTL_SECONDS) -> dict:
+    """
+    Returns a copy of `context` that fits the per-contact size budget.
+    `timeout` is the side-cache timeout in seconds (None: no expiry), see
+    side_cache_timeout(). References already in the context are renewed with it,
+    since every save restarts the state's idle clock.
+
+    - Lists and dicts larger than FLOW_CONTEXT_MAX_VALUE_BYTES (typically
+      query_model results) move to the side cache and are replaced by a small
+      reference that templates resolve lazily.
+    - Longer strings are cut down to a summary.
+    - If the context is still over FLOW_CONTEXT_MAX_BYTES, the largest values
+      are dropped. Engine bookkeeping keys (starting with '_') are never dropped.
+
+    If the side cache is unavailable, oversized values are dropped instead.
+    """
+    if not context:
+        return context or {}
+
+    compacted, sizes, kept_refs = {}, {}, []
+    for name, value in context.items():
+        if is_context_ref(value):
+            kept_refs.append(value[CONTEXT_REF_KEY])
+        size = _encoded_size(value)
+        if size > MAX_VALUE_BYTES and not is_context_ref(value):
+            if isinstance(value, (list, dict)):
+                try:
+                    value = _offload(contact_id, name, value, size, timeout)
+                except Exception as e:
+                    logger.warning(f"Contact {contact_id}: could not move context value '{name}' ({size} bytes) to the side cache, dropping it. Error: {e}")
+                    continue
+            elif isinstance(value, str):
+                value = value[:SUMMARY_STRING_CHARS] + '…'
+            size = _encoded_size(value)
+        compacted[name] = value
+        sizes[name] = size
+
+    total = sum(sizes.values())
+    if total > MAX_CONTEXT_BYTES:
+        for name in sorted(sizes, key=sizes.get, reverse=True):
+            if total <= MAX_CONTEXT_BYTES:
+                break
+            if name.startswith('_'):
+                continue
+            del compacted[name]
+            total -= sizes[name]
+            logger.warning(f"Contact {contact_id}: dropped context value '{name}' ({sizes[name]} bytes) to keep the flow context within {MAX_CONTEXT_BYTES} bytes.")
+
+    for key in kept_refs:
+        try:
+            side_cache().touch(key, timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Contact {contact_id}: could not renew context value '{key}' in the side cache: {e}")
+    return compacted
+
+
+# --- Reading ---
+class LazyContextValue(Sequence):
+    """
+    Stands in for a context value that lives in the side cache. It is only fetched
+    when a template actually uses it (iterates, indexes, takes its length, ...).
+    An expired entry reads as empty.
+    """
+
+    def __init__(self, ref: dict):
+        self._ref = ref
+        self._value = None
+        self._loaded = False
+
+    def _load(self):
+        if not self._loaded:
+            try:
+                self._value = side_cache().get(self._ref[CONTEXT_REF_KEY])
+            except Exception as e:
+                logger.warning(f"Could not read context value '{self._ref[CONTEXT_REF_KEY]}' from the side cache: {e}")
+            if self._value is None:
+                logger.warning(f"Context value '{self._ref[CONTEXT_REF_KEY]}' is no longer in the side cache.")
+                self._value = []
+            self._loaded = True
+        return self._value
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __len__(self):
+        return len(self._load())
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __bool__(self):
+        return bool(self._ref.get('count'))
+
+    def __getattr__(self, name):
+        # Lets templates use dict values ('{{ summary.total }}', '{{ summary.items() }}').
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def __str__(self):
+        return str(self._load())
+
+
+def hydrate_flow_context(context: dict) -> dict:
+    """Swaps side-cache references in `context` for lazily loaded values, for template rendering."""
+    if not any(is_context_ref(value) for value in context.values()):
+        return context
+    return {name: LazyContextValue(value) if is_context_ref(value) else value for name, value in context.items()}
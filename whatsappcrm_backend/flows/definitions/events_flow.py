@@ -31,9 +31,14 @@ EVENTS_FLOW = {
                         "app_label": "church_services",
                         "model_name": "Event",
                         "variable_name": "events_list", 
-                        "filters_template": {"is_active": True, "start_time__gte": "{{ now() }}"},
+                        # Minute resolution keeps the resolved filter (and so the shared cache key) stable.
+                        "filters_template": {"is_active": True, "start_time__gte": "{{ now()|strftime('%Y-%m-%dT%H:%M%z') }}"},
                         "order_by": ["start_time"],
-                        "limit": 10
+                        "limit": 10,
+                        "fields": [
+                            "id", "title", "description", "start_time", "location", "registration_fee",
+                            "payment_instructions", "registration_link", "flyer"
+                        ]
                     },
                     {
                         "action_type": "set_context_variable",
@@ -334,7 +334,8 @@ GIVING_FLOW = {
                     "variable_name": "payment_history_list",
                     "filters_template": {"contact_id": "{{ contact.id }}"},
                     "order_by": ["-created_at"],
-                    "limit": 5
+                    "limit": 5,
+                    "fields": ["created_at", "currency", "amount", "payment_type", "status"]
                 }
             ]
         },
@@ -23,7 +23,8 @@ MINISTRIES_FLOW = {
                         "variable_name": "ministries_list",
                         "filters_template": {"is_active": True},
                         "order_by": ["name"],
-                        "limit": 10
+                        "limit": 10,
+                        "fields": ["name", "description", "leader_name", "meeting_schedule"]
                     },
                     {
                         "action_type": "set_context_variable",
@@ -29,7 +29,8 @@ MY_BOOKINGS_FLOW = {
                             "event__start_time__gte": "{{ now() }}"
                         },
                         "order_by": ["event__start_time"],
-                        "limit": 10
+                        "limit": 10,
+                        "fields": ["id", "status", "event__title", "event__start_time", "event__location"]
                     },
                     {
                         "action_type": "set_context_variable",
@@ -66,9 +67,7 @@ MY_BOOKINGS_FLOW = {
                 "text": {
                     "body": (
                         "Your Booking ({{ (booking_index | int) + 1 }} of {{ bookings_list|length }}):\n\n"
-                        # Note: Accessing related event details requires a change in how query_model works or a more complex template.
-                        # For now, we assume the query can fetch related data or we make a second query.
-                        # Let's assume for now we can access it simply. A better way is to enhance query_model.
+                        # 'event__*' fields in the query_model projection arrive nested under 'event'.
                         "*{{ bookings_list[booking_index | int].event.title }}*\n"
                         "🗓️ When: {{ bookings_list[booking_index | int].event.start_time|strftime('%a, %b %d, %Y @ %I:%M %p') }}\n"
                         "📍 Where: {{ bookings_list[booking_index | int].event.location }}\n\n"
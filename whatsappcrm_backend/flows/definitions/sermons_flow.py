@@ -23,7 +23,8 @@ SERMONS_FLOW = {
                         "variable_name": "sermons_list",
                         "filters_template": {"is_published": True},
                         "order_by": ["-sermon_date"],
-                        "limit": 10
+                        "limit": 10,
+                        "fields": ["title", "preacher", "sermon_date", "description", "video_link"]
                     },
                     {
                         "action_type": "set_context_variable",
@@ -0,0 +1,80 @@
+# whatsappcrm_backend/flows/management/commands/benchmark_flows.py
+
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from flows.benchmark import FlowBenchmark, compare_to_baseline
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'benchmark_baseline.json'
+
+class Command(BaseCommand):
+    """
+    Runs the flow engine micro-benchmark (flows.benchmark) against a throwaway
+    test database and compares the results with a stored baseline.
+
+    Typical use:
+        python manage.py benchmark_flows --write-baseline   # after an intended change
+        python manage.py benchmark_flows                    # in CI; exits non-zero on a regression
+    """
+    help = 'Benchmarks the flow engine over the shipped flow definitions (offline, in a test database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Measured conversations per flow. Default is 20.')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured conversations per flow first. Default is 2.')
+        parser.add_argument('--flow', action='append', dest='flows', help='Only benchmark this flow (repeatable).')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help=f'Baseline file. Default is {DEFAULT_BASELINE.name} in the flows app.')
+        parser.add_argument('--write-baseline', action='store_true', help='Save the results as the new baseline instead of comparing.')
+        parser.add_argument('--latency-tolerance', type=float, default=0.25, help='Allowed p95 latency growth as a fraction. Default is 0.25.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs.')
+        parser.add_argument('--json', action='store_true', help='Print the raw report as JSON.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_database_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            report = FlowBenchmark(iterations=options['iterations'], warmup=options['warmup']).run(options['flows'])
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print_report(report)
+
+        baseline_path = Path(options['baseline'])
+        if options['write_baseline']:
+            baseline_path.write_text(json.dumps({**report, 'generated_at': timezone.now().isoformat()}, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}."))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f"No baseline at {baseline_path}; run with --write-baseline to create one."))
+            return
+
+        regressions = compare_to_baseline(report, json.loads(baseline_path.read_text()), options['latency_tolerance'])
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f"  REGRESSION {regression}"))
+            raise CommandError(f"{len(regressions)} flow engine regression(s) against {baseline_path}.")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def _print_report(self, report: dict):
+        header = f"{'':32} {'turns':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'jinja':>6}"
+        for title, section in (('Per flow (whole turns)', 'flows'), ('Per step type (step execution)', 'step_types')):
+            self.stdout.write(self.style.NOTICE(title))
+            self.stdout.write(header)
+            for name, stats in report[section].items():
+                self.stdout.write(
+                    f"{name[:32]:32} {stats['samples']:>6} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                    f"{stats['p99_ms']:>9.2f} {stats['queries']:>8.1f} {stats['jinja_compiles']:>6.1f}"
+                )
+            self.stdout.write('')
+        for name, reason in report['skipped_flows'].items():
+            self.stdout.write(self.style.WARNING(f"Skipped flow '{name}': {reason}."))
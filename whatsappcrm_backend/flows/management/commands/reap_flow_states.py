@@ -0,0 +1,53 @@
+# whatsappcrm_backend/flows/management/commands/reap_flow_states.py
+
+from django.core.management.base import BaseCommand
+
+from flows.reaper import reap_stale_flow_states
+
+class Command(BaseCommand):
+    """
+    Removes contact flow states that have been idle longer than their flow's TTL
+    (Flow.state_ttl_seconds, or FLOW_STATE_DEFAULT_TTL_SECONDS) and reports how
+    many states and how many bytes of flow context were freed, per flow.
+    """
+    help = 'Reaps abandoned contact flow states and reports the space freed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of states removed per transaction. Default is 500.',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Stop after this many batches. Default is no limit.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be reaped without removing anything.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        report = reap_stale_flow_states(
+            batch_size=options['batch_size'], max_batches=options['max_batches'], dry_run=dry_run
+        )
+
+        if not report['flows']:
+            self.stdout.write(self.style.SUCCESS("No stale flow states found."))
+            return
+
+        verb = 'Would reap' if dry_run else 'Reaped'
+        for flow_name, flow_report in sorted(report['flows'].items()):
+            line = f"  {flow_name}: {verb.lower()} {flow_report['reaped']} state(s), {flow_report['bytes_freed'] / 1024:.1f} KiB"
+            if flow_report['timeout_events']:
+                line += f", {flow_report['timeout_events']} timeout event(s) emitted"
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['reaped']} flow state(s), {report['bytes_freed'] / 1024:.1f} KiB of flow context."
+            + (f" Emitted {report['timeout_events']} timeout event(s)." if report['timeout_events'] else "")
+        ))
@@ -0,0 +1,56 @@
+# whatsappcrm_backend/flows/management/commands/run_flow_timers.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from flows.timers import dispatch_due_timers, seconds_until_next_timer
+
+class Command(BaseCommand):
+    """
+    Long-running scheduler for flow timers. It claims due timers in batches and
+    hands them to the flow_turns workers, then sleeps until the next timer is due
+    (at most --poll-interval seconds, so newly scheduled timers are noticed).
+    """
+    help = 'Fires due flow timers (delayed steps, reminders, no-reply follow-ups) in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Maximum number of timers to claim per batch. Default is 1000.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Longest time to sleep between checks for due timers, in seconds. Default is 1.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Fire everything that is due now and exit.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        poll_interval = options['poll_interval']
+
+        self.stdout.write(self.style.SUCCESS(f"Flow timer scheduler started (batch size {batch_size})."))
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                fired = dispatch_due_timers(batch_size)
+                total += fired
+                if fired >= batch_size:
+                    continue  # More timers are due, keep draining.
+                if options['once']:
+                    break
+                next_due = seconds_until_next_timer()
+                time.sleep(poll_interval if next_due is None else min(poll_interval, next_due))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Flow timer scheduler stopped. Fired {total} timer(s)."))
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0005_inbox_broadcasts_archive_and_search_indexes'),
+        ('flows', '0002_alter_contactflowstate_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlowTimer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text="Timer name, matched by 'timer_fired' transition conditions.", max_length=100)),
+                ('fire_at', models.DateTimeField(db_index=True)),
+                ('cancel_on_reply', models.BooleanField(default=True, help_text='Cancel the timer as soon as the contact sends a message.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Flow Timer',
+                'verbose_name_plural': 'Flow Timers',
+                'ordering': ['fire_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='flow',
+            name='emit_timeout_event',
+            field=models.BooleanField(default=False, help_text="Before reaping an idle state, feed an 'internal_flow_timeout' event into the flow so a 'flow_timed_out' transition can react (e.g. send a 'session expired' message)."),
+        ),
+        migrations.AddField(
+            model_name='flow',
+            name='friendly_name',
+            field=models.CharField(blank=True, help_text='A user-friendly name for display purposes. If blank, it will be derived from the name.', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='flow',
+            name='state_ttl_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text='How long a contact may sit idle in this flow before their state is reaped. Blank uses FLOW_STATE_DEFAULT_TTL_SECONDS; 0 never expires.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='flow',
+            name='name',
+            field=models.CharField(help_text='Unique name for this flow (used as an identifier).', max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='flowstep',
+            name='step_type',
+            field=models.CharField(choices=[('send_message', 'Send Message'), ('question', 'Ask Question'), ('condition', 'Conditional Branch'), ('action', 'Perform Action'), ('wait_for_reply', 'Wait for Reply'), ('end_flow', 'End Flow'), ('start_flow_node', 'Start Flow Node'), ('human_handover', 'Handover to Human Agent'), ('switch_flow', 'Switch to Another Flow')], max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='contactflowstate',
+            index=models.Index(fields=['current_flow', 'last_updated_at'], name='flowstate_flow_updated'),
+        ),
+        migrations.AddField(
+            model_name='flowtimer',
+            name='contact',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flow_timers', to='conversations.contact'),
+        ),
+        migrations.AddField(
+            model_name='flowtimer',
+            name='flow',
+            field=models.ForeignKey(blank=True, help_text='Flow that scheduled the timer. The timer is dropped if the contact has left this flow when it fires.', null=True, on_delete=django.db.models.deletion.CASCADE, to='flows.flow'),
+        ),
+        migrations.AddField(
+            model_name='flowtimer',
+            name='step',
+            field=models.ForeignKey(blank=True, help_text='Step that scheduled the timer.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='flows.flowstep'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='flowtimer',
+            unique_together={('contact', 'name')},
+        ),
+    ]
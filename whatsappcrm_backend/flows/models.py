@@ -3,6 +3,8 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+
+from .context_store import compact_flow_context, side_cache_timeout
 # from conversations.models import Contact # String reference 'conversations.Contact' is used below
 # from meta_integration.models import MetaAppConfig # Not directly used in these models for now
 
@@ -39,6 +41,20 @@ class Flow(models.Model):
             "(e.g., [\"hello\", \"start session\"]). Case-insensitive 'contains' match."
         )
     )
+    state_ttl_seconds = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text=(
+            "How long a contact may sit idle in this flow before their state is reaped. "
+            "Blank uses FLOW_STATE_DEFAULT_TTL_SECONDS; 0 never expires."
+        )
+    )
+    emit_timeout_event = models.BooleanField(
+        default=False,
+        help_text=(
+            "Before reaping an idle state, feed an 'internal_flow_timeout' event into the flow "
+            "so a 'flow_timed_out' transition can react (e.g. send a 'session expired' message)."
+        )
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -319,12 +335,67 @@ class ContactFlowState(models.Model):
 
     # No custom clean() method needed here unless specific cross-field invariants
     # for ContactFlowState itself are defined beyond what FKs and OneToOneField enforce.
-    # The default save() is usually sufficient. If you add a clean() method, also add full_clean() to save().
+    # If you add a clean() method, also add full_clean() to save().
+
+    def save(self, *args, **kwargs):
+        # Every write goes through the context budget: oversized values move to the
+        # side cache or are dropped (see flows.context_store).
+        # Local import to avoid a circular import with reaper.py
+        from .reaper import flow_state_ttl
+        state_ttl = flow_state_ttl(self.current_flow) if self.current_flow_id else None
+        self.flow_context_data = compact_flow_context(
+            self.contact_id, self.flow_context_data, timeout=side_cache_timeout(state_ttl)
+        )
+        super().save(*args, **kwargs)
 
     class Meta:
         verbose_name = "Contact Flow State"
         verbose_name_plural = "Contact Flow States"
+        indexes = [
+            # Lets the stale state reaper find idle states per flow without a table scan.
+            models.Index(fields=['current_flow', 'last_updated_at'], name='flowstate_flow_updated'),
+        ]
         # The OneToOneField on 'contact' already ensures a contact can only have one flow_state.
         # If you ever changed 'contact' to a ForeignKey, then the unique_together below
         # might become relevant again to ensure a contact is only in one *active* flow at a time.
-        # unique_together = [['contact', 'current_flow']]
\ No newline at end of file
+        # unique_together = [['contact', 'current_flow']]
+
+class FlowTimer(models.Model):
+    """
+    A pending timer scheduled by a flow ('remind me in 2 hours', 'follow up if there
+    is no reply in 30 minutes').
+
+    Timers are plain rows indexed by fire_at, so hundreds of thousands of them cost
+    nothing until they are due. The run_flow_timers scheduler claims due rows in
+    batches and feeds them back into the flow engine as 'internal_timer' events,
+    which transitions can match with the 'timer_fired' condition. A contact can
+    have one pending timer per name; scheduling the same name again moves it.
+    """
+    contact = models.ForeignKey(
+        'conversations.Contact',
+        on_delete=models.CASCADE,
+        related_name='flow_timers'
+    )
+    name = models.CharField(max_length=100, help_text="Timer name, matched by 'timer_fired' transition conditions.")
+    flow = models.ForeignKey(
+        Flow,
+        on_delete=models.CASCADE,
+        null=True, blank=True,
+        help_text="Flow that scheduled the timer. The timer is dropped if the contact has left this flow when it fires."
+    )
+    step = models.ForeignKey(FlowStep, on_delete=models.SET_NULL, null=True, blank=True, help_text="Step that scheduled the timer.")
+    fire_at = models.DateTimeField(db_index=True)
+    cancel_on_reply = models.BooleanField(
+        default=True,
+        help_text="Cancel the timer as soon as the contact sends a message."
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Timer '{self.name}' for contact {self.contact_id} at {self.fire_at:%Y-%m-%d %H:%M:%S}"
+
+    class Meta:
+        verbose_name = "Flow Timer"
+        verbose_name_plural = "Flow Timers"
+        ordering = ['fire_at']
+        unique_together = ('contact', 'name')
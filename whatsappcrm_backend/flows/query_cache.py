@@ -0,0 +1,83 @@
+# whatsappcrm_backend/flows/query_cache.py
+
+import hashlib
+import json
+import logging
+from typing import Any, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+
+from .context_store import side_cache
+
+logger = logging.getLogger(__name__)
+
+# Models whose query_model results are shared between contacts. Catalogue-style
+# data only: the cache is invalidated by post_save/post_delete on the model, so
+# a queryset.update() or raw SQL write is only picked up when the TTL runs out.
+CACHEABLE_MODELS = {label.lower() for label in getattr(settings, 'QUERY_MODEL_CACHE_MODELS', [])}
+DEFAULT_TTL_SECONDS = getattr(settings, 'QUERY_MODEL_CACHE_TTL_SECONDS', 300)
+
+
+def _version_key(label: str) -> str:
+    return f"qm:version:{label}"
+
+
+def _cache_key(label: str, version: int, query_spec: list) -> str:
+    digest = hashlib.sha1(json.dumps(query_spec, sort_keys=True, default=str).encode()).hexdigest()
+    return f"qm:{label}:{version}:{digest}"
+
+
+def is_cacheable(model) -> bool:
+    return model._meta.label_lower in CACHEABLE_MODELS
+
+
+def get_cached_results(model, query_spec: list) -> tuple[Optional[list], Optional[str]]:
+    """
+    Looks up a query_model result by model and resolved query (filters, order,
+    limit, projection). Returns (results or None, key to store a fresh result under).
+    """
+    label = model._meta.label_lower
+    try:
+        cache = side_cache()
+        version = cache.get(_version_key(label)) or 0
+        key = _cache_key(label, version, query_spec)
+        return cache.get(key), key
+    except Exception as e:
+        logger.warning(f"query_model cache unavailable for {label}, querying the database. Error: {e}")
+        return None, None
+
+
+def store_results(key: Optional[str], results: list, ttl: Optional[int] = None):
+    if not key:
+        return
+    try:
+        side_cache().set(key, results, timeout=DEFAULT_TTL_SECONDS if ttl is None else ttl)
+    except Exception as e:
+        logger.warning(f"Could not store query_model results under '{key}': {e}")
+
+
+# --- Invalidation ---
+def invalidate_model_queries(sender, **kwargs):
+    """Bumps the model's version so every cached query on it misses from now on."""
+    key = _version_key(sender._meta.label_lower)
+    try:
+        cache = side_cache()
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+    except Exception as e:
+        logger.warning(f"Could not invalidate cached query_model results for {sender._meta.label}: {e}")
+
+
+def connect_invalidation_signals():
+    for label in CACHEABLE_MODELS:
+        try:
+            model = apps.get_model(label)
+        except (LookupError, ValueError):
+            logger.warning(f"QUERY_MODEL_CACHE_MODELS lists unknown model '{label}'; it will not be cached.")
+            continue
+        post_save.connect(invalidate_model_queries, sender=model, dispatch_uid=f"query_model_cache_save:{label}")
+        post_delete.connect(invalidate_model_queries, sender=model, dispatch_uid=f"query_model_cache_delete:{label}")
@@ -0,0 +1,117 @@
+# whatsappcrm_backend/flows/reaper.py
+
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Func, IntegerField, Sum
+from django.utils import timezone
+
+from outbox.services import enqueue_tasks
+from .models import Flow, ContactFlowState, FlowTimer
+
+logger = logging.getLogger(__name__)
+
+# message_data['type'] of the event fed into a flow before an idle state is reaped.
+FLOW_TIMEOUT_EVENT_TYPE = 'internal_flow_timeout'
+
+# Timeout events are handed to the flow_turns workers in chunks of this size.
+TIMEOUT_EVENTS_PER_TASK = 50
+
+
+class PgColumnSize(Func):
+    """Stored (possibly TOAST-compressed) size of a value, in bytes."""
+    function = 'pg_column_size'
+    output_field = IntegerField()
+
+
+def flow_state_ttl(flow: Flow) -> Optional[timedelta]:
+    """Idle time after which a state in `flow` expires, or None if it never does."""
+    ttl_seconds = flow.state_ttl_seconds
+    if ttl_seconds is None:
+        ttl_seconds = getattr(settings, 'FLOW_STATE_DEFAULT_TTL_SECONDS', 7 * 86400)
+    return timedelta(seconds=ttl_seconds) if ttl_seconds else None
+
+
+def reap_stale_flow_states(batch_size: int = 500, max_batches: Optional[int] = None, dry_run: bool = False) -> dict:
+    """
+    Removes ContactFlowState rows that have been idle longer than their flow's TTL.
+
+    Each flow is walked in keyset order (id > last seen id), one short transaction
+    per batch, so the reaper never holds locks on a large range or rescans rows it
+    already passed. Rows are claimed with SKIP LOCKED and only deleted if they are
+    still idle, so a contact who replies mid-run keeps their state. The contact's
+    timers for the flow go with it.
+
+    Flows with `emit_timeout_event` are not reaped directly: their idle states are
+    handed to process_flow_state_timeouts_task, which lets the flow react first.
+
+    Returns a report: {'flows': {flow name: {'reaped', 'bytes_freed', 'timeout_events'}},
+    'reaped': n, 'bytes_freed': n, 'timeout_events': n}. In a dry run 'reaped' and
+    'bytes_freed' count what would be removed.
+    """
+    # Local import to avoid a circular import with tasks.py
+    from .tasks import process_flow_state_timeouts_task
+
+    report = {'flows': {}, 'reaped': 0, 'bytes_freed': 0, 'timeout_events': 0}
+    now = timezone.now()
+    batches = 0
+
+    for flow in Flow.objects.order_by('id'):
+        ttl = flow_state_ttl(flow)
+        if ttl is None:
+            continue
+        cutoff = now - ttl
+        stale = ContactFlowState.objects.filter(current_flow=flow, last_updated_at__lt=cutoff)
+        flow_report = {'reaped': 0, 'bytes_freed': 0, 'timeout_events': 0}
+
+        if dry_run:
+            totals = stale.aggregate(bytes_freed=Sum(PgColumnSize('flow_context_data')))
+            flow_report['reaped'] = stale.count()
+            flow_report['bytes_freed'] = totals['bytes_freed'] or 0
+        else:
+            last_id = 0
+            while max_batches is None or batches < max_batches:
+                with transaction.atomic():
+                    rows = list(
+                        stale.filter(id__gt=last_id)
+                        .select_for_update(skip_locked=True)
+                        .order_by('id')
+                        .annotate(context_bytes=PgColumnSize('flow_context_data'))
+                        .values_list('id', 'contact_id', 'context_bytes')[:batch_size]
+                    )
+                    if not rows:
+                        break
+                    batches += 1
+                    last_id = rows[-1][0]
+                    if flow.emit_timeout_event:
+                        state_ids = [state_id for state_id, _, _ in rows]
+                        enqueue_tasks(
+                            process_flow_state_timeouts_task,
+                            [[state_ids[i:i + TIMEOUT_EVENTS_PER_TASK], cutoff.isoformat()]
+                             for i in range(0, len(state_ids), TIMEOUT_EVENTS_PER_TASK)]
+                        )
+                        flow_report['timeout_events'] += len(state_ids)
+                    else:
+                        ContactFlowState.objects.filter(id__in=[state_id for state_id, _, _ in rows]).delete()
+                        FlowTimer.objects.filter(contact_id__in=[contact_id for _, contact_id, _ in rows], flow=flow).delete()
+                        flow_report['reaped'] += len(rows)
+                        flow_report['bytes_freed'] += sum(size or 0 for _, _, size in rows)
+                if len(rows) < batch_size:
+                    break
+
+        if any(flow_report.values()):
+            report['flows'][flow.name] = flow_report
+            for key, value in flow_report.items():
+                report[key] += value
+        if max_batches is not None and batches >= max_batches:
+            logger.warning(f"Flow state reaper stopped after {batches} batches; the rest is left for the next run.")
+            break
+
+    logger.info(
+        f"Flow state reaper{' (dry run)' if dry_run else ''}: {report['reaped']} state(s) reaped, "
+        f"{report['bytes_freed']} bytes of context freed, {report['timeout_events']} timeout event(s) emitted."
+    )
+    return report
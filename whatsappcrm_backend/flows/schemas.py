@@ -221,7 +221,7 @@ class StepConfigQuestion(BasePydanticConfig):
     fallback_config: Optional[FallbackConfig] = None
 
 class ActionItemConfig(BasePydanticConfig):
-    action_type: Literal["set_context_variable", "update_contact_field", "update_member_profile", "record_payment", "record_prayer_request", "send_admin_notification", "query_model", "initiate_paynow_giving_payment", "record_event_booking", "update_model_record"]
+    action_type: Literal["set_context_variable", "update_contact_field", "update_member_profile", "record_payment", "record_prayer_request", "send_admin_notification", "query_model", "initiate_paynow_giving_payment", "record_event_booking", "update_model_record", "schedule_timer", "cancel_timer"]
     variable_name: Optional[str] = None
     value_template: Optional[Any] = None
     field_path: Optional[str] = None
@@ -258,8 +258,14 @@ class ActionItemConfig(BasePydanticConfig):
     filters_template: Optional[Dict[str, Any]] = Field(default_factory=dict)
     order_by: Optional[List[str]] = Field(default_factory=list)
     limit: Optional[int] = None
+    fields: Optional[List[str]] = None # Projection: only these fields (or 'related__field' lookups) are read
+    cache_ttl: Optional[int] = None # Seconds to share results for cacheable models; 0 disables, None uses the default
     # Fields for 'update_model_record'
     updates_template: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    # Fields for 'schedule_timer' / 'cancel_timer'
+    timer_name: Optional[str] = None
+    delay_template: Optional[Any] = None # Seconds, or a duration like '30m', '2h', '1d'
+    cancel_on_reply: bool = True
 
     @model_validator(mode='after')
     def check_action_fields(self):
@@ -294,6 +300,12 @@ class ActionItemConfig(BasePydanticConfig):
         elif action_type == 'update_model_record':
             if not self.app_label or not self.model_name or not self.updates_template:
                 raise ValueError("For update_model_record, 'app_label', 'model_name', and 'updates_template' are required.")
+        elif action_type == 'schedule_timer':
+            if not self.timer_name or self.delay_template is None:
+                raise ValueError("For schedule_timer, 'timer_name' and 'delay_template' are required.")
+        elif action_type == 'cancel_timer':
+            if not self.timer_name:
+                raise ValueError("For cancel_timer, 'timer_name' is required.")
         return self
 
 class StepConfigAction(BasePydanticConfig):
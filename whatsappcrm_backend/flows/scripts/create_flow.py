@@ -18,7 +18,9 @@ def _create_or_update_flow_from_definition(flow_definition: dict):
             "friendly_name": flow_definition.get("friendly_name", flow_name.replace("_", " ").title()),
             "description": flow_definition.get("description", ""),
             "trigger_keywords": flow_definition.get("trigger_keywords", []),
-            "is_active": flow_definition.get("is_active", True)
+            "is_active": flow_definition.get("is_active", True),
+            "state_ttl_seconds": flow_definition.get("state_ttl_seconds"),
+            "emit_timeout_event": flow_definition.get("emit_timeout_event", False),
         }
     )
     if created:
@@ -84,15 +86,10 @@ def _create_or_update_flow_from_definition(flow_definition: dict):
     print(f'>>> {flow_name} steps and transitions processed.')
 
 
-def run():
-    """
-    This script is executed by 'python manage.py runscript create_flow'.
-    It automatically discovers and creates/updates all flows defined in the `flows.definitions` package.
-    """
-    print("Preparing to create/update flows from declarative definitions...")
+def discover_flow_definitions(verbose: bool = True) -> list:
+    """Returns every flow definition dict (uppercase module-level dicts with 'name' and 'steps') in `flows.definitions`."""
+    flow_definitions = []
 
-    flow_definitions_to_process = []
-    
     # Discover all modules within the `flows.definitions` package
     package_path = flow_definitions_package.__path__
     package_name = flow_definitions_package.__name__
@@ -105,10 +102,22 @@ def run():
                 if attr_name.isupper():
                     attr = getattr(module, attr_name)
                     if isinstance(attr, dict) and "name" in attr and "steps" in attr:
-                        flow_definitions_to_process.append(attr)
-                        print(f"Found flow definition: '{attr['name']}' in {module_name}")
+                        flow_definitions.append(attr)
+                        if verbose:
+                            print(f"Found flow definition: '{attr['name']}' in {module_name}")
         except Exception as e:
             print(f"Could not import or process module {module_name}: {e}")
+    return flow_definitions
+
+
+def run():
+    """
+    This script is executed by 'python manage.py runscript create_flow'.
+    It automatically discovers and creates/updates all flows defined in the `flows.definitions` package.
+    """
+    print("Preparing to create/update flows from declarative definitions...")
+
+    flow_definitions_to_process = discover_flow_definitions()
 
     if not flow_definitions_to_process:
         print("No flow definitions found in `flows.definitions` package.")
@@ -223,6 +223,7 @@ class FlowSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'description', 'is_active',
             'trigger_keywords', # Expects list of strings from frontend
+            'state_ttl_seconds', 'emit_timeout_event',
             'entry_point_step_id',
             'steps_count',
             # 'steps', # If including full nested steps
@@ -17,7 +17,7 @@ from django.core.exceptions import ValidationError as DjangoValidationError # no
 from pydantic import ValidationError
 from django.conf import settings
 from django.http import HttpRequest
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from decimal import Decimal, InvalidOperation
 
 from conversations.models import Contact, Message
@@ -25,9 +25,17 @@ from .models import Flow, FlowStep, FlowTransition, ContactFlowState
 from customer_data.models import MemberProfile, Payment
 from customer_data.utils import record_payment, record_prayer_request, record_event_booking
 from notifications.services import queue_notifications_to_users
-from .tasks import resolve_human_intervention_after_timeout
 from paynow_integration.services import PaynowService
 from paynow_integration.tasks import poll_paynow_transaction_status
+from outbox.services import enqueue_task
+from .timers import TIMER_EVENT_TYPE, parse_delay_seconds, schedule_timer, cancel_timer, cancel_timers_on_reply
+from .reaper import FLOW_TIMEOUT_EVENT_TYPE
+from .context_store import hydrate_flow_context
+from .unit_of_work import flow_turn, save_fields, flush_pending_writes
+from .query_cache import (
+    is_cacheable as is_query_cacheable, get_cached_results as get_cached_query_results,
+    store_results as store_query_results
+)
 try:
     from media_manager.models import MediaAsset # For asset_pk lookup
     MEDIA_ASSET_ENABLED = True
@@ -41,6 +49,10 @@ from .schemas import (
 
 logger = logging.getLogger(__name__)
 
+# Actions whose writes are deferred to the end of the turn (see flows.unit_of_work).
+# Any other action flushes pending writes before it runs.
+BUFFERED_ACTION_TYPES = {'set_context_variable', 'update_contact_field', 'update_member_profile', 'schedule_timer', 'cancel_timer'}
+
 # Log MediaAsset status at module load time
 if not MEDIA_ASSET_ENABLED:
     logger.warning("MediaAsset model not found or could not be imported. MediaAsset functionality (e.g., 'asset_pk') will be disabled in flows.")
@@ -185,9 +197,9 @@ def _initiate_paynow_payment(contact: Contact, amount_str: str, payment_type: st
         }
         payment.save(update_fields=['transaction_reference', 'external_data', 'updated_at'])
         
-        # Use transaction.on_commit to ensure the task is dispatched only after the
-        # payment record has been successfully saved to the database, preventing race conditions.
-        transaction.on_commit(lambda: poll_paynow_transaction_status.delay(payment_id=str(payment.id)))
+        # Record the polling task in the outbox so it is dispatched only after the
+        # payment record has been committed, preventing race conditions.
+        enqueue_task(poll_paynow_transaction_status, kwargs={'payment_id': str(payment.id)})
         logger.info(f"Contact {contact.id}: Paynow initiation successful for Payment {payment.id}. Polling task scheduled.")
         return {'paynow_initiation_success': True, 'last_payment_id': str(payment.id)}
     else:
@@ -229,7 +241,7 @@ def _resolve_value(template_value: Any, flow_context: dict, contact: Contact) ->
             template = jinja_env.from_string(template_value)
             # The context for Jinja includes the contact, their profile, and the flow context flattened.
             render_context = {
-                **flow_context,
+                **hydrate_flow_context(flow_context),
                 'contact': contact,
                 'member_profile': getattr(contact, 'member_profile', None)
             }
@@ -280,6 +292,102 @@ def _resolve_template_components(components_config: list, flow_context: dict, co
         logger.error(f"Error resolving template components: {e}. Config: {components_config}", exc_info=True)
         return components_config
 
+def _make_json_serializable(d: dict) -> dict:
+    """Recursively converts values in a query_model row to JSON-friendly types, in place."""
+    for k, v in d.items():
+        if isinstance(v, dict):
+            _make_json_serializable(v)
+        elif isinstance(v, (datetime, date)):
+            d[k] = v.isoformat()
+        elif isinstance(v, models.fields.files.FieldFile):
+            d[k] = v.url if v else None
+        elif isinstance(v, Decimal):
+            d[k] = str(v)
+        elif isinstance(v, uuid.UUID):
+            d[k] = str(v)
+    return d
+
+def _get_lookup_field(Model, lookup: str):
+    """Returns the model field a 'related__field' lookup ends at, or None."""
+    field = None
+    for part in lookup.split('__'):
+        if Model is None:
+            return None
+        try:
+            field = Model._meta.get_field(part)
+        except Exception:
+            return None
+        Model = field.related_model
+    return field
+
+def _run_model_query(Model, filters: dict, order_by: list, limit: Optional[int], projection: Optional[List[str]]) -> list:
+    """
+    Runs the query behind a 'query_model' action and returns JSON-serializable rows.
+
+    With a projection (the action's 'fields') only those columns are read, in a
+    single query; 'related__field' lookups become nested dicts, so
+    'event__title' is available to templates as 'row.event.title'. Without one,
+    every field is returned along with single related objects as nested dicts.
+    """
+    queryset = Model.objects.filter(**filters)
+    if order_by:
+        queryset = queryset.order_by(*order_by)
+
+    if projection:
+        file_fields = {
+            lookup: field for lookup in projection
+            if isinstance(field := _get_lookup_field(Model, lookup), models.FileField)
+        }
+        if limit is not None:
+            queryset = queryset[:limit]
+        results_list = []
+        for row in queryset.values(*projection):
+            item = {}
+            for lookup, value in row.items():
+                if lookup in file_fields:
+                    value = file_fields[lookup].storage.url(value) if value else None
+                *parents, leaf = lookup.split('__')
+                target = item
+                for part in parents:
+                    target = target.setdefault(part, {})
+                target[leaf] = value
+            results_list.append(_make_json_serializable(item))
+        return results_list
+
+    # --- IMPROVEMENT: Automatically find and prefetch related objects (N+1 fix) ---
+    # This makes queries more efficient and allows templates to access related fields.
+    related_fields_to_select = []
+    related_fields_to_prefetch = []
+    for field in Model._meta.get_fields():
+        # Use select_related for single-object relationships (ForeignKey, OneToOne)
+        if isinstance(field, (models.ForeignKey, models.OneToOneField)):
+            related_fields_to_select.append(field.name)
+        # Use prefetch_related for many-to-many or reverse foreign key relationships
+        elif isinstance(field, (models.ManyToManyField, models.ManyToOneRel)):
+            related_fields_to_prefetch.append(field.name)
+
+    if related_fields_to_select:
+        queryset = queryset.select_related(*related_fields_to_select)
+    if related_fields_to_prefetch:
+        queryset = queryset.prefetch_related(*related_fields_to_prefetch)
+    if limit is not None:
+        queryset = queryset[:limit]
+
+    results_list = []
+    for obj in queryset:
+        # Use a more robust serialization that includes related objects
+        dict_obj = {}
+        for field in obj._meta.fields:
+            dict_obj[field.name] = getattr(obj, field.name)
+        # Add selected (single) related objects as nested dictionaries
+        for related_field_name in related_fields_to_select:
+            related_obj = getattr(obj, related_field_name, None)
+            if related_obj:
+                dict_obj[related_field_name] = model_to_dict(related_obj)
+        # Note: Prefetched (many) related objects are not serialized into this dict.
+        results_list.append(_make_json_serializable(dict_obj))
+    return results_list
+
 def _clear_contact_flow_state(contact: Contact, error: bool = False):
     deleted_count, _ = ContactFlowState.objects.filter(contact=contact).delete()
     if deleted_count > 0:        
@@ -440,6 +548,9 @@ def _execute_step_actions(step: FlowStep, contact: Contact, flow_context: dict,
             action_step_config = StepConfigAction.model_validate(raw_step_config)
             for action_item_conf in action_step_config.actions_to_run:
                 action_type = action_item_conf.action_type
+                if action_type not in BUFFERED_ACTION_TYPES:
+                    # Actions that go to the database themselves must see this turn's field writes.
+                    flush_pending_writes()
                 if action_type == 'set_context_variable' and action_item_conf.variable_name is not None:
                     resolved_value = _resolve_value(action_item_conf.value_template, current_step_context, contact)
                     current_step_context[action_item_conf.variable_name] = resolved_value
@@ -478,8 +589,8 @@ def _execute_step_actions(step: FlowStep, contact: Contact, flow_context: dict,
                         # If a proof of payment WAMID was provided, we must schedule the download task.
                         if proof_of_payment_wamid:
                             from customer_data.tasks import process_proof_of_payment_image
-                            # Use transaction.on_commit to ensure the task runs only after the payment is saved.
-                            transaction.on_commit(lambda: process_proof_of_payment_image.delay(str(payment_obj.id), proof_of_payment_wamid))
+                            # The outbox ensures the task runs only after the payment is saved.
+                            enqueue_task(process_proof_of_payment_image, args=[str(payment_obj.id), proof_of_payment_wamid])
                         logger.info(f"Contact {contact.id}: Action in step {step.id} recorded payment {payment_obj.id}.")
                         if confirmation_action:
                             actions_to_perform.append(confirmation_action)
@@ -590,66 +701,25 @@ def _execute_step_actions(step: FlowStep, contact: Contact, flow_context: dict,
                         if not isinstance(filters, dict):
                             logger.warning(f"Contact {contact.id}: 'filters_template' for query_model did not resolve to a dictionary. Using empty filters. Resolved value: {filters}")
                             filters = {}
-                            
-                        # --- IMPROVEMENT: Automatically find and prefetch related objects (N+1 fix) ---
-                        # This makes queries more efficient and allows templates to access related fields.
-                        related_fields_to_select = []
-                        related_fields_to_prefetch = []
-                        for field in Model._meta.get_fields():
-                            # Use select_related for single-object relationships (ForeignKey, OneToOne)
-                            if isinstance(field, (models.ForeignKey, models.OneToOneField)):
-                                related_fields_to_select.append(field.name)
-                            # Use prefetch_related for many-to-many or reverse foreign key relationships
-                            elif isinstance(field, (models.ManyToManyField, models.ManyToOneRel)):
-                                related_fields_to_prefetch.append(field.name)
-                        
-                        queryset = Model.objects.filter(**filters)
-                        if related_fields_to_select:
-                            queryset = queryset.select_related(*related_fields_to_select)
-                        if related_fields_to_prefetch:
-                            queryset = queryset.prefetch_related(*related_fields_to_prefetch)
-                        
-                        order_by_fields = action_item_conf.order_by
-                        if order_by_fields and isinstance(order_by_fields, list):
-                            queryset = queryset.order_by(*order_by_fields)
-                            
-                        if action_item_conf.limit is not None and isinstance(action_item_conf.limit, int):
-                            queryset = queryset[:action_item_conf.limit]
-                            
-                        results_list = []
-                        for obj in queryset:
-                            # Use a more robust serialization that includes related objects
-                            dict_obj = {}
-                            for field in obj._meta.fields:
-                                dict_obj[field.name] = getattr(obj, field.name)
-                            # Add selected (single) related objects as nested dictionaries
-                            for related_field_name in related_fields_to_select:
-                                related_obj = getattr(obj, related_field_name, None)
-                                if related_obj:
-                                    dict_obj[related_field_name] = model_to_dict(related_obj)
-                            # Note: Prefetched (many) related objects are not easily serialized into this dict
-                            # but the template can now access them without extra queries, which is the main goal.
-                            # e.g. `{{ my_model.my_many_to_many_set.all() }}` in a template will be efficient.
-
-
-                            # --- FIX: Recursively make the dictionary JSON serializable ---
-                            def make_serializable(d):
-                                for k, v in d.items():
-                                    if isinstance(v, dict):
-                                        make_serializable(v)
-                                    elif isinstance(v, (datetime, date)):
-                                        d[k] = v.isoformat()
-                                    elif isinstance(v, models.fields.files.FieldFile):
-                                        d[k] = v.url if v else None
-                                    elif isinstance(v, Decimal):
-                                        d[k] = str(v)
-                                    elif isinstance(v, uuid.UUID):
-                                        d[k] = str(v)
-                            
-                            make_serializable(dict_obj)
-                            
-                            results_list.append(dict_obj)
-                            
+
+                        order_by_fields = action_item_conf.order_by if isinstance(action_item_conf.order_by, list) else []
+                        limit = action_item_conf.limit if isinstance(action_item_conf.limit, int) else None
+                        projection = action_item_conf.fields or None
+
+                        # Catalogue-style models (QUERY_MODEL_CACHE_MODELS) return the same rows to every
+                        # contact, so their results are shared until the model changes or the TTL runs out.
+                        use_cache = is_query_cacheable(Model) and action_item_conf.cache_ttl != 0
+                        results_list, cache_key = (None, None)
+                        if use_cache:
+                            results_list, cache_key = get_cached_query_results(Model, [filters, order_by_fields, limit, projection])
+
+                        if results_list is None:
+                            results_list = _run_model_query(Model, filters, order_by_fields, limit, projection)
+                            if use_cache:
+                                store_query_results(cache_key, results_list, ttl=action_item_conf.cache_ttl)
+                        else:
+                            logger.debug(f"Contact {contact.id}: query_model on {model_name} served from cache.")
+
                         current_step_context[variable_name] = results_list
                         logger.info(f"Contact {contact.id}: Action in step {step.id} queried {model_name} and stored {len(results_list)} items in '{variable_name}'.")
                     except LookupError:
@@ -672,6 +742,18 @@ def _execute_step_actions(step: FlowStep, contact: Contact, flow_context: dict,
                         logger.error(f"Contact {contact.id}: 'update_model_record' action in step {step.id} failed. Model '{app_label}.{model_name}' not found.")
                     except Exception as e:
                         logger.error(f"Contact {contact.id}: 'query_model' action in step {step.id} failed with error: {e}", exc_info=True)
+                elif action_type == 'schedule_timer':
+                    delay_seconds = parse_delay_seconds(_resolve_value(action_item_conf.delay_template, current_step_context, contact))
+                    if delay_seconds is None:
+                        logger.error(f"Contact {contact.id}: 'schedule_timer' action in step {step.id} has an invalid delay '{action_item_conf.delay_template}'. Skipping.")
+                        continue
+                    schedule_timer(
+                        contact, action_item_conf.timer_name, delay_seconds,
+                        flow=step.flow, step=step, cancel_on_reply=action_item_conf.cancel_on_reply
+                    )
+                elif action_type == 'cancel_timer':
+                    if cancel_timer(contact, action_item_conf.timer_name):
+                        logger.info(f"Contact {contact.id}: Action in step {step.id} cancelled timer '{action_item_conf.timer_name}'.")
                 else:
                     logger.warning(f"Contact {contact.id}: Unknown or misconfigured action_type '{action_type}' in step '{step.name}' (ID: {step.id}).")
         except ValidationError as e:
@@ -727,17 +809,13 @@ def _execute_step_actions(step: FlowStep, contact: Contact, flow_context: dict,
             contact.needs_human_intervention = True
             intervention_time = timezone.now()
             contact.intervention_requested_at = intervention_time # Set timestamp
+            # The handover times out at this deadline; sweep_expired_human_interventions_task
+            # picks it up from there instead of a per-contact scheduled task.
+            timeout_seconds = settings.HUMAN_INTERVENTION_TIMEOUT_SECONDS
+            contact.intervention_timeout_at = intervention_time + timedelta(seconds=timeout_seconds)
             # Save last_seen as well, since this is an interaction
-            contact.save(update_fields=['needs_human_intervention', 'intervention_requested_at', 'last_seen'])
-            logger.info(f"Contact {contact.id} ({contact.whatsapp_id}) flagged for human intervention via step '{step.name}' at {intervention_time.isoformat()}.")
-
-            # Schedule the timeout task to run in 5 minutes
-            timeout_seconds = 5 * 60
-            resolve_human_intervention_after_timeout.apply_async(
-                args=[contact.id, intervention_time.isoformat()],
-                countdown=timeout_seconds
-            )
-            logger.info(f"Scheduled human intervention timeout task for contact {contact.id} in {timeout_seconds} seconds (triggered by step '{step.name}').")
+            contact.save(update_fields=['needs_human_intervention', 'intervention_requested_at', 'intervention_timeout_at', 'last_seen'])
+            logger.info(f"Contact {contact.id} ({contact.whatsapp_id}) flagged for human intervention via step '{step.name}' at {intervention_time.isoformat()}, times out in {timeout_seconds} seconds.")
 
             # Send notification to admin/pastoral groups
             # --- Enhanced Notification Details ---
@@ -1105,6 +1183,19 @@ def _evaluate_transition_condition(transition: FlowTransition, contact: Contact,
             return is_var_set if value_for_condition is True else not is_var_set
         return False # No question was being awaited or config mismatch
 
+    elif condition_type == 'timer_fired':
+        # Matches the event fed in when a timer scheduled by 'schedule_timer' fires.
+        # Without a 'timer_name' any of the contact's timers matches.
+        if message_data.get('type') != TIMER_EVENT_TYPE:
+            return False
+        expected_timer_name = config.get('timer_name')
+        return not expected_timer_name or message_data.get('timer', {}).get('name') == expected_timer_name
+
+    elif condition_type == 'flow_timed_out':
+        # Matches the event fed in by the stale state reaper before an idle state is
+        # removed (only for flows with emit_timeout_event).
+        return message_data.get('type') == FLOW_TIMEOUT_EVENT_TYPE
+
     elif condition_type == 'user_requests_human':
         human_request_keywords = config.get('keywords', ['help', 'support', 'agent', 'human', 'operator'])
         if user_text and isinstance(human_request_keywords, list):
@@ -1179,7 +1270,7 @@ def _update_contact_data(contact: Contact, field_path: str, value_to_set: Any):
         try:
             if hasattr(contact, field_name):
                 setattr(contact, field_name, value_to_set)
-                contact.save(update_fields=[field_name])
+                save_fields(contact, [field_name])
                 logger.info(f"Updated Contact {contact.whatsapp_id} field '{field_name}' to '{value_to_set}'.")
             else:
                 logger.warning(f"Contact field '{field_name}' not found.")
@@ -1201,12 +1292,12 @@ def _update_contact_data(contact: Contact, field_path: str, value_to_set: Any):
         final_key = parts[-1]
         if len(parts) > 1 : # Ensure there's at least one key after 'custom_fields'
             current_level[final_key] = value_to_set
-            contact.save(update_fields=['custom_fields'])
+            save_fields(contact, ['custom_fields'])
             logger.info(f"Updated Contact {contact.whatsapp_id} custom_fields path '{'.'.join(parts[1:])}' to '{value_to_set}'.")
         else: # Only 'custom_fields' was specified, meaning replace the whole dict
             if isinstance(value_to_set, dict):
                 contact.custom_fields = value_to_set
-                contact.save(update_fields=['custom_fields'])
+                save_fields(contact, ['custom_fields'])
                 logger.info(f"Replaced Contact {contact.whatsapp_id} custom_fields with: {value_to_set}")
             else:
                 logger.warning(f"Cannot replace Contact.custom_fields with a non-dictionary value for path '{field_path}'.")
@@ -1219,10 +1310,17 @@ def _update_member_profile_data(contact: Contact, fields_to_update_config: Dict[
         logger.warning("_update_member_profile_data called with invalid fields_to_update_config.")
         return
 
-    # get_or_create is atomic and safe for concurrent requests.
-    profile, created = MemberProfile.objects.get_or_create(contact=contact)
-    if created: 
-        logger.info(f"Created MemberProfile for contact {contact.whatsapp_id}")
+    # Reuse the profile loaded with the contact, so all updates in a turn land on one
+    # instance and are saved together.
+    created = False
+    try:
+        profile = contact.member_profile
+    except MemberProfile.DoesNotExist:
+        # get_or_create is atomic and safe for concurrent requests.
+        profile, created = MemberProfile.objects.get_or_create(contact=contact)
+        contact.member_profile = profile
+        if created:
+            logger.info(f"Created MemberProfile for contact {contact.whatsapp_id}")
 
     changed_fields = []
     for field_path, value_template in fields_to_update_config.items():
@@ -1279,17 +1377,18 @@ def _update_member_profile_data(contact: Contact, fields_to_update_config: Dict[
         profile.last_updated_from_conversation = timezone.now()
         if 'last_updated_from_conversation' not in changed_fields:
             changed_fields.append('last_updated_from_conversation')
-        profile.save(update_fields=changed_fields)
+        save_fields(profile, changed_fields)
         logger.info(f"MemberProfile for {contact.whatsapp_id} updated fields: {changed_fields}")
     elif created: # If only created and no specific fields changed by the action, still update timestamp
         profile.last_updated_from_conversation = timezone.now()
-        profile.save(update_fields=['last_updated_from_conversation'])
+        save_fields(profile, ['last_updated_from_conversation'])
 
 
 
 # --- Main Service Function (process_message_for_flow) ---
 # This is the function that should be imported by meta_integration/views.py
 @transaction.atomic
+@flow_turn # Contact/MemberProfile field updates are saved once, when the turn ends
 def process_message_for_flow(contact: Contact, message_data: dict, incoming_message_obj: Message) -> List[Dict[str, Any]]:
     """
     Main entry point to process an incoming message for a contact against flows.
@@ -1305,6 +1404,11 @@ def process_message_for_flow(contact: Contact, message_data: dict, incoming_mess
         logger.error(f"Contact with pk={contact.pk} not found at start of flow processing. Aborting.")
         return []
 
+    # A real message from the contact cancels the timers waiting for a reply
+    # (e.g. 'follow up if there is no reply in 30 minutes').
+    if incoming_message_obj is not None and not message_data.get('type', '').startswith('internal_'):
+        cancel_timers_on_reply(contact)
+
     # If a contact is flagged for human intervention, pause all flow processing for them.
     # An admin or agent must manually clear this flag in the admin panel or CRM interface
     # to re-enable automated flows for this contact.
@@ -1323,8 +1427,14 @@ def process_message_for_flow(contact: Contact, message_data: dict, incoming_mess
         # It allows for "fall-through" steps (like 'action' steps) to be processed immediately.
         while True:
             is_internal_message = message_data.get('type', '').startswith('internal_')
+            # Timer and timeout events are scheduled by the system, not sent by the contact.
+            is_scheduled_event = message_data.get('type') in (TIMER_EVENT_TYPE, FLOW_TIMEOUT_EVENT_TYPE)
             contact_flow_state = ContactFlowState.objects.select_related('current_flow', 'current_step').filter(contact=contact).first()
 
+            if not contact_flow_state and is_scheduled_event:
+                logger.info(f"Scheduled event '{message_data['type']}' for contact {contact.whatsapp_id} arrived with no active flow. Ignoring.")
+                break
+
             if not contact_flow_state:
                 logger.info(f"No active flow state for contact {contact.whatsapp_id}. Attempting to trigger a new flow.")
                 
@@ -1352,7 +1462,8 @@ def process_message_for_flow(contact: Contact, message_data: dict, incoming_mess
 
             # --- Step 1: Process incoming message if the current step is a question ---
             is_pass_through_step = True # Assume step is pass-through unless it's a question
-            if current_step.step_type == 'question' and '_question_awaiting_reply_for' in flow_context:
+            # A timer or timeout event is not an answer: it goes straight to the step's transitions.
+            if current_step.step_type == 'question' and '_question_awaiting_reply_for' in flow_context and not is_scheduled_event:
                 # If we've arrived at a question step via an internal transition (fallthrough/switch),
                 # we must stop and wait for the user's actual reply. We should not process the
                 # internal message as if it were a user's answer.
@@ -1493,6 +1604,10 @@ def process_message_for_flow(contact: Contact, message_data: dict, incoming_mess
                     if any(action.get('type') == '_internal_command_clear_flow_state' for action in actions):
                         break # Exit the while loop for end_flow or human_handover
 
+            elif is_scheduled_event:
+                # Nothing on this step is waiting for the event; it must not trigger re-prompts.
+                logger.info(f"Scheduled event '{message_data['type']}' at step '{current_step.name}' matched no transition for contact {contact.id}. Ignoring.")
+                break
             else:
                 logger.info(f"No transition met for step '{current_step.name}'. Engaging fallback logic for contact {contact.id}.")
                 fallback_actions = _handle_fallback(current_step, contact, flow_context, contact_flow_state, message_data)
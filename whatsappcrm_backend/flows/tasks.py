@@ -2,22 +2,96 @@
 
 import logging
 from celery import shared_task
+from datetime import timedelta
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.db import transaction
 from django.core.exceptions import ObjectDoesNotExist
 
-from conversations.models import Contact, Message
-from meta_integration.tasks import send_whatsapp_message_task
+from conversations.models import Contact, Message, save_message_payloads, update_inbox_summaries
+from meta_integration.tasks import send_whatsapp_message_task, send_message_sequence_task
 from meta_integration.models import MetaAppConfig
+from meta_integration.utils import get_active_meta_config_for_sending
+from outbox.services import enqueue_task, enqueue_tasks
 
 logger = logging.getLogger(__name__)
 
+INTERVENTION_TIMEOUT_MESSAGE = (
+    "It seems our pastoral team is currently unavailable. Your request has been noted, and they will get back to you as soon as possible.\n\n"
+    "In the meantime, automated assistance has been re-enabled. You can type 'menu' to see other options."
+)
+
+
+@shared_task(name="flows.tasks.sweep_expired_human_interventions_task")
+def sweep_expired_human_interventions_task(batch_size: int = 500, max_batches: int = 20):
+    """
+    Periodic sweeper for human handovers that timed out. Finds contacts whose
+    intervention_timeout_at has passed (a partial index keeps this cheap), re-enables
+    the bot for them in batches and bulk-creates the timeout notices.
+
+    Rows are claimed with SKIP LOCKED, so overlapping runs never process a contact
+    twice, and a staff member resolving or re-flagging a contact in the meantime
+    simply removes it from the sweep.
+    """
+    from conversations.signals import broadcast_new_messages
+    from stats.signals import broadcast_contact_stats
+
+    # Looked up once, outside the batch transactions: with no (or more than one) active
+    # config the bot is still re-enabled, just without timeout notices.
+    active_config = get_active_meta_config_for_sending()
+    total_resolved = 0
+    for _ in range(max_batches):
+        now = timezone.now()
+        with transaction.atomic():
+            contacts = list(
+                Contact.objects.select_for_update(skip_locked=True)
+                .filter(needs_human_intervention=True, intervention_timeout_at__lte=now)
+                .order_by('intervention_timeout_at')[:batch_size]
+            )
+            if not contacts:
+                break
+
+            Contact.objects.filter(id__in=[c.id for c in contacts]).update(
+                needs_human_intervention=False, intervention_requested_at=None, intervention_timeout_at=None
+            )
+            # update() sends no post_save, so refresh the dashboard's handover count once per batch.
+            transaction.on_commit(broadcast_contact_stats)
+
+            if active_config:
+                notices = Message.objects.bulk_create([
+                    Message(
+                        contact=contact, app_config=active_config, direction='out',
+                        message_type='text', content_payload={'body': INTERVENTION_TIMEOUT_MESSAGE},
+                        text_content=INTERVENTION_TIMEOUT_MESSAGE,
+                        status='pending_dispatch', timestamp=now
+                    )
+                    for contact in contacts
+                ])
+                save_message_payloads(notices)
+                update_inbox_summaries(notices)
+                enqueue_tasks(send_whatsapp_message_task, [[notice.id, active_config.id] for notice in notices])
+                transaction.on_commit(lambda notices=notices: broadcast_new_messages(notices))
+            else:
+                logger.error(f"No active MetaAppConfig: re-enabled the bot for {len(contacts)} contact(s) without sending timeout notices.")
+
+        total_resolved += len(contacts)
+        if len(contacts) < batch_size:
+            break
+
+    if total_resolved:
+        logger.info(f"Human intervention timed out for {total_resolved} contact(s); bot re-enabled.")
+    return total_resolved
+
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
 def resolve_human_intervention_after_timeout(self, contact_id: int, intervention_timestamp_iso: str):
     """
     Checks if a human intervention request has timed out and, if so,
     re-enables the bot for the contact and notifies them.
 
+    Superseded by sweep_expired_human_interventions_task; kept so timeout tasks
+    scheduled before the sweeper was introduced still run.
+
     Args:
         contact_id: The ID of the contact.
         intervention_timestamp_iso: The ISO 8601 string of the timestamp when intervention was requested.
@@ -40,23 +114,19 @@ def resolve_human_intervention_after_timeout(self, contact_id: int, intervention
         # Reset the flag and timestamp
         contact.needs_human_intervention = False
         contact.intervention_requested_at = None
-        contact.save(update_fields=['needs_human_intervention', 'intervention_requested_at'])
+        contact.intervention_timeout_at = None
+        contact.save(update_fields=['needs_human_intervention', 'intervention_requested_at', 'intervention_timeout_at'])
 
         # Notify the user that the bot is active again
         try:
             active_config = MetaAppConfig.objects.get_active_config()
-            message_text = (
-                "It seems our pastoral team is currently unavailable. Your request has been noted, and they will get back to you as soon as possible.\n\n"
-                "In the meantime, automated assistance has been re-enabled. You can type 'menu' to see other options."
-            )
-
-            message = Message.objects.create(
-                contact=contact, app_config=active_config, direction='out',
-                message_type='text', content_payload={'body': message_text},
-                status='pending_dispatch', timestamp=timezone.now()
-            )
-
-            send_whatsapp_message_task.delay(message.id, active_config.id)
+            with transaction.atomic():
+                message = Message.objects.create(
+                    contact=contact, app_config=active_config, direction='out',
+                    message_type='text', content_payload={'body': INTERVENTION_TIMEOUT_MESSAGE},
+                    status='pending_dispatch', timestamp=timezone.now()
+                )
+                enqueue_task(send_whatsapp_message_task, args=[message.id, active_config.id])
             logger.info(f"Queued intervention timeout notification {message.id} for contact {contact.id}.")
 
         except ObjectDoesNotExist as e:
@@ -67,7 +137,58 @@ def resolve_human_intervention_after_timeout(self, contact_id: int, intervention
     else:
         logger.info(f"Human intervention for contact {contact.id} was already resolved or a new request was made. Timeout task for timestamp {intervention_timestamp_iso} is ignored.")
 
-@shared_task(queue='celery') # Use your main I/O queue
+def _materialise_turn_actions(contact: Contact, actions_to_perform: list, config_to_use: MetaAppConfig, incoming_message: Message = None) -> list:
+    """
+    Turns the 'send_whatsapp_message' actions of one flow turn into outbound messages.
+    Must be called inside the turn's transaction.
+
+    Recipients are looked up once per turn (almost always just the sender),
+    all messages are inserted with a single bulk_create and the whole batch is
+    handed to the sequencer as one chained dispatch.
+    """
+    from conversations.signals import broadcast_new_messages
+
+    recipients_by_wa_id = {contact.whatsapp_id: contact}
+    send_actions = [action for action in actions_to_perform if action.get('type') == 'send_whatsapp_message']
+    missing_wa_ids = {
+        action.get('recipient_wa_id', contact.whatsapp_id) for action in send_actions
+    } - recipients_by_wa_id.keys()
+    if missing_wa_ids:
+        recipients_by_wa_id.update(
+            (c.whatsapp_id, c) for c in Contact.objects.filter(whatsapp_id__in=missing_wa_ids)
+        )
+        for wa_id in missing_wa_ids - recipients_by_wa_id.keys():
+            recipients_by_wa_id[wa_id], _ = Contact.objects.get_or_create(whatsapp_id=wa_id)
+
+    now = timezone.now()
+    outgoing_messages = []
+    for position, action in enumerate(send_actions):
+        outgoing_msg = Message(
+            contact=recipients_by_wa_id[action.get('recipient_wa_id', contact.whatsapp_id)],
+            app_config=config_to_use, direction='out',
+            message_type=action.get('message_type'), content_payload=action.get('data'),
+            status='pending_dispatch', related_incoming_message=incoming_message,
+            # Distinct timestamps keep the turn's messages in order for timestamp-ordered views.
+            timestamp=now + timedelta(microseconds=position)
+        )
+        # bulk_create bypasses Message.save(), so derive text_content here.
+        outgoing_msg.populate_text_content()
+        outgoing_messages.append(outgoing_msg)
+
+    if outgoing_messages:
+        Message.objects.bulk_create(outgoing_messages)
+        save_message_payloads(outgoing_messages)
+        update_inbox_summaries(outgoing_messages)
+        enqueue_task(
+            send_message_sequence_task,
+            args=[[m.id for m in outgoing_messages], config_to_use.id]
+        )
+        # No post_save fires for bulk_create; push the batch to the UI once committed.
+        transaction.on_commit(lambda: broadcast_new_messages(outgoing_messages))
+    return outgoing_messages
+
+
+@shared_task # Routed to the flow_turns lane in CELERY_TASK_ROUTES
 def process_flow_for_message_task(message_id: int):
     """
     This task asynchronously runs the entire flow engine for an incoming message.
@@ -83,7 +204,7 @@ def process_flow_for_message_task(message_id: int):
             # First, lock the specific row.
             Message.objects.select_for_update().get(pk=message_id)
             # Then, fetch the object with its related fields.
-            incoming_message = Message.objects.select_related('contact', 'app_config').get(pk=message_id)
+            incoming_message = Message.objects.select_related('contact', 'app_config', 'payload').get(pk=message_id)
 
             # --- Idempotency Check ---
             # If the message has already been processed by the flow engine, log it and exit.
@@ -108,21 +229,8 @@ def process_flow_for_message_task(message_id: int):
                 logger.warning(f"Message {message_id} has no associated app_config. Falling back to active config.")
                 config_to_use = MetaAppConfig.objects.get_active_config()
 
-            dispatch_countdown = 0
-            for action in actions_to_perform:
-                if action.get('type') == 'send_whatsapp_message':
-                    recipient_wa_id = action.get('recipient_wa_id', contact.whatsapp_id)
-                    
-                    recipient_contact, _ = Contact.objects.get_or_create(whatsapp_id=recipient_wa_id)
-
-                    outgoing_msg = Message.objects.create(
-                        contact=recipient_contact, app_config=config_to_use, direction='out',
-                        message_type=action.get('message_type'), content_payload=action.get('data'),
-                        status='pending_dispatch', related_incoming_message=incoming_message
-                    )
-                    send_whatsapp_message_task.apply_async(args=[outgoing_msg.id, config_to_use.id], countdown=dispatch_countdown)
-                    dispatch_countdown += 2
-            
+            _materialise_turn_actions(contact, actions_to_perform, config_to_use, incoming_message)
+
             # --- Mark as Processed ---
             # After all actions are dispatched, mark the message as processed.
             incoming_message.flow_processed_at = timezone.now()
@@ -132,3 +240,108 @@ def process_flow_for_message_task(message_id: int):
         logger.error(f"process_flow_for_message_task: Message with ID {message_id} not found.")
     except Exception as e:
         logger.error(f"Critical error in process_flow_for_message_task for message {message_id}: {e}", exc_info=True)
+
+
+@shared_task(name="flows.tasks.process_flow_timer_events_task")
+def process_flow_timer_events_task(events: list):
+    """
+    Feeds a batch of fired flow timers (claimed by the run_flow_timers scheduler)
+    into the flow engine as 'internal_timer' events, one transaction per contact.
+
+    A timer is dropped if the contact has left the flow that scheduled it, or if it
+    was meant to be cancelled by a reply and the contact replied after it was
+    scheduled (the reply raced the scheduler).
+    """
+    # Import locally to break the import cycle with flows.services.
+    from .services import process_message_for_flow
+    from .models import ContactFlowState
+    from .timers import TIMER_EVENT_TYPE
+
+    # The timers are already deleted; a missing config must not lose the batch.
+    active_config = get_active_meta_config_for_sending()
+    for event in events:
+        contact_id, timer_name = event['contact_id'], event['name']
+        try:
+            with transaction.atomic():
+                contact = Contact.objects.filter(pk=contact_id).first()
+                flow_state = ContactFlowState.objects.filter(contact_id=contact_id).only('current_flow_id').first()
+                if not contact or not flow_state or (event['flow_id'] and flow_state.current_flow_id != event['flow_id']):
+                    logger.info(f"Timer '{timer_name}' for contact {contact_id} is stale (contact left the flow). Dropped.")
+                    continue
+                if event['cancel_on_reply'] and Message.objects.filter(
+                    contact_id=contact_id, direction='in', timestamp__gt=parse_datetime(event['created_at'])
+                ).exists():
+                    logger.info(f"Timer '{timer_name}' for contact {contact_id} was overtaken by a reply. Dropped.")
+                    continue
+
+                message_data = {'type': TIMER_EVENT_TYPE, 'timer': {'name': timer_name, 'fire_at': event['fire_at']}}
+                actions_to_perform = process_message_for_flow(contact, message_data, None)
+                if actions_to_perform and active_config:
+                    _materialise_turn_actions(contact, actions_to_perform, active_config)
+                elif actions_to_perform:
+                    logger.error(f"No active MetaAppConfig: timer '{timer_name}' for contact {contact_id} produced messages that cannot be sent.")
+        except Exception as e:
+            logger.error(f"Error processing timer '{timer_name}' for contact {contact_id}: {e}", exc_info=True)
+
+
+@shared_task(name="flows.tasks.reap_stale_flow_states_task")
+def reap_stale_flow_states_task(batch_size: int = 500, max_batches: int = 200):
+    """
+    Periodic task that removes flow states left idle beyond their flow's TTL.
+    Bounded by max_batches per run; anything left over is picked up next time.
+    """
+    from .reaper import reap_stale_flow_states
+    report = reap_stale_flow_states(batch_size=batch_size, max_batches=max_batches)
+    return {key: value for key, value in report.items() if key != 'flows'}
+
+
+@shared_task(name="flows.tasks.process_flow_state_timeouts_task")
+def process_flow_state_timeouts_task(state_ids: list, cutoff_iso: str):
+    """
+    Gives flows with `emit_timeout_event` a last turn before their idle states are
+    reaped: an 'internal_flow_timeout' event is fed into the flow, which can match
+    it with a 'flow_timed_out' transition. A state the event did not move along
+    (no matching transition) is removed afterwards.
+
+    States that saw activity since the reaper picked them up are left alone.
+    """
+    # Import locally to break the import cycle with flows.services.
+    from .services import process_message_for_flow
+    from .models import ContactFlowState, FlowTimer
+    from .reaper import FLOW_TIMEOUT_EVENT_TYPE
+
+    cutoff = parse_datetime(cutoff_iso)
+    active_config = get_active_meta_config_for_sending()
+    for state_id in state_ids:
+        try:
+            with transaction.atomic():
+                flow_state = (
+                    ContactFlowState.objects.select_for_update(of=('self',))
+                    .select_related('contact', 'current_flow', 'current_step')
+                    .filter(id=state_id, last_updated_at__lt=cutoff)
+                    .first()
+                )
+                if not flow_state:
+                    continue
+                contact, flow = flow_state.contact, flow_state.current_flow
+
+                message_data = {
+                    'type': FLOW_TIMEOUT_EVENT_TYPE,
+                    'flow_timeout': {
+                        'flow': flow.name,
+                        'step': flow_state.current_step.name,
+                        'idle_since': flow_state.last_updated_at.isoformat(),
+                    },
+                }
+                actions_to_perform = process_message_for_flow(contact, message_data, None)
+                if actions_to_perform and active_config:
+                    _materialise_turn_actions(contact, actions_to_perform, active_config)
+                elif actions_to_perform:
+                    logger.error(f"No active MetaAppConfig: timeout event for contact {contact.id} produced messages that cannot be sent.")
+
+                deleted, _ = ContactFlowState.objects.filter(id=state_id, last_updated_at__lt=cutoff).delete()
+                if deleted:
+                    FlowTimer.objects.filter(contact=contact, flow=flow).delete()
+                    logger.info(f"Reaped idle flow state of contact {contact.id} in flow '{flow.name}' after its timeout event.")
+        except Exception as e:
+            logger.error(f"Error processing flow timeout for state {state_id}: {e}", exc_info=True)
@@ -1,3 +1,140 @@
-from django.test import TestCase
+# whatsappcrm_backend/flows/tests.py
 
-# Create your tests here.
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .context_store import CONTEXT_REF_KEY, SUMMARY_STRING_CHARS, compact_flow_context
+from .timers import parse_delay_seconds
+from .unit_of_work import flow_turn, flush_pending_writes, save_fields
+
+
+class ParseDelaySecondsTests(SimpleTestCase):
+
+    def test_numbers_are_seconds(self):
+        self.assertEqual(parse_delay_seconds(90), 90)
+        self.assertEqual(parse_delay_seconds(2.9), 2)
+        self.assertEqual(parse_delay_seconds('90'), 90)
+
+    def test_units(self):
+        self.assertEqual(parse_delay_seconds('30s'), 30)
+        self.assertEqual(parse_delay_seconds('30m'), 1800)
+        self.assertEqual(parse_delay_seconds(' 2H '), 7200)
+        self.assertEqual(parse_delay_seconds('1.5d'), 129600)
+
+    def test_invalid_or_non_positive_values(self):
+        for value in (None, '', 'soon', '10w', '-5m', 0, -3, '0s', True):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_delay_seconds(value))
+
+
+class CompactFlowContextTests(SimpleTestCase):
+
+    def setUp(self):
+        for name, value in (('MAX_VALUE_BYTES', 100), ('MAX_CONTEXT_BYTES', 1000)):
+            patcher = mock.patch(f'flows.context_store.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('flows.context_store.side_cache')
+        self.cache = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_small_context_is_unchanged(self):
+        context = {'name': 'Tendai', 'step': 3}
+        self.assertEqual(compact_flow_context(1, context), context)
+        self.cache.set.assert_not_called()
+        self.assertEqual(compact_flow_context(1, None), {})
+
+    def test_large_collections_move_to_the_side_cache(self):
+        rows = [{'id': i, 'title': f'Event {i}'} for i in range(20)]
+        compacted = compact_flow_context(7, {'events': rows}, timeout=60)
+
+        ref = compacted['events']
+        self.assertEqual(ref['count'], 20)
+        self.assertTrue(ref[CONTEXT_REF_KEY].startswith('7:events:'))
+        self.cache.set.assert_called_once_with(ref[CONTEXT_REF_KEY], rows, timeout=60)
+
+    def test_long_strings_are_summarised(self):
+        compacted = compact_flow_context(1, {'note': 'x' * 1000})
+        self.assertEqual(compacted['note'], 'x' * SUMMARY_STRING_CHARS + '…')
+
+    def test_value_is_dropped_when_the_side_cache_fails(self):
+        self.cache.set.side_effect = ConnectionError('redis down')
+        compacted = compact_flow_context(1, {'events': list(range(100)), 'step': 3})
+        self.assertEqual(compacted, {'step': 3})
+
+    def test_largest_values_are_dropped_over_budget_but_bookkeeping_is_kept(self):
+        context = {'_engine_state': 'e' * 95, 'a': 'a' * 95, 'b': 'b' * 60, 'c': 'c' * 10}
+        with mock.patch('flows.context_store.MAX_CONTEXT_BYTES', 200):
+            compacted = compact_flow_context(1, context)
+        self.assertEqual(set(compacted), {'_engine_state', 'b', 'c'})
+
+    def test_existing_references_are_kept_and_renewed(self):
+        ref = {CONTEXT_REF_KEY: '1:events:abc', 'count': 500, 'bytes': 90000}
+        compacted = compact_flow_context(1, {'events': ref}, timeout=3600)
+        self.assertEqual(compacted['events'], ref)
+        self.cache.set.assert_not_called()
+        self.cache.touch.assert_called_once_with('1:events:abc', timeout=3600)
+
+
+class FlowTurnUnitOfWorkTests(SimpleTestCase):
+
+    def test_save_fields_outside_a_turn_saves_immediately(self):
+        contact = mock.Mock()
+        save_fields(contact, ['name'])
+        contact.save.assert_called_once_with(update_fields=['name'])
+
+    def test_writes_are_merged_and_flushed_once_when_the_turn_ends(self):
+        contact = mock.Mock()
+
+        @flow_turn
+        def turn():
+            save_fields(contact, ['name'])
+            save_fields(contact, ['email', 'name'])
+            contact.save.assert_not_called()
+
+        turn()
+        contact.save.assert_called_once_with(update_fields=['email', 'name'])
+
+    def test_nested_turns_join_the_outermost_one(self):
+        contact = mock.Mock()
+
+        @flow_turn
+        def inner():
+            save_fields(contact, ['email'])
+
+        @flow_turn
+        def outer():
+            save_fields(contact, ['name'])
+            inner()
+            contact.save.assert_not_called()
+
+        outer()
+        contact.save.assert_called_once_with(update_fields=['email', 'name'])
+
+    def test_flush_pending_writes_saves_mid_turn(self):
+        contact = mock.Mock()
+
+        @flow_turn
+        def turn():
+            save_fields(contact, ['name'])
+            flush_pending_writes()
+            contact.save.assert_called_once_with(update_fields=['name'])
+
+        turn()
+        self.assertEqual(contact.save.call_count, 1)
+
+    def test_failed_turn_discards_its_writes(self):
+        contact = mock.Mock()
+
+        @flow_turn
+        def turn():
+            save_fields(contact, ['name'])
+            raise RuntimeError('step failed')
+
+        with self.assertRaises(RuntimeError):
+            turn()
+        contact.save.assert_not_called()
+        # The turn's unit of work is gone, so later writes save immediately again.
+        save_fields(contact, ['email'])
+        contact.save.assert_called_once_with(update_fields=['email'])
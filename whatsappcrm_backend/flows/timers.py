@@ -0,0 +1,128 @@
+# whatsappcrm_backend/flows/timers.py
+
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from conversations.models import Contact
+from outbox.services import enqueue_tasks
+from .models import Flow, FlowStep, FlowTimer
+
+logger = logging.getLogger(__name__)
+
+# message_data['type'] of the event a fired timer feeds into process_message_for_flow.
+TIMER_EVENT_TYPE = 'internal_timer'
+
+# Due timers are handed to the flow_turns workers in chunks of this size.
+TIMER_EVENTS_PER_TASK = 50
+
+_DURATION_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$', re.IGNORECASE)
+_DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_delay_seconds(value) -> Optional[int]:
+    """
+    Parses a timer delay such as 90, '90', '30s', '30m', '2h' or '1d' into seconds.
+    Returns None if the value is not a valid positive duration.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = value
+    else:
+        match = _DURATION_RE.match(str(value or ''))
+        if not match:
+            return None
+        seconds = float(match.group(1)) * _DURATION_UNITS[match.group(2).lower()]
+    seconds = int(seconds)
+    return seconds if seconds > 0 else None
+
+
+# --- Scheduling and cancellation ---
+def schedule_timer(
+    contact: Contact,
+    name: str,
+    delay_seconds: int,
+    flow: Optional[Flow] = None,
+    step: Optional[FlowStep] = None,
+    cancel_on_reply: bool = True,
+) -> FlowTimer:
+    """Schedules (or reschedules) the contact's timer called `name` to fire in `delay_seconds`."""
+    now = timezone.now()
+    timer, _ = FlowTimer.objects.update_or_create(
+        contact=contact,
+        name=name,
+        defaults={
+            'fire_at': now + timedelta(seconds=delay_seconds),
+            # Rescheduling restarts the timer: only replies after this point may cancel
+            # it (see the reply check in process_flow_timer_events_task).
+            'created_at': now,
+            'flow': flow,
+            'step': step,
+            'cancel_on_reply': cancel_on_reply,
+        },
+    )
+    logger.info(f"Contact {contact.id}: scheduled timer '{name}' to fire at {timer.fire_at.isoformat()}.")
+    return timer
+
+
+def cancel_timer(contact: Contact, name: str) -> int:
+    deleted, _ = FlowTimer.objects.filter(contact=contact, name=name).delete()
+    return deleted
+
+
+def cancel_timers_on_reply(contact: Contact) -> int:
+    """Cancels the contact's timers that are meant to be cancelled by any reply."""
+    deleted, _ = FlowTimer.objects.filter(contact=contact, cancel_on_reply=True).delete()
+    if deleted:
+        logger.info(f"Contact {contact.id}: cancelled {deleted} timer(s) after a reply.")
+    return deleted
+
+
+# --- Scheduler ---
+def _timer_event(timer: FlowTimer) -> dict:
+    return {
+        'contact_id': timer.contact_id,
+        'name': timer.name,
+        'flow_id': timer.flow_id,
+        'fire_at': timer.fire_at.isoformat(),
+        'created_at': timer.created_at.isoformat(),
+        'cancel_on_reply': timer.cancel_on_reply,
+    }
+
+
+def dispatch_due_timers(batch_size: int = 1000) -> int:
+    """
+    Claims up to `batch_size` due timers, removes them and hands them to the flow
+    engine as events. Rows are claimed with SKIP LOCKED so several schedulers can
+    run side by side, and the events go through the outbox in the same transaction
+    as the delete, so a due timer is never lost or fired twice.
+    """
+    # Local import to avoid a circular import with tasks.py
+    from .tasks import process_flow_timer_events_task
+
+    with transaction.atomic():
+        due = list(
+            FlowTimer.objects.select_for_update(skip_locked=True)
+            .filter(fire_at__lte=timezone.now())
+            .order_by('fire_at')[:batch_size]
+        )
+        if not due:
+            return 0
+        events = [_timer_event(timer) for timer in due]
+        FlowTimer.objects.filter(id__in=[timer.id for timer in due]).delete()
+        enqueue_tasks(
+            process_flow_timer_events_task,
+            [[events[i:i + TIMER_EVENTS_PER_TASK]] for i in range(0, len(events), TIMER_EVENTS_PER_TASK)]
+        )
+    logger.info(f"Dispatched {len(events)} due flow timer(s).")
+    return len(events)
+
+
+def seconds_until_next_timer() -> Optional[float]:
+    next_fire_at: Optional[datetime] = FlowTimer.objects.order_by('fire_at').values_list('fire_at', flat=True).first()
+    if next_fire_at is None:
+        return None
+    return max(0.0, (next_fire_at - timezone.now()).total_seconds())
@@ -0,0 +1,81 @@
+# whatsappcrm_backend/flows/unit_of_work.py
+
+import functools
+import logging
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from django.db import models
+
+logger = logging.getLogger(__name__)
+
+
+class FlowTurnUnitOfWork:
+    """
+    Collects field writes made while a flow turn runs and saves each instance
+    once at the end, with update_fields limited to the columns that changed.
+
+    Registration flows often run several update_contact_field /
+    update_member_profile actions in a row; saved one by one, every action would
+    fire the Contact/MemberProfile post_save handlers (stats, WebSocket pushes)
+    again. Within the turn the engine keeps working with the same in-memory
+    instances, so templates already see the new values.
+    """
+
+    def __init__(self):
+        self._pending = {}  # id(instance) -> (instance, set of field names)
+
+    def register(self, instance: models.Model, fields: Iterable[str]):
+        _, pending_fields = self._pending.setdefault(id(instance), (instance, set()))
+        pending_fields.update(fields)
+
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def flush(self):
+        pending, self._pending = self._pending, {}
+        for instance, fields in pending.values():
+            instance.save(update_fields=sorted(fields))
+            logger.debug(f"Flushed {instance._meta.label} {instance.pk} fields {sorted(fields)}.")
+
+
+_current_unit_of_work: ContextVar[Optional[FlowTurnUnitOfWork]] = ContextVar('flow_turn_unit_of_work', default=None)
+
+
+def save_fields(instance: models.Model, fields: Iterable[str]):
+    """
+    Saves `fields` of `instance`: deferred to the end of the current flow turn if
+    one is running, immediately otherwise.
+    """
+    unit_of_work = _current_unit_of_work.get()
+    if unit_of_work is None:
+        instance.save(update_fields=list(fields))
+    else:
+        unit_of_work.register(instance, fields)
+
+
+def flush_pending_writes():
+    """Saves the writes deferred so far, e.g. before an action that reads them back from the database."""
+    unit_of_work = _current_unit_of_work.get()
+    if unit_of_work is not None and unit_of_work.has_pending():
+        unit_of_work.flush()
+
+
+def flow_turn(func):
+    """
+    Runs `func` as one flow turn: field writes made through save_fields() are
+    flushed when it returns. Nested turns join the outermost one.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current_unit_of_work.get() is not None:
+            return func(*args, **kwargs)
+        unit_of_work = FlowTurnUnitOfWork()
+        token = _current_unit_of_work.set(unit_of_work)
+        try:
+            result = func(*args, **kwargs)
+            unit_of_work.flush()
+            return result
+        finally:
+            _current_unit_of_work.reset(token)
+    return wrapper
@@ -1,7 +1,8 @@
 # whatsappcrm_backend/meta_integration/admin.py
 
 from django.contrib import admin
-from .models import MetaAppConfig, WebhookEventLog
+from .models import MetaAppConfig, WebhookEventLog, MessageSendAttempt, DeadLetteredSend
+from .dead_letters import requeue_dead_letters
 
 @admin.register(MetaAppConfig)
 class MetaAppConfigAdmin(admin.ModelAdmin):
@@ -60,3 +61,37 @@ class WebhookEventLogAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         # Optimize query by prefetching related MetaAppConfig
         return super().get_queryset(request).select_related('app_config', 'message')
+
+
+@admin.register(MessageSendAttempt)
+class MessageSendAttemptAdmin(admin.ModelAdmin):
+    list_display = ('id', 'message', 'attempt_number', 'status', 'wamid', 'started_at', 'completed_at')
+    list_filter = ('status', 'started_at')
+    search_fields = ('wamid', 'idempotency_key', 'message__id', 'task_id')
+    readonly_fields = ('message', 'idempotency_key', 'attempt_number', 'task_id', 'status', 'wamid', 'error_details', 'started_at', 'completed_at')
+    list_select_related = ('message',)
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(DeadLetteredSend)
+class DeadLetteredSendAdmin(admin.ModelAdmin):
+    list_display = ('id', 'message', 'reason', 'error_code', 'attempts', 'dead_lettered_at', 'requeued_at', 'requeue_count')
+    list_filter = ('reason', 'error_code', ('requeued_at', admin.EmptyFieldListFilter), 'dead_lettered_at')
+    search_fields = ('message__id', 'message__contact__whatsapp_id')
+    readonly_fields = ('message', 'app_config', 'reason', 'error_code', 'error_details', 'attempts', 'dead_lettered_at', 'requeued_at', 'requeue_count')
+    list_select_related = ('message',)
+    actions = ['requeue_selected']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Requeue selected dead letters")
+    def requeue_selected(self, request, queryset):
+        result = requeue_dead_letters(queryset)
+        self.message_user(
+            request,
+            f"Requeued {result['requeued']} message(s); {result['resolved']} were already delivered; {result['skipped']} skipped; "
+            f"{result['abandoned_attempts']} send attempt(s) with unknown outcome abandoned."
+        )
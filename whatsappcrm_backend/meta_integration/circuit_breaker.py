@@ -0,0 +1,236 @@
+# whatsappcrm_backend/meta_integration/circuit_breaker.py
+
+import logging
+import time
+import uuid
+from typing import Optional
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a Graph API call is refused because the circuit breaker is open."""
+
+
+class GraphAPICircuitBreaker:
+    """
+    A circuit breaker shared by every web and worker process through Redis.
+
+    - closed: calls go through; outcomes are counted in short time buckets.
+    - open: once the error rate or the slow-call rate over the rolling window
+      crosses its threshold, calls are refused for `open_seconds`.
+    - half-open: after the cooldown a single probe call is let through. Success
+      closes the circuit, failure opens it again.
+
+    If Redis itself is unreachable the breaker lets calls through, so a Redis
+    outage never blocks sending on its own.
+    """
+    BUCKET_SECONDS = 10
+
+    def __init__(self, name: str = 'graph_api'):
+        self.name = name
+        self.window_seconds = getattr(settings, 'META_API_CIRCUIT_WINDOW_SECONDS', 60)
+        self.min_calls = getattr(settings, 'META_API_CIRCUIT_MIN_CALLS', 10)
+        self.error_rate_threshold = getattr(settings, 'META_API_CIRCUIT_ERROR_RATE', 0.5)
+        self.slow_call_seconds = getattr(settings, 'META_API_CIRCUIT_SLOW_CALL_SECONDS', 5.0)
+        self.slow_rate_threshold = getattr(settings, 'META_API_CIRCUIT_SLOW_RATE', 0.5)
+        self.open_seconds = getattr(settings, 'META_API_CIRCUIT_OPEN_SECONDS', 30)
+
+    # --- Redis keys ---
+    def _key(self, suffix: str) -> str:
+        return f"circuit:{self.name}:{suffix}"
+
+    @property
+    def _open_key(self):
+        # Present (with a TTL of open_seconds) while the circuit is open.
+        return self._key('open')
+
+    @property
+    def _tripped_key(self):
+        # Present from the moment the circuit opens until a probe succeeds.
+        return self._key('tripped')
+
+    @property
+    def _probe_key(self):
+        return self._key('probe')
+
+    def _bucket_keys(self, kind: str) -> list:
+        current = int(time.time()) // self.BUCKET_SECONDS
+        count = max(1, self.window_seconds // self.BUCKET_SECONDS)
+        return [self._key(f"{kind}:{current - i}") for i in range(count)]
+
+    def _redis(self):
+        return get_redis_connection("default")
+
+    # --- State ---
+    def state(self) -> str:
+        try:
+            redis_conn = self._redis()
+            is_open, is_tripped = redis_conn.exists(self._open_key), redis_conn.exists(self._tripped_key)
+        except Exception as e:
+            logger.warning(f"Circuit '{self.name}': could not read state from Redis, assuming closed. Error: {e}")
+            return 'closed'
+        if is_open:
+            return 'open'
+        return 'half_open' if is_tripped else 'closed'
+
+    def is_closed(self) -> bool:
+        return self.state() == 'closed'
+
+    def allow_request(self) -> bool:
+        """
+        Returns True if a call may be made now. In half-open state only one caller
+        at a time gets permission to probe.
+        """
+        current_state = self.state()
+        if current_state == 'closed':
+            return True
+        if current_state == 'open':
+            return False
+        try:
+            probe_timeout = int(self.slow_call_seconds * 4) or 1
+            return bool(self._redis().set(self._probe_key, 1, nx=True, ex=probe_timeout))
+        except Exception:
+            return True
+
+    # --- Outcomes ---
+    def record_success(self, latency: float):
+        is_slow = latency >= self.slow_call_seconds
+        self._record(failed=False, slow=is_slow)
+
+    def record_failure(self):
+        self._record(failed=True, slow=False)
+
+    def _record(self, failed: bool, slow: bool):
+        try:
+            redis_conn = self._redis()
+            if redis_conn.exists(self._open_key):
+                # A straggler that started before the circuit opened; it says nothing new.
+                return
+            if redis_conn.exists(self._tripped_key):
+                # Half-open: this outcome is the probe's.
+                if failed or slow:
+                    self._open(redis_conn, reason="half-open probe failed")
+                else:
+                    self._close(redis_conn)
+                return
+
+            pipe = redis_conn.pipeline()
+            current_calls, current_errors, current_slow = (
+                self._bucket_keys('calls')[0], self._bucket_keys('errors')[0], self._bucket_keys('slow')[0]
+            )
+            pipe.incr(current_calls)
+            pipe.expire(current_calls, self.window_seconds + self.BUCKET_SECONDS)
+            if failed:
+                pipe.incr(current_errors)
+                pipe.expire(current_errors, self.window_seconds + self.BUCKET_SECONDS)
+            if slow:
+                pipe.incr(current_slow)
+                pipe.expire(current_slow, self.window_seconds + self.BUCKET_SECONDS)
+            pipe.execute()
+
+            if failed or slow:
+                self._evaluate(redis_conn)
+        except Exception as e:
+            logger.warning(f"Circuit '{self.name}': could not record call outcome in Redis. Error: {e}")
+
+    def _evaluate(self, redis_conn):
+        def window_total(kind):
+            return sum(int(v) for v in redis_conn.mget(self._bucket_keys(kind)) if v)
+
+        calls = window_total('calls')
+        if calls < self.min_calls:
+            return
+        error_rate = window_total('errors') / calls
+        slow_rate = window_total('slow') / calls
+        if error_rate >= self.error_rate_threshold:
+            self._open(redis_conn, reason=f"error rate {error_rate:.0%} over {calls} calls")
+        elif slow_rate >= self.slow_rate_threshold:
+            self._open(redis_conn, reason=f"slow-call rate {slow_rate:.0%} over {calls} calls")
+
+    def _open(self, redis_conn, reason: str):
+        pipe = redis_conn.pipeline()
+        pipe.set(self._open_key, 1, ex=self.open_seconds)
+        pipe.set(self._tripped_key, 1, ex=max(3600, self.open_seconds * 10))
+        pipe.delete(self._probe_key)
+        pipe.execute()
+        logger.error(f"Circuit '{self.name}' OPENED for {self.open_seconds}s: {reason}.")
+
+    def _close(self, redis_conn):
+        keys = [self._open_key, self._tripped_key, self._probe_key]
+        for kind in ('calls', 'errors', 'slow'):
+            keys.extend(self._bucket_keys(kind))
+        redis_conn.delete(*keys)
+        logger.warning(f"Circuit '{self.name}' CLOSED after a successful probe. Draining parked messages.")
+        # Local import to avoid a circular import with tasks.py
+        from .tasks import drain_parked_messages_task
+        drain_parked_messages_task.delay()
+
+    # --- Parked messages ---
+    # Outbound messages that could not be sent while the circuit was open. They keep
+    # their 'pending_dispatch' status in the DB; this sorted set (scored by message id)
+    # remembers them, with the lane they were sent on, so they can be re-dispatched in
+    # their original order and lane.
+    @property
+    def _parked_key(self):
+        return self._key('parked')
+
+    def park_message(self, message_id: int, config_id: int, queue: Optional[str] = None):
+        member = f"{message_id}:{config_id}:{queue}" if queue else f"{message_id}:{config_id}"
+        self._redis().zadd(self._parked_key, {member: message_id})
+
+    def pop_parked_messages(self, count: int) -> list:
+        """
+        Removes and returns up to `count` (message_id, config_id, queue) tuples, oldest
+        first. `queue` is None for messages parked without one (default routing applies).
+        """
+        popped = self._redis().zpopmin(self._parked_key, count)
+        parked = []
+        for member, _score in popped:
+            message_id, config_id, *queue = member.decode().split(':', 2)
+            parked.append((int(message_id), int(config_id), queue[0] if queue else None))
+        return parked
+
+    def parked_message_ids(self) -> list:
+        try:
+            return [int(member.decode().split(':')[0]) for member in self._redis().zrange(self._parked_key, 0, -1)]
+        except Exception:
+            return []
+
+    def parked_count(self) -> int:
+        try:
+            return self._redis().zcard(self._parked_key)
+        except Exception:
+            return 0
+
+    # --- Drain lock ---
+    # Only one drain chain runs at a time. Each link hands its token to the next one,
+    # which renews the lock; beat runs and close triggers back off while it is held.
+    # The lock of a chain that died expires on its own.
+    DRAIN_LOCK_SECONDS = 60
+
+    @property
+    def _drain_lock_key(self):
+        return self._key('drain_lock')
+
+    def claim_drain(self, token: Optional[str] = None) -> Optional[str]:
+        """Returns the token of the drain this run may continue or start, or None if another run owns it."""
+        redis_conn = self._redis()
+        if token and redis_conn.get(self._drain_lock_key) == token.encode():
+            redis_conn.expire(self._drain_lock_key, self.DRAIN_LOCK_SECONDS)
+            return token
+        token = uuid.uuid4().hex
+        if redis_conn.set(self._drain_lock_key, token, nx=True, ex=self.DRAIN_LOCK_SECONDS):
+            return token
+        return None
+
+    def release_drain(self, token: str):
+        redis_conn = self._redis()
+        if redis_conn.get(self._drain_lock_key) == token.encode():
+            redis_conn.delete(self._drain_lock_key)
+
+
+graph_api_breaker = GraphAPICircuitBreaker()
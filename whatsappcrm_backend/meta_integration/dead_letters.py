@@ -0,0 +1,155 @@
+# whatsappcrm_backend/meta_integration/dead_letters.py
+
+import logging
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from conversations.models import Message, update_message_error_details
+from outbox.services import enqueue_tasks
+from .models import DeadLetteredSend, MessageSendAttempt, MetaAppConfig
+from .retry_policy import extract_error_code
+
+logger = logging.getLogger(__name__)
+
+
+def dead_letter_message(
+    message: Message,
+    reason: str,
+    error_details: Optional[dict] = None,
+    config_id: Optional[int] = None,
+    attempts: int = 0,
+) -> DeadLetteredSend:
+    """
+    Puts `message` in the dead-letter store. A message that was requeued and
+    failed again reuses its existing entry, which returns to the queue.
+    """
+    entry, _ = DeadLetteredSend.objects.update_or_create(
+        message=message,
+        defaults={
+            'app_config_id': config_id or message.app_config_id,
+            'reason': reason,
+            'error_code': extract_error_code(error_details),
+            'error_details': error_details,
+            'attempts': attempts,
+            'dead_lettered_at': timezone.now(),
+            'requeued_at': None,
+        },
+    )
+    logger.warning(f"Message {message.id} dead-lettered ({reason}, error code {entry.error_code}).")
+    return entry
+
+
+def dead_letter_messages(messages: Iterable[Message], reason: str, error_details: Optional[dict] = None) -> int:
+    """
+    Bulk variant of `dead_letter_message` for messages failed outside the send task
+    (e.g. by fail_stuck_messages). Marks them 'failed' and upserts their entries.
+    """
+    messages = list(messages)
+    if not messages:
+        return 0
+    now = timezone.now()
+    with transaction.atomic():
+        message_ids = [m.id for m in messages]
+        Message.objects.filter(id__in=message_ids).update(status='failed', status_timestamp=now)
+        update_message_error_details(message_ids, error_details)
+        DeadLetteredSend.objects.bulk_create(
+            [
+                DeadLetteredSend(
+                    message_id=m.id, app_config_id=m.app_config_id, reason=reason,
+                    error_code=extract_error_code(error_details), error_details=error_details,
+                    dead_lettered_at=now,
+                )
+                for m in messages
+            ],
+            update_conflicts=True,
+            unique_fields=['message'],
+            update_fields=['app_config', 'reason', 'error_code', 'error_details', 'dead_lettered_at', 'requeued_at'],
+        )
+    logger.warning(f"Dead-lettered {len(messages)} message(s) ({reason}).")
+    return len(messages)
+
+
+def requeue_dead_letters(queryset) -> dict:
+    """
+    Requeues the dead-letter entries in `queryset` that are still waiting.
+
+    Their messages go back to 'pending_dispatch' and are dispatched again (oldest
+    first, through the outbox) with a fresh retry budget. Entries whose message
+    picked up a wamid in the meantime (reconciled from a status webhook) were
+    delivered after all and are removed instead.
+
+    Requeuing is the operator's decision to resend: send attempts whose outcome is
+    still unknown (the worker died mid-send or got no response) are marked
+    'abandoned', otherwise the send ledger would refuse the message again.
+
+    Returns {'requeued': n, 'resolved': n, 'skipped': n, 'abandoned_attempts': n}.
+    """
+    # Local import to avoid a circular import with tasks.py
+    from .tasks import send_whatsapp_message_task
+
+    result = {'requeued': 0, 'resolved': 0, 'skipped': 0, 'abandoned_attempts': 0}
+    active_config, active_config_loaded = None, False
+    now = timezone.now()
+
+    with transaction.atomic():
+        entries = list(
+            queryset.filter(requeued_at__isnull=True)
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('message')
+            .order_by('message_id')
+        )
+        if not entries:
+            return result
+
+        resolved_ids = [entry.id for entry in entries if entry.message.wamid]
+        if resolved_ids:
+            DeadLetteredSend.objects.filter(id__in=resolved_ids).delete()
+            result['resolved'] = len(resolved_ids)
+
+        dispatch_args, requeued_ids = [], []
+        for entry in entries:
+            if entry.message.wamid:
+                continue
+            config_id = entry.app_config_id or entry.message.app_config_id
+            if not config_id:
+                if not active_config_loaded:
+                    # No (or more than one) active config: these entries are counted as skipped.
+                    try:
+                        active_config = MetaAppConfig.objects.get_active_config()
+                    except (MetaAppConfig.DoesNotExist, MetaAppConfig.MultipleObjectsReturned):
+                        active_config = None
+                    active_config_loaded = True
+                config_id = active_config.id if active_config else None
+            if not config_id:
+                result['skipped'] += 1
+                continue
+            dispatch_args.append([entry.message_id, config_id])
+            requeued_ids.append(entry.id)
+
+        if requeued_ids:
+            message_ids = [message_id for message_id, _ in dispatch_args]
+            Message.objects.filter(id__in=message_ids).update(status='pending_dispatch', status_timestamp=now)
+            update_message_error_details(message_ids, None)
+            result['abandoned_attempts'] = MessageSendAttempt.objects.filter(
+                message_id__in=message_ids, status__in=('in_flight', 'unknown')
+            ).update(status='abandoned', completed_at=now)
+            DeadLetteredSend.objects.filter(id__in=requeued_ids).update(
+                requeued_at=now, requeue_count=F('requeue_count') + 1
+            )
+            # Bulk requeues can be large; keep them out of the conversational lane.
+            enqueue_tasks(send_whatsapp_message_task, dispatch_args, queue=settings.QUEUE_BULK_SENDS)
+            result['requeued'] = len(requeued_ids)
+
+    if result['skipped']:
+        logger.error(f"Could not requeue {result['skipped']} dead letter(s): no MetaAppConfig available.")
+    if result['abandoned_attempts']:
+        logger.warning(
+            f"Abandoned {result['abandoned_attempts']} send attempt(s) with unknown outcome on requeue; "
+            f"those messages may reach the contact twice."
+        )
+    logger.info(f"Requeued {result['requeued']} dead-lettered message(s), {result['resolved']} already delivered.")
+    return result
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Cast, Concat
+
+
+def fill_missing_event_identifiers(apps, schema_editor):
+    # event_identifier becomes NOT NULL; older rows logged without one get a placeholder.
+    WebhookEventLog = apps.get_model('meta_integration', 'WebhookEventLog')
+    WebhookEventLog.objects.filter(event_identifier__isnull=True).update(
+        event_identifier=Concat(models.Value('legacy-'), Cast('id', models.CharField()))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0005_inbox_broadcasts_archive_and_search_indexes'),
+        ('meta_integration', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metaappconfig',
+            name='app_secret',
+            field=models.CharField(blank=True, help_text='The App Secret from the Meta App Dashboard, used for verifying webhook signature. Recommended.', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookeventlog',
+            name='message',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='The Message object created from this event, if applicable.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='webhook_logs', to='conversations.message'),
+        ),
+        migrations.RunPython(fill_missing_event_identifiers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='webhookeventlog',
+            name='event_identifier',
+            field=models.CharField(db_index=True, help_text='A unique identifier for the event (e.g., the top-level ID from the webhook entry).', max_length=255),
+        ),
+        migrations.CreateModel(
+            name='DeadLetteredSend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('permanent_error', 'Permanent API Error'), ('retries_exhausted', 'Retries Exhausted'), ('sequencing_timeout', 'Blocked by Preceding Message'), ('stuck', 'Stuck in Pending Dispatch')], db_index=True, max_length=30)),
+                ('error_code', models.IntegerField(blank=True, db_index=True, help_text='Meta error code, when the API returned one.', null=True)),
+                ('error_details', models.JSONField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Task executions made before the message was dead-lettered.')),
+                ('dead_lettered_at', models.DateTimeField(db_index=True)),
+                ('requeued_at', models.DateTimeField(blank=True, db_index=True, help_text='Set when the message is requeued; cleared if it dead-letters again.', null=True)),
+                ('requeue_count', models.PositiveIntegerField(default=0)),
+                ('app_config', models.ForeignKey(blank=True, help_text='Config the message was being sent with; used when requeueing.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='meta_integration.metaappconfig')),
+                ('message', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='dead_letter', to='conversations.message')),
+            ],
+            options={
+                'verbose_name': 'Dead-Lettered Send',
+                'verbose_name_plural': 'Dead-Lettered Sends',
+                'ordering': ['-dead_lettered_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MessageSendAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.UUIDField(db_index=True, help_text='Copy of Message.idempotency_key at the time of the attempt.')),
+                ('attempt_number', models.PositiveIntegerField(default=1)),
+                ('task_id', models.CharField(blank=True, help_text='Celery task id that made the attempt.', max_length=255, null=True)),
+                ('status', models.CharField(choices=[('in_flight', 'In Flight'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('unknown', 'Outcome Unknown'), ('abandoned', 'Abandoned on Requeue')], db_index=True, default='in_flight', max_length=20)),
+                ('wamid', models.CharField(blank=True, help_text='WAMID returned by Meta or reconciled from a webhook.', max_length=255, null=True)),
+                ('error_details', models.JSONField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('message', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='send_attempts', to='conversations.message')),
+            ],
+            options={
+                'verbose_name': 'Message Send Attempt',
+                'verbose_name_plural': 'Message Send Attempts',
+                'ordering': ['message', 'attempt_number'],
+                'unique_together': {('message', 'attempt_number')},
+            },
+        ),
+    ]
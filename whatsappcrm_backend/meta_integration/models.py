@@ -99,11 +99,12 @@ class WebhookEventLog(models.Model):
         ('unknown', 'Unknown Event Type'),
     ]
 
-    # --- THIS IS THE CORRECTED FIELD ---
-    # The unique=True constraint is the critical fix.
+    # Retries from Meta are matched on this with update_or_create. It is indexed rather
+    # than unique because a partitioned table (conversations.partitioning) can only enforce
+    # uniqueness together with received_at; cleanup_logs removes any duplicates.
     event_identifier = models.CharField(
-        max_length=255, 
-        unique=True, 
+        max_length=255,
+        db_index=True,
         help_text="A unique identifier for the event (e.g., the top-level ID from the webhook entry)."
     )
 
@@ -119,6 +120,7 @@ class WebhookEventLog(models.Model):
         on_delete=models.SET_NULL,
         null=True, blank=True,
         related_name='webhook_logs',
+        db_constraint=False,
         help_text="The Message object created from this event, if applicable."
     )
     waba_id_received = models.CharField(max_length=50, blank=True, null=True, help_text="WABA ID from the webhook payload.")
@@ -153,3 +155,92 @@ class WebhookEventLog(models.Model):
             models.Index(fields=['event_type', 'received_at']),
             models.Index(fields=['processing_status', 'event_type']),
         ]
+
+
+
+class MessageSendAttempt(models.Model):
+    """
+    Ledger of every attempt to hand an outgoing Message to the Meta API.
+
+    An attempt is written as 'in_flight' before the API call and resolved
+    afterwards. An attempt still 'in_flight' when the message is picked up again
+    means the previous worker died mid-send: the outcome is unknown, so the
+    message is not sent again and waits for a status webhook to reconcile it.
+    Requeuing its dead letter is an operator's decision to resend anyway, which
+    marks such attempts 'abandoned'.
+    """
+    STATUS_CHOICES = [
+        ('in_flight', 'In Flight'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('unknown', 'Outcome Unknown'),
+        ('abandoned', 'Abandoned on Requeue'),
+    ]
+
+    message = models.ForeignKey(
+        'conversations.Message',
+        on_delete=models.CASCADE,
+        related_name='send_attempts',
+        db_constraint=False,
+    )
+    idempotency_key = models.UUIDField(db_index=True, help_text="Copy of Message.idempotency_key at the time of the attempt.")
+    attempt_number = models.PositiveIntegerField(default=1)
+    task_id = models.CharField(max_length=255, blank=True, null=True, help_text="Celery task id that made the attempt.")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_flight', db_index=True)
+    wamid = models.CharField(max_length=255, blank=True, null=True, help_text="WAMID returned by Meta or reconciled from a webhook.")
+    error_details = models.JSONField(null=True, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Send attempt #{self.attempt_number} for Message {self.message_id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Message Send Attempt"
+        verbose_name_plural = "Message Send Attempts"
+        ordering = ['message', 'attempt_number']
+        unique_together = ('message', 'attempt_number')
+
+
+class DeadLetteredSend(models.Model):
+    """
+    Dead-letter store for outgoing messages that could not be delivered to Meta:
+    permanent API errors, exhausted retries, or messages found stuck in
+    'pending_dispatch'. The message itself is marked 'failed'; an entry stays in
+    the queue until it is requeued, which puts the message back in 'pending_dispatch'
+    and dispatches it again.
+    """
+    REASON_CHOICES = [
+        ('permanent_error', 'Permanent API Error'),
+        ('retries_exhausted', 'Retries Exhausted'),
+        ('sequencing_timeout', 'Blocked by Preceding Message'),
+        ('stuck', 'Stuck in Pending Dispatch'),
+    ]
+
+    message = models.OneToOneField(
+        'conversations.Message',
+        on_delete=models.CASCADE,
+        related_name='dead_letter',
+        db_constraint=False,
+    )
+    app_config = models.ForeignKey(
+        MetaAppConfig,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        help_text="Config the message was being sent with; used when requeueing."
+    )
+    reason = models.CharField(max_length=30, choices=REASON_CHOICES, db_index=True)
+    error_code = models.IntegerField(null=True, blank=True, db_index=True, help_text="Meta error code, when the API returned one.")
+    error_details = models.JSONField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0, help_text="Task executions made before the message was dead-lettered.")
+    dead_lettered_at = models.DateTimeField(db_index=True)
+    requeued_at = models.DateTimeField(null=True, blank=True, db_index=True, help_text="Set when the message is requeued; cleared if it dead-letters again.")
+    requeue_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Dead letter for Message {self.message_id} ({self.reason})"
+
+    class Meta:
+        verbose_name = "Dead-Lettered Send"
+        verbose_name_plural = "Dead-Lettered Sends"
+        ordering = ['-dead_lettered_at']
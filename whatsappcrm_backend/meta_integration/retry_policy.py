@@ -0,0 +1,101 @@
+# whatsappcrm_backend/meta_integration/retry_policy.py
+
+import logging
+import random
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# --- Meta Cloud API error classification ---
+# Errors that will fail the same way no matter how often the send is repeated.
+# Retrying them only delays the dead-letter and wastes rate limit.
+PERMANENT_ERROR_CODES = {
+    10,      # Permission denied
+    100,     # Invalid parameter
+    190,     # Access token expired or invalid
+    200,     # Permission error
+    131008,  # Required parameter is missing
+    131009,  # Parameter value is not valid
+    131021,  # Recipient cannot be sender
+    131026,  # Message undeliverable (not a WhatsApp user, old app version, ...)
+    131031,  # Business account locked
+    131047,  # Re-engagement message: outside the 24 hour customer service window
+    131051,  # Unsupported message type
+    132000,  # Template parameter count mismatch
+    132001,  # Template does not exist
+    132005,  # Template hydrated text too long
+    132007,  # Template format character policy violated
+    132012,  # Template parameter format mismatch
+    132015,  # Template is paused
+    132016,  # Template is disabled
+    133010,  # Phone number not registered
+    470,     # Re-engagement message (legacy code)
+}
+
+# Errors Meta documents as temporary: throttling and service availability.
+TRANSIENT_ERROR_CODES = {
+    1,       # API unknown
+    2,       # API service temporarily unavailable
+    4,       # Application request limit reached
+    80007,   # WABA rate limit hit
+    130429,  # Cloud API throughput reached
+    131000,  # Something went wrong
+    131016,  # Service unavailable
+    131048,  # Spam rate limit hit
+    131056,  # Too many messages to the same recipient (pair rate limit)
+    133004,  # Server temporarily unavailable
+}
+
+PERMANENT = 'permanent'
+TRANSIENT = 'transient'
+
+# --- Backoff ---
+SEND_RETRY_BASE_SECONDS = getattr(settings, 'META_SEND_RETRY_BASE_SECONDS', 5)
+SEND_RETRY_MAX_SECONDS = getattr(settings, 'META_SEND_RETRY_MAX_SECONDS', 600)
+
+
+def extract_error_code(error_details: Optional[dict]) -> Optional[int]:
+    """Pulls Meta's numeric error code out of a Graph API error body, if there is one."""
+    if not isinstance(error_details, dict):
+        return None
+    error = error_details.get('error')
+    if isinstance(error, dict) and error.get('code') is not None:
+        try:
+            return int(error['code'])
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def classify_send_error(error_details: Optional[dict]) -> str:
+    """
+    Classifies a failed send as PERMANENT or TRANSIENT.
+
+    Known Meta error codes decide first. Otherwise 429 and 5xx responses are
+    transient and any other 4xx is treated as a problem with the request itself.
+    Errors without an HTTP response (timeouts, connection errors, unexpected
+    exceptions) are assumed transient.
+    """
+    code = extract_error_code(error_details)
+    if code in PERMANENT_ERROR_CODES:
+        return PERMANENT
+    if code in TRANSIENT_ERROR_CODES:
+        return TRANSIENT
+
+    http_status = error_details.get('http_status') if isinstance(error_details, dict) else None
+    if isinstance(http_status, int) and 400 <= http_status < 500 and http_status != 429:
+        return PERMANENT
+    return TRANSIENT
+
+
+def backoff_delay(retries: int) -> int:
+    """
+    Exponential backoff with full jitter: a random delay between 0 and
+    min(cap, base * 2**retries) seconds, never less than one second. The jitter
+    spreads out retries of messages that failed together so they don't hit Meta
+    again in lockstep.
+    """
+    ceiling = min(SEND_RETRY_MAX_SECONDS, SEND_RETRY_BASE_SECONDS * (2 ** max(0, retries)))
+    return max(1, int(random.uniform(0, ceiling)))
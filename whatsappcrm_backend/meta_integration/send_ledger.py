@@ -0,0 +1,135 @@
+# whatsappcrm_backend/meta_integration/send_ledger.py
+
+import logging
+from typing import Optional
+
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from conversations.models import Message
+from .models import MessageSendAttempt
+
+logger = logging.getLogger(__name__)
+
+# Held while a worker is talking to Meta about a message. Must outlive the
+# longest possible API call (connect + read timeout).
+SEND_LOCK_KEY = "send_lock:{idempotency_key}"
+SEND_LOCK_TTL_SECONDS = 120
+
+
+def acquire_send_lock(idempotency_key) -> bool:
+    """
+    SETNX guard so only one worker at a time can send a given message.
+    If Redis is unavailable the DB ledger alone still prevents double sends.
+    """
+    try:
+        return bool(get_redis_connection("default").set(
+            SEND_LOCK_KEY.format(idempotency_key=idempotency_key), 1, nx=True, ex=SEND_LOCK_TTL_SECONDS
+        ))
+    except Exception as e:
+        logger.warning(f"Could not take send lock for {idempotency_key}, relying on the DB ledger. Error: {e}")
+        return True
+
+
+def release_send_lock(idempotency_key):
+    try:
+        get_redis_connection("default").delete(SEND_LOCK_KEY.format(idempotency_key=idempotency_key))
+    except Exception as e:
+        logger.warning(f"Could not release send lock for {idempotency_key}. It will expire on its own. Error: {e}")
+
+
+def begin_send_attempt(message: Message, task_id: Optional[str] = None) -> Optional[MessageSendAttempt]:
+    """
+    Records a new 'in_flight' attempt for `message` and returns it, or returns None
+    if the message must not be handed to Meta again: either an earlier attempt
+    succeeded, or an earlier attempt never finished (the worker died mid-send) so
+    Meta may already have the message.
+    """
+    with transaction.atomic():
+        # Lock the message row so concurrent workers serialize on the ledger check.
+        Message.objects.select_for_update().filter(pk=message.pk).first()
+        previous_attempts = list(MessageSendAttempt.objects.filter(message=message).order_by('attempt_number'))
+
+        succeeded = next((attempt for attempt in previous_attempts if attempt.status == 'succeeded'), None)
+        if succeeded:
+            logger.info(f"Message {message.id} already has a successful send attempt. Not sending again.")
+            if succeeded.wamid and not message.wamid:
+                # The worker died between the API call and saving the message; finish its job.
+                message.wamid = succeeded.wamid
+                message.status = 'sent'
+                message.error_details = None
+                message.status_timestamp = succeeded.completed_at or timezone.now()
+                message.save(update_fields=['wamid', 'status', 'error_details', 'status_timestamp'])
+            return None
+
+        unresolved = [attempt for attempt in previous_attempts if attempt.status in ('in_flight', 'unknown')]
+        if unresolved:
+            MessageSendAttempt.objects.filter(
+                pk__in=[attempt.pk for attempt in unresolved], status='in_flight'
+            ).update(status='unknown', completed_at=timezone.now())
+            logger.warning(
+                f"Message {message.id} has an unfinished send attempt; Meta may already have it. "
+                f"Not sending again, waiting for a status webhook to reconcile."
+            )
+            return None
+
+        return MessageSendAttempt.objects.create(
+            message=message,
+            idempotency_key=message.idempotency_key,
+            attempt_number=len(previous_attempts) + 1,
+            task_id=task_id,
+        )
+
+
+def complete_send_attempt(attempt: MessageSendAttempt, wamid: Optional[str] = None, error_details: Optional[dict] = None,
+                          outcome_unknown: bool = False):
+    """
+    Resolves an in-flight attempt as succeeded (with its wamid), failed (Meta
+    definitely did not take it), or unknown (the request may have reached Meta but
+    no response came back). Unknown attempts block further sends of the message
+    until a status webhook or an operator resolves them.
+    """
+    if wamid:
+        attempt.status = 'succeeded'
+    else:
+        attempt.status = 'unknown' if outcome_unknown else 'failed'
+    attempt.wamid = wamid
+    attempt.error_details = error_details
+    attempt.completed_at = timezone.now()
+    attempt.save(update_fields=['status', 'wamid', 'error_details', 'completed_at'])
+
+
+def find_message_for_status(wamid: str, status_data: dict) -> Optional[Message]:
+    """
+    Finds the outgoing Message a status webhook refers to. Falls back to the
+    idempotency key echoed in `biz_opaque_callback_data` for messages whose wamid
+    was never saved (the sending worker died after Meta accepted the message),
+    and records the late wamid on the message and its ledger.
+    """
+    message = Message.objects.filter(wamid=wamid, direction='out').first()
+    if message:
+        return message
+
+    idempotency_key = status_data.get('biz_opaque_callback_data')
+    if not idempotency_key:
+        return None
+    try:
+        message = Message.objects.filter(idempotency_key=idempotency_key, direction='out').first()
+    except Exception:
+        # Not one of our keys (e.g. not a UUID).
+        return None
+    if not message:
+        return None
+
+    logger.warning(f"Reconciled late WAMID {wamid} to Message {message.id} via its idempotency key.")
+    message.wamid = wamid
+    message.error_details = None
+    message.save(update_fields=['wamid', 'error_details'])
+    latest = MessageSendAttempt.objects.filter(message=message).order_by('-attempt_number').first()
+    if latest and latest.status != 'succeeded':
+        latest.status = 'succeeded'
+        latest.wamid = wamid
+        latest.completed_at = latest.completed_at or timezone.now()
+        latest.save(update_fields=['status', 'wamid', 'completed_at'])
+    return message
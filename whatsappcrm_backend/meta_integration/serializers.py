@@ -1,7 +1,7 @@
 # whatsappcrm_backend/meta_integration/serializers.py
 
 from rest_framework import serializers
-from .models import MetaAppConfig, WebhookEventLog
+from .models import MetaAppConfig, WebhookEventLog, DeadLetteredSend
 
 class MetaAppConfigSerializer(serializers.ModelSerializer):
     """
@@ -120,3 +120,36 @@ class WebhookEventLogListSerializer(WebhookEventLogSerializer):
             field for field in WebhookEventLogSerializer.Meta.fields if field != 'payload'
         ]
         read_only_fields = fields
+
+
+class DeadLetteredSendSerializer(serializers.ModelSerializer):
+    """Read-only view of a dead-lettered outgoing message for inspection."""
+    reason_display = serializers.CharField(source='get_reason_display', read_only=True)
+    contact_id = serializers.IntegerField(source='message.contact_id', read_only=True)
+    contact_whatsapp_id = serializers.CharField(source='message.contact.whatsapp_id', read_only=True)
+    message_type = serializers.CharField(source='message.message_type', read_only=True)
+    message_status = serializers.CharField(source='message.status', read_only=True)
+
+    class Meta:
+        model = DeadLetteredSend
+        fields = [
+            'id', 'message', 'contact_id', 'contact_whatsapp_id', 'message_type', 'message_status',
+            'app_config', 'reason', 'reason_display', 'error_code', 'error_details', 'attempts',
+            'dead_lettered_at', 'requeued_at', 'requeue_count',
+        ]
+        read_only_fields = fields
+
+
+class DeadLetterRequeueSerializer(serializers.Serializer):
+    """
+    Selects dead letters to requeue in bulk: either explicit ids, or every waiting
+    entry matching the reason/error_code filters.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    reason = serializers.ChoiceField(choices=DeadLetteredSend.REASON_CHOICES, required=False)
+    error_code = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("Provide 'ids' or at least one of 'reason' / 'error_code'.")
+        return attrs
@@ -1,18 +1,42 @@
 # whatsappcrm_backend/meta_integration/tasks.py
 
 import logging
-from celery import shared_task
+from celery import shared_task, chain
 from django.utils import timezone
 from django.db.models import Q
 from datetime import timedelta
 
 from .utils import send_whatsapp_message, send_read_receipt_api
+from .circuit_breaker import graph_api_breaker, CircuitOpenError
+from .send_ledger import acquire_send_lock, release_send_lock, begin_send_attempt, complete_send_attempt
+from .retry_policy import classify_send_error, backoff_delay, PERMANENT
+from .dead_letters import dead_letter_message
 from .models import MetaAppConfig
 from .signals import message_send_failed
 from conversations.models import Message, Contact # To update message status
 
 logger = logging.getLogger(__name__)
 
+class MetaSendError(Exception):
+    """A send that Meta rejected or could not be attempted; carries the error details to store."""
+    def __init__(self, error_details: dict, permanent: bool = False):
+        super().__init__(str(error_details))
+        self.error_details = error_details
+        self.permanent = permanent
+
+
+def _dead_letter_failed_send(task, outgoing_msg: Message, reason: str, config_id: int):
+    """Saves the final 'failed' state, moves the message to the dead-letter store and notifies listeners."""
+    outgoing_msg.status = 'failed'
+    outgoing_msg.status_timestamp = timezone.now()
+    outgoing_msg.save(update_fields=['status', 'error_details', 'status_timestamp'])
+    dead_letter_message(
+        outgoing_msg, reason, error_details=outgoing_msg.error_details,
+        config_id=config_id, attempts=task.request.retries + 1
+    )
+    message_send_failed.send(sender=task.__class__, message_instance=outgoing_msg)
+
+
 @shared_task(bind=True, max_retries=10, default_retry_delay=3) # bind=True gives access to self, retry settings
 def send_whatsapp_message_task(self, outgoing_message_id: int, active_config_id: int):
     """
@@ -24,7 +48,7 @@ def send_whatsapp_message_task(self, outgoing_message_id: int, active_config_id:
         active_config_id (int): The ID of the active MetaAppConfig to use for sending.
     """
     try:
-        outgoing_msg = Message.objects.select_related('contact').get(pk=outgoing_message_id)
+        outgoing_msg = Message.objects.select_related('contact', 'payload').get(pk=outgoing_message_id)
         active_config = MetaAppConfig.objects.get(pk=active_config_id)
     except Message.DoesNotExist:
         # --- FIX for race condition ---
@@ -47,9 +71,9 @@ def send_whatsapp_message_task(self, outgoing_message_id: int, active_config_id:
         logger.warning(f"send_whatsapp_message_task: Message ID {outgoing_message_id} is not an outgoing message. Skipping.")
         return
 
-    # Avoid resending if already sent successfully or in a final failed state without retries
-    if outgoing_msg.wamid and outgoing_msg.status == 'sent':
-        logger.info(f"send_whatsapp_message_task: Message ID {outgoing_message_id} (WAMID: {outgoing_msg.wamid}) already marked as sent. Skipping.")
+    # Avoid resending if already handed to Meta (any status with a wamid) or in a final failed state without retries
+    if outgoing_msg.wamid:
+        logger.info(f"send_whatsapp_message_task: Message ID {outgoing_message_id} (WAMID: {outgoing_msg.wamid}) already sent (status '{outgoing_msg.status}'). Skipping.")
         return
     if outgoing_msg.status == 'failed' and self.request.retries >= self.max_retries:
          logger.warning(f"send_whatsapp_message_task: Message ID {outgoing_message_id} already failed and max retries reached. Skipping.")
@@ -91,57 +115,107 @@ def send_whatsapp_message_task(self, outgoing_message_id: int, active_config_id:
         try:
             raise self.retry() # Uses the task's default_retry_delay
         except self.MaxRetriesExceededError:
-            logger.error(f"Max retries exceeded for message {outgoing_message_id} while waiting. Marking as failed.")
-            outgoing_msg.status = 'failed'
+            logger.error(f"Max retries exceeded for message {outgoing_message_id} while waiting. Dead-lettering.")
             outgoing_msg.error_details = {'error': 'Max retries exceeded while waiting for preceding message.'}
-            outgoing_msg.status_timestamp = timezone.now()
-            outgoing_msg.save(update_fields=['status', 'error_details', 'status_timestamp'])
-            message_send_failed.send(sender=self.__class__, message_instance=outgoing_msg)
+            _dead_letter_failed_send(self, outgoing_msg, 'sequencing_timeout', active_config.id)
             return
 
     logger.info(f"Task send_whatsapp_message_task started for Message ID: {outgoing_message_id}, Contact: {outgoing_msg.contact.whatsapp_id}")
 
+    # --- Idempotency guard ---
+    # The Redis lock keeps concurrent deliveries of this task apart; the DB ledger makes sure a
+    # message is handed to Meta at most once, even if a worker died right after a successful call.
+    if not acquire_send_lock(outgoing_msg.idempotency_key):
+        logger.warning(f"send_whatsapp_message_task: Message ID {outgoing_message_id} is being sent by another worker. Skipping.")
+        return
+
+    send_attempt = None
     try:
+        send_attempt = begin_send_attempt(outgoing_msg, self.request.id)
+        if send_attempt is None:
+            return
+
         # content_payload should contain the 'data' part for send_whatsapp_message
         # and message_type should be the Meta API message type
         if not isinstance(outgoing_msg.content_payload, dict):
-            raise ValueError("Message content_payload is not a valid dictionary for sending.")
+            raise MetaSendError({'error': 'Message content_payload is not a valid dictionary for sending.'}, permanent=True)
 
         api_response = send_whatsapp_message(
             to_phone_number=outgoing_msg.contact.whatsapp_id,
             message_type=outgoing_msg.message_type, # This should be 'text', 'template', 'interactive'
             data=outgoing_msg.content_payload, # This is the actual data for the type
-            config=active_config
+            config=active_config,
+            # Echoed back in status webhooks so a late wamid can be matched to this message.
+            biz_opaque_callback_data=str(outgoing_msg.idempotency_key)
         )
 
         if api_response and api_response.get('messages') and api_response['messages'][0].get('id'):
             outgoing_msg.wamid = api_response['messages'][0]['id']
             outgoing_msg.status = 'sent' # Successfully handed off to Meta
             outgoing_msg.error_details = None # Clear previous errors if any
+            complete_send_attempt(send_attempt, wamid=outgoing_msg.wamid)
             logger.info(f"Message ID {outgoing_message_id} sent successfully via Meta API. WAMID: {outgoing_msg.wamid}")
+        elif api_response and api_response.get('outcome_unknown'):
+            # Meta may have accepted the message without us seeing the response. Retrying
+            # could deliver it twice, so the attempt stays 'unknown' until a status webhook
+            # reconciles it via biz_opaque_callback_data, or an operator requeues it.
+            complete_send_attempt(send_attempt, error_details=api_response, outcome_unknown=True)
+            outgoing_msg.error_details = api_response
+            outgoing_msg.status_timestamp = timezone.now()
+            outgoing_msg.save(update_fields=['error_details', 'status_timestamp'])
+            logger.warning(f"Outcome of sending Message ID {outgoing_message_id} is unknown. Not retrying; waiting for a status webhook.")
+            return
         else:
             # Handle failure from Meta API
             error_info = api_response or {'error': 'Meta API call failed or returned unexpected response.'}
             logger.error(f"Failed to send Message ID {outgoing_message_id} via Meta API. Response: {error_info}")
-            outgoing_msg.status = 'failed'
-            outgoing_msg.error_details = error_info
-            raise ValueError("Meta API call failed or returned unexpected response.")
+            raise MetaSendError(error_info)
+
+    except CircuitOpenError:
+        # No request was made, so this attempt is safe to repeat later.
+        complete_send_attempt(send_attempt, error_details={'error': 'Meta API circuit breaker open.'})
+        # The Graph API is unhealthy. Park the message (it stays 'pending_dispatch') instead of
+        # burning retries; drain_parked_messages_task re-dispatches it in order on recovery.
+        try:
+            # Remember the lane (conversational or bulk) so the drain sends it back there.
+            queue = (self.request.delivery_info or {}).get('routing_key')
+            graph_api_breaker.park_message(outgoing_msg.id, active_config.id, queue=queue)
+            logger.warning(f"Circuit open: parked Message ID {outgoing_message_id} until the Meta API recovers.")
+        except Exception as e:
+            logger.error(f"Could not park Message ID {outgoing_message_id}, retrying later. Error: {e}")
+            raise self.retry(countdown=graph_api_breaker.open_seconds)
+        return
 
     except Exception as e:
-        logger.error(f"Exception in send_whatsapp_message_task for Message ID {outgoing_message_id}: {e}", exc_info=True)
+        if isinstance(e, MetaSendError):
+            error_details, is_permanent = e.error_details, e.permanent
+        else:
+            logger.error(f"Exception in send_whatsapp_message_task for Message ID {outgoing_message_id}: {e}", exc_info=True)
+            error_details, is_permanent = {'error': str(e), 'type': type(e).__name__}, False
         outgoing_msg.status = 'failed'
-        outgoing_msg.error_details = {'error': str(e), 'type': type(e).__name__}
+        outgoing_msg.error_details = error_details
+        if send_attempt and send_attempt.status == 'in_flight':
+            complete_send_attempt(send_attempt, error_details=error_details)
+
+        # Errors Meta will keep returning (bad template, expired token, closed 24h window, ...)
+        # go straight to the dead-letter store instead of being retried.
+        if is_permanent or classify_send_error(error_details) == PERMANENT:
+            logger.error(f"Permanent error sending Message ID {outgoing_message_id}. Dead-lettering without retry.")
+            _dead_letter_failed_send(self, outgoing_msg, 'permanent_error', active_config.id)
+            return
         try:
-            # Retry the task if it's a network issue or a temporary problem
-            # Celery will automatically retry based on max_retries and default_retry_delay.
-            raise self.retry(exc=e) # Re-raise to trigger Celery's retry mechanism
+            # Transient problem (network, throttling, 5xx): retry with exponential backoff and jitter.
+            countdown = backoff_delay(self.request.retries)
+            logger.warning(f"Transient error sending Message ID {outgoing_message_id}. Retrying in {countdown}s.")
+            # No exc= here: with it Celery re-raises `e` once retries run out instead of
+            # MaxRetriesExceededError, and the message would never be dead-lettered.
+            raise self.retry(countdown=countdown)
         except self.MaxRetriesExceededError:
-            logger.error(f"Max retries exceeded for sending Message ID {outgoing_message_id}.")
-            # This is a permanent failure. Save the final state and send the notification signal.
-            outgoing_msg.status_timestamp = timezone.now()
-            outgoing_msg.save(update_fields=['status', 'error_details', 'status_timestamp'])
-            message_send_failed.send(sender=self.__class__, message_instance=outgoing_msg)
-            return # Exit after handling permanent failure
+            logger.error(f"Max retries exceeded for sending Message ID {outgoing_message_id}. Dead-lettering.")
+            _dead_letter_failed_send(self, outgoing_msg, 'retries_exhausted', active_config.id)
+            return
+    finally:
+        release_send_lock(outgoing_msg.idempotency_key)
 
     # This block is now only reached on success or during retries (before an exception is raised).
     outgoing_msg.status_timestamp = timezone.now()
@@ -173,9 +247,55 @@ def send_read_receipt_task(self, wamid: str, contact_id: int, config_id: int, sh
         if not read_receipt_response or not read_receipt_response.get('success'):
             raise ValueError(f"API call to send read receipt failed for WAMID {wamid}. Response: {read_receipt_response}")
 
+    except CircuitOpenError:
+        # Read receipts are best effort; don't queue them up behind an outage.
+        logger.info(f"Circuit open: skipping read receipt for WAMID {wamid}.")
+        return
     except Exception as e:
         logger.warning(f"Exception in send_read_receipt_task for WAMID {wamid}, will retry. Error: {e}")
         try:
             raise self.retry(exc=e)
         except self.MaxRetriesExceededError:
             logger.error(f"Max retries exceeded for sending read receipt for WAMID {wamid}.")
+
+
+@shared_task(name="meta_integration.tasks.send_message_sequence_task")
+def send_message_sequence_task(outgoing_message_ids: list, active_config_id: int):
+    """
+    Dispatches the outbound messages of one flow turn as a single Celery chain, so
+    each message is only picked up once the previous one has been handled. This
+    replaces one apply_async per message with staggered countdowns.
+    """
+    if not outgoing_message_ids:
+        return
+    chain(*(send_whatsapp_message_task.si(message_id, active_config_id) for message_id in outgoing_message_ids)).apply_async()
+    logger.info(f"Dispatched a send chain of {len(outgoing_message_ids)} message(s) with config {active_config_id}.")
+
+
+@shared_task(name="meta_integration.tasks.drain_parked_messages_task")
+def drain_parked_messages_task(batch_size: int = 100, drain_token: str = None):
+    """
+    Re-dispatches messages parked while the Graph API circuit was open, oldest first,
+    each on the lane it was parked from. In half-open state a single message is
+    dispatched to act as the probe. Triggered when the circuit closes and by Celery
+    Beat so a half-open circuit always gets probed. Only one drain chain runs at a
+    time; other runs return while it holds the drain lock.
+    """
+    drain_token = graph_api_breaker.claim_drain(drain_token)
+    if drain_token is None:
+        logger.debug("Parked messages are already being drained. Skipping.")
+        return
+
+    circuit_state = graph_api_breaker.state()
+    if circuit_state != 'open' and graph_api_breaker.parked_count():
+        count = 1 if circuit_state == 'half_open' else batch_size
+        parked = graph_api_breaker.pop_parked_messages(count)
+        for message_id, config_id, queue in parked:
+            send_whatsapp_message_task.apply_async(args=[message_id, config_id], queue=queue)
+        logger.info(f"Re-dispatched {len(parked)} parked message(s) (circuit {circuit_state}).")
+
+    if circuit_state == 'closed' and graph_api_breaker.parked_count():
+        # Pace the drain so a recovering API is not hit with the whole backlog at once.
+        drain_parked_messages_task.apply_async(kwargs={'batch_size': batch_size, 'drain_token': drain_token}, countdown=2)
+        return
+    graph_api_breaker.release_drain(drain_token)
@@ -1,3 +1,51 @@
-from django.test import TestCase
+# whatsappcrm_backend/meta_integration/tests.py
 
-# Create your tests here.
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .retry_policy import (
+    PERMANENT, TRANSIENT, SEND_RETRY_BASE_SECONDS, SEND_RETRY_MAX_SECONDS,
+    backoff_delay, classify_send_error, extract_error_code,
+)
+
+
+class ClassifySendErrorTests(SimpleTestCase):
+
+    def test_known_permanent_code(self):
+        self.assertEqual(classify_send_error({'error': {'code': 131026}, 'http_status': 400}), PERMANENT)
+
+    def test_known_transient_code_wins_over_4xx_status(self):
+        self.assertEqual(classify_send_error({'error': {'code': 130429}, 'http_status': 400}), TRANSIENT)
+
+    def test_unknown_code_falls_back_to_http_status(self):
+        self.assertEqual(classify_send_error({'error': {'code': 999999}, 'http_status': 404}), PERMANENT)
+        self.assertEqual(classify_send_error({'error': {'code': 999999}, 'http_status': 503}), TRANSIENT)
+        self.assertEqual(classify_send_error({'http_status': 429}), TRANSIENT)
+
+    def test_errors_without_a_response_are_transient(self):
+        self.assertEqual(classify_send_error(None), TRANSIENT)
+        self.assertEqual(classify_send_error({'detail': 'Read timed out'}), TRANSIENT)
+
+    def test_extract_error_code_ignores_malformed_bodies(self):
+        self.assertEqual(extract_error_code({'error': {'code': '131047'}}), 131047)
+        self.assertIsNone(extract_error_code({'error': {'code': 'abc'}}))
+        self.assertIsNone(extract_error_code({'error': 'boom'}))
+        self.assertIsNone(extract_error_code('boom'))
+
+
+class BackoffDelayTests(SimpleTestCase):
+
+    def test_ceiling_grows_exponentially_up_to_the_cap(self):
+        with mock.patch('meta_integration.retry_policy.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(backoff_delay(0), SEND_RETRY_BASE_SECONDS)
+            self.assertEqual(backoff_delay(2), SEND_RETRY_BASE_SECONDS * 4)
+            self.assertEqual(backoff_delay(50), SEND_RETRY_MAX_SECONDS)
+
+    def test_delay_is_at_least_one_second(self):
+        with mock.patch('meta_integration.retry_policy.random.uniform', return_value=0):
+            self.assertEqual(backoff_delay(3), 1)
+
+    def test_negative_retries_use_the_base_delay(self):
+        with mock.patch('meta_integration.retry_policy.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(backoff_delay(-1), SEND_RETRY_BASE_SECONDS)
@@ -11,6 +11,7 @@ app_name = 'meta_integration'
 router = DefaultRouter()
 router.register(r'configs', views.MetaAppConfigViewSet, basename='metaappconfig')
 router.register(r'webhook-logs', views.WebhookEventLogViewSet, basename='webhookeventlog')
+router.register(r'dead-letters', views.DeadLetteredSendViewSet, basename='deadletteredsend')
 
 # The API URLs are now determined automatically by the router.
 # Additionally, we include the original webhook path.
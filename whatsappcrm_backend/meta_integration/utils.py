@@ -3,13 +3,42 @@
 import requests
 import json
 import logging
+import time
 from typing import Optional, Tuple
 # from django.conf import settings # No longer using settings for API creds
 from .models import MetaAppConfig # Import the model
+from .circuit_breaker import graph_api_breaker, CircuitOpenError
 from django.core.exceptions import ObjectDoesNotExist
 
 logger = logging.getLogger(__name__)
 
+# (connect, read) timeouts. A short connect timeout stops workers from sitting on
+# an unreachable Graph API for the full read timeout.
+GRAPH_API_CONNECT_TIMEOUT = 5
+
+def _post_to_graph_api(url: str, headers: dict, payload: dict, timeout: int) -> requests.Response:
+    """
+    POSTs to the Graph API through the shared circuit breaker.
+    Raises CircuitOpenError without making a request while the circuit is open.
+    Network errors, 429s and 5xx responses count as failures; other responses
+    (including 4xx caused by the request itself) count as healthy calls.
+    """
+    if not graph_api_breaker.allow_request():
+        raise CircuitOpenError("Meta Graph API circuit breaker is open.")
+
+    started = time.monotonic()
+    try:
+        response = requests.post(url, headers=headers, json=payload, timeout=(GRAPH_API_CONNECT_TIMEOUT, timeout))
+    except requests.exceptions.RequestException:
+        graph_api_breaker.record_failure()
+        raise
+
+    if response.status_code >= 500 or response.status_code == 429:
+        graph_api_breaker.record_failure()
+    else:
+        graph_api_breaker.record_success(time.monotonic() - started)
+    return response
+
 def get_active_meta_config_for_sending():
     """
     Helper function to get the active MetaAppConfig for sending messages.
@@ -27,7 +56,7 @@ def get_active_meta_config_for_sending():
         logger.critical(f"CRITICAL: An unexpected error occurred while fetching the active MetaAppConfig: {e}", exc_info=True)
         return None
 
-def send_whatsapp_message(to_phone_number: str, message_type: str, data: dict, config: MetaAppConfig = None):
+def send_whatsapp_message(to_phone_number: str, message_type: str, data: dict, config: MetaAppConfig = None, biz_opaque_callback_data: str = None):
     """
     Sends a WhatsApp message using the Meta Graph API.
     Uses MetaAppConfig from the database.
@@ -38,8 +67,12 @@ def send_whatsapp_message(to_phone_number: str, message_type: str, data: dict, c
         data (dict): The payload specific to the message type.
         config (MetaAppConfig, optional): The MetaAppConfig instance to use. 
                                           If None, tries to fetch the active one.
+        biz_opaque_callback_data (str, optional): Tracking string Meta echoes back in status webhooks.
     Returns:
-        dict: The JSON response from Meta API, or None if an error occurs.
+        dict: The JSON response from Meta API. On an HTTP error, Meta's error body
+              plus an 'http_status' key. If the request may have reached Meta but no
+              usable response came back (read timeout, dropped connection), an error
+              with 'outcome_unknown': True. None if any other error occurs.
     """
     if not config:
         config = get_active_meta_config_for_sending()
@@ -69,6 +102,8 @@ def send_whatsapp_message(to_phone_number: str, message_type: str, data: dict, c
         "to": to_phone_number,
         "type": message_type,
     }
+    if biz_opaque_callback_data:
+        payload["biz_opaque_callback_data"] = biz_opaque_callback_data
     # The 'typing_on' type does not have a data payload key, so we only add it for other types.
     if message_type != "typing_on":
         payload[message_type] = data
@@ -92,13 +127,16 @@ def send_whatsapp_message(to_phone_number: str, message_type: str, data: dict, c
     logger.debug(f"Sending WhatsApp message via config '{config.name}'. URL: {url}, Payload: {json.dumps(payload)}")
 
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=20)
+        response = _post_to_graph_api(url, headers, payload, timeout=20)
         response.raise_for_status()
         
         response_json = response.json()
         logger.info(f"Message sent successfully to {to_phone_number} via config '{config.name}'. Response: {response_json}")
         # Store wamid for tracking if needed (e.g., response_json['messages'][0]['id'])
         return response_json
+    except CircuitOpenError:
+        # Let the caller decide whether to park or drop the message.
+        raise
     except requests.exceptions.HTTPError as e:
         logger.error(f"HTTP error sending message to {to_phone_number} via config '{config.name}': {e.response.status_code} - {e.response.text}")
         try:
@@ -106,8 +144,20 @@ def send_whatsapp_message(to_phone_number: str, message_type: str, data: dict, c
             logger.error(f"Meta API error details: {error_details}")
         except json.JSONDecodeError:
             logger.error("Could not decode Meta API error response as JSON.")
+            error_details = {'error': {'message': e.response.text}}
+        if not isinstance(error_details, dict):
+            error_details = {'error': error_details}
+        # Hand Meta's error body back so the caller can classify it (see retry_policy.py).
+        error_details['http_status'] = e.response.status_code
+        return error_details
+    except requests.exceptions.ConnectTimeout as e:
+        # The connection was never established, so Meta cannot have the message.
+        logger.error(f"Timed out connecting to send message to {to_phone_number} via config '{config.name}': {e}")
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error sending message to {to_phone_number} via config '{config.name}': {e}")
+        # The request may have been delivered before the connection failed or the read
+        # timed out. Resending could deliver the message twice, so flag it for the caller.
+        logger.error(f"No usable response sending message to {to_phone_number} via config '{config.name}', outcome unknown: {e}")
+        return {'error': {'message': str(e), 'type': type(e).__name__}, 'outcome_unknown': True}
     except Exception as e:
         logger.error(f"An unexpected error occurred while sending message to {to_phone_number} via config '{config.name}': {e}", exc_info=True)
         
@@ -152,12 +202,14 @@ def send_read_receipt_api(wamid: str, config: MetaAppConfig, show_typing_indicat
     logger.debug(f"Sending {log_action} via config '{config.name}'. URL: {url}, Payload: {json.dumps(payload)}")
 
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=15)
+        response = _post_to_graph_api(url, headers, payload, timeout=15)
         response.raise_for_status()
         
         response_json = response.json()
         logger.info(f"{log_action.capitalize()} sent successfully for WAMID {wamid} via config '{config.name}'. Response: {response_json}")
         return response_json
+    except CircuitOpenError:
+        raise
     except requests.exceptions.HTTPError as e:
         logger.error(f"HTTP error sending {log_action} for WAMID {wamid} via config '{config.name}': {e.response.status_code} - {e.response.text}")
     except requests.exceptions.RequestException as e:
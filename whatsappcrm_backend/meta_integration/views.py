@@ -22,12 +22,17 @@ from rest_framework.exceptions import ParseError
 
 
 
-from .models import MetaAppConfig, WebhookEventLog # EVENT_TYPE_CHOICES removed from here
+from django.db.models import Count
+
+from .models import MetaAppConfig, WebhookEventLog, DeadLetteredSend # EVENT_TYPE_CHOICES removed from here
 from .serializers import (
     MetaAppConfigSerializer,
     WebhookEventLogSerializer,
-    WebhookEventLogListSerializer
+    WebhookEventLogListSerializer,
+    DeadLetteredSendSerializer,
+    DeadLetterRequeueSerializer,
 )
+from .dead_letters import requeue_dead_letters
 # from .utils import send_whatsapp_message # send_whatsapp_message_task is used from tasks now
 
 # --- Cross-app imports to be localized or already localized ---
@@ -35,6 +40,9 @@ from .serializers import (
 # from conversations.services import get_or_create_contact_by_wa_id # Imported locally in post
 from conversations.models import Message # Imported locally in _handle_message
 from .tasks import send_whatsapp_message_task, send_read_receipt_task
+from outbox.services import enqueue_task
+from .send_ledger import find_message_for_status
+from whatsappcrm_backend.pagination import WebhookEventLogKeysetPagination
 
 logger = logging.getLogger('meta_integration') # Using the app-specific logger from your original file
 
@@ -98,9 +106,11 @@ class MetaAppConfigViewSet(viewsets.ModelViewSet):
 class WebhookEventLogViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = WebhookEventLog.objects.all().select_related('app_config', 'message__contact').order_by('-received_at')
     permission_classes = [permissions.IsAdminUser] # Or IsAdminOrReadOnly if non-staff can view
+    pagination_class = WebhookEventLogKeysetPagination
     # filter_backends = [...] # Add if you use django-filter
     filterset_fields = ['event_type', 'processing_status', 'event_identifier', 'phone_number_id_received', 'waba_id_received', 'app_config__name']
-    search_fields = ['payload', 'processing_notes', 'event_identifier', 'message__contact__whatsapp_id', 'message__contact__name']
+    # No 'payload': an ILIKE over the raw JSON scans the whole table. Search messages through conversations/search/.
+    search_fields = ['event_identifier', 'message__contact__whatsapp_id']
     ordering_fields = ['received_at', 'processed_at', 'event_type']
 
     def get_serializer_class(self):
@@ -137,6 +147,61 @@ class WebhookEventLogViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({"message": f"Event {log_entry.id} marked for reprocessing."}, status=status.HTTP_202_ACCEPTED)
 
 
+class DeadLetteredSendViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Inspection and requeue API for the outgoing-message dead-letter store.
+    By default only entries still waiting in the queue are listed; pass
+    `?include_requeued=true` to see requeued ones as well. Filter with
+    `?reason=` and `?error_code=`.
+    """
+    serializer_class = DeadLetteredSendSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def get_queryset(self):
+        queryset = DeadLetteredSend.objects.select_related('message__contact').order_by('-dead_lettered_at')
+        params = self.request.query_params
+        if params.get('include_requeued', '').lower() != 'true':
+            queryset = queryset.filter(requeued_at__isnull=True)
+        if params.get('reason'):
+            queryset = queryset.filter(reason=params['reason'])
+        if params.get('error_code'):
+            try:
+                queryset = queryset.filter(error_code=int(params['error_code']))
+            except ValueError:
+                raise ParseError("'error_code' must be an integer.")
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Counts of waiting dead letters grouped by reason and Meta error code."""
+        waiting = DeadLetteredSend.objects.filter(requeued_at__isnull=True)
+        groups = waiting.values('reason', 'error_code').annotate(count=Count('id')).order_by('-count')
+        return Response({'total': waiting.count(), 'groups': list(groups)})
+
+    @action(detail=True, methods=['post'])
+    def requeue(self, request, pk=None):
+        entry = self.get_object()
+        result = requeue_dead_letters(DeadLetteredSend.objects.filter(pk=entry.pk))
+        logger.info(f"Dead letter {entry.id} (Message {entry.message_id}) requeue requested by {request.user}: {result}")
+        return Response(result, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'], url_path='requeue', url_name='requeue-bulk')
+    def requeue_bulk(self, request):
+        serializer = DeadLetterRequeueSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+        queryset = DeadLetteredSend.objects.all()
+        if 'ids' in filters:
+            queryset = queryset.filter(id__in=filters['ids'])
+        if 'reason' in filters:
+            queryset = queryset.filter(reason=filters['reason'])
+        if 'error_code' in filters:
+            queryset = queryset.filter(error_code=filters['error_code'])
+        result = requeue_dead_letters(queryset)
+        logger.info(f"Bulk dead letter requeue ({filters}) requested by {request.user}: {result}")
+        return Response(result, status=status.HTTP_202_ACCEPTED)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class MetaWebhookAPIView(View):
     """
@@ -420,10 +485,9 @@ class MetaWebhookAPIView(View):
             # Instead of processing the flow synchronously, queue a Celery task.
             # This makes the webhook response immediate. Using transaction.on_commit ensures
             # the task is only queued after the database transaction (creating the message)
-            # has successfully completed, preventing race conditions.
-            transaction.on_commit(lambda: process_flow_for_message_task.delay(
-                incoming_msg_obj.id
-            ))
+            # has successfully completed, preventing race conditions. The outbox row is
+            # written in this transaction, so the task cannot be lost after the commit.
+            enqueue_task(process_flow_for_message_task, args=[incoming_msg_obj.id])
             logger.info(f"Queued process_flow_for_message_task for message {incoming_msg_obj.id}.")
 
         except Exception as e:
@@ -461,7 +525,8 @@ class MetaWebhookAPIView(View):
         logger.info(f"Status Update: WAMID={wamid}, Status='{status_value}'")
         notes = [f"Status for WAMID {wamid} is {status_value}."]
         try: # noqa
-            msg_to_update = Message.objects.filter(wamid=wamid, direction='out').first()
+            # Also matches messages whose wamid was never saved, via the echoed idempotency key.
+            msg_to_update = find_message_for_status(wamid, status_data)
             if msg_to_update:
                 update_fields_list = ['status', 'status_timestamp']
                 msg_to_update.status = status_value
@@ -475,6 +540,10 @@ class MetaWebhookAPIView(View):
                     update_fields_list.append('pricing_model_from_meta')
                 msg_to_update.save(update_fields=update_fields_list)
                 notes.append("DB record updated.")
+                # Keep broadcast progress counters in step with the delivery status.
+                from conversations.services import record_broadcast_status_transition
+                if record_broadcast_status_transition(msg_to_update.id, status_value, status_ts):
+                    notes.append("Broadcast counters updated.")
                 self._save_log(log_entry, 'processed', " ".join(notes))
             else: self._save_log(log_entry, 'ignored', f"No matching outgoing msg for WAMID {wamid}.")
         except Exception as e: logger.error(f"Error updating status for WAMID {wamid}: {e}", exc_info=True); self._save_log(log_entry, 'error', str(e))
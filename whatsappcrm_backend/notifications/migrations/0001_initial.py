@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('conversations', '0005_inbox_broadcasts_archive_and_search_indexes'),
+        ('flows', '0003_flow_timers_and_state_ttl'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('whatsapp', 'WhatsApp'), ('email', 'Email')], default='whatsapp', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20)),
+                ('content', models.TextField(help_text='The body of the notification message.')),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('recipient', models.ForeignKey(help_text='The system user who received the notification.', on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+                ('related_contact', models.ForeignKey(blank=True, help_text='The contact that this notification is about, if any.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='conversations.contact')),
+                ('related_flow', models.ForeignKey(blank=True, help_text='The flow that triggered this notification, if any.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='flows.flow')),
+            ],
+            options={
+                'verbose_name': 'Notification Log',
+                'verbose_name_plural': 'Notification Logs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
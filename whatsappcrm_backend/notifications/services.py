@@ -3,13 +3,13 @@ import logging
 from typing import List, Optional
 
 from django.contrib.auth import get_user_model
-from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Q
 
 from .models import Notification
 from .tasks import dispatch_notification_task
+from outbox.services import enqueue_tasks
 from conversations.models import Contact
 from flows.models import Flow
 
@@ -66,6 +66,7 @@ def queue_notifications_to_users(
     created_notifications = Notification.objects.bulk_create(notifications_to_create)
     logger.info(f"Bulk created {len(created_notifications)} notifications for {len(users_to_notify)} eligible admin users.")
 
+    # One outbox INSERT for all dispatch tasks, published once the surrounding transaction commits.
+    enqueue_tasks(dispatch_notification_task, [[notification.id] for notification in created_notifications])
     for notification in created_notifications:
-        transaction.on_commit(lambda n=notification: dispatch_notification_task.delay(n.id))
         logger.info(f"Notifications: Queued Notification ID {notification.id} for user '{notification.recipient.username}'.")
\ No newline at end of file
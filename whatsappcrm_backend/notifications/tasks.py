@@ -9,7 +9,8 @@ from datetime import timedelta
 
 from meta_integration.models import MetaAppConfig
 from meta_integration.tasks import send_whatsapp_message_task
-from conversations.models import Message, Contact
+from conversations.models import Message, Contact, save_message_payloads, update_inbox_summaries
+from outbox.services import enqueue_task
 from .models import Notification
 
 logger = logging.getLogger(__name__)
@@ -71,11 +72,14 @@ def dispatch_notification_task(self, notification_id: int):
                 )
                 created_messages = Message.objects.bulk_create([message_obj])
                 message = created_messages[0]
+                save_message_payloads(created_messages)
+                # Leaves last_seen alone: it marks the recipient's own activity for the 24-hour window.
+                update_inbox_summaries(created_messages)
 
                 notification.status = 'sent'
                 notification.sent_at = timezone.now()
                 notification.save(update_fields=['status', 'sent_at'])
-                transaction.on_commit(lambda: send_whatsapp_message_task.delay(message.id, active_config.id))
+                enqueue_task(send_whatsapp_message_task, args=[message.id, active_config.id])
             logger.info(f"Successfully dispatched notification {notification.id} as Message {message.id}.")
         except Exception as e:
             logger.error(f"Failed to dispatch notification {notification.id} for user '{recipient.username}'. Error: {e}", exc_info=True)
@@ -0,0 +1,24 @@
+# whatsappcrm_backend/outbox/admin.py
+from django.contrib import admin
+from .models import OutboxTask
+from .services import retry_failed_outbox_tasks
+
+@admin.register(OutboxTask)
+class OutboxTaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task_name', 'queue', 'created_at', 'countdown', 'attempts', 'next_attempt_at', 'failed_at', 'last_error')
+    list_filter = (('failed_at', admin.EmptyFieldListFilter), 'task_name', 'queue')
+    search_fields = ('task_name', 'task_id')
+    readonly_fields = (
+        'task_id', 'task_name', 'queue', 'args', 'kwargs', 'countdown', 'created_at',
+        'attempts', 'next_attempt_at', 'failed_at', 'last_error',
+    )
+    actions = ['retry_failed']
+
+    @admin.action(description="Retry selected failed tasks")
+    def retry_failed(self, request, queryset):
+        retried = retry_failed_outbox_tasks(queryset)
+        self.message_user(request, f"{retried} failed outbox task(s) will be published again.")
+
+    def has_add_permission(self, request):
+        # Outbox rows are written by the application, not manually in the admin
+        return False
@@ -0,0 +1,8 @@
+# whatsappcrm_backend/outbox/apps.py
+
+from django.apps import AppConfig
+
+class OutboxConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'outbox'
+    verbose_name = "Task Outbox"
@@ -0,0 +1,57 @@
+# outbox/management/commands/relay_outbox.py
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from whatsappcrm_backend.celery import app as celery_app
+from outbox.services import relay_outbox_batch, wait_for_outbox_work
+
+class Command(BaseCommand):
+    """
+    Long-running relay that publishes tasks recorded in the outbox to the Celery
+    broker. It blocks on a Redis wakeup signal sent after each committing
+    transaction and falls back to polling every --poll-interval seconds.
+    """
+    help = 'Publishes pending outbox tasks to the Celery broker in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Maximum number of tasks to publish per batch. Default is 200.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait for a wakeup before checking the outbox again. Default is 2.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the outbox once and exit.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        poll_interval = options['poll_interval']
+
+        # Make sure every task module is registered so task-level options are honoured.
+        celery_app.loader.import_default_modules()
+
+        self.stdout.write(self.style.SUCCESS(f"Outbox relay started (batch size {batch_size})."))
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                published = relay_outbox_batch(batch_size)
+                total += published
+                if published >= batch_size:
+                    continue  # More work is waiting, keep draining.
+                if options['once']:
+                    break
+                wait_for_outbox_work(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Outbox relay stopped. Published {total} task(s)."))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Celery task id used when publishing, stable across relay retries.', unique=True)),
+                ('task_name', models.CharField(help_text='Registered Celery task name.', max_length=255)),
+                ('args', models.JSONField(blank=True, default=list)),
+                ('kwargs', models.JSONField(blank=True, default=dict)),
+                ('queue', models.CharField(blank=True, help_text="Queue to publish to. Empty means the task's normal route.", max_length=100, null=True)),
+                ('countdown', models.PositiveIntegerField(blank=True, help_text='Seconds after enqueueing before the task should run.', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of failed publish attempts.')),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('next_attempt_at', models.DateTimeField(blank=True, db_index=True, help_text='After a failed publish, the relay skips the row until this time.', null=True)),
+                ('failed_at', models.DateTimeField(blank=True, db_index=True, help_text='Set once the row has used up OUTBOX_MAX_PUBLISH_ATTEMPTS. The relay leaves it alone until retried from the admin.', null=True)),
+            ],
+            options={
+                'verbose_name': 'Outbox Task',
+                'verbose_name_plural': 'Outbox Tasks',
+                'ordering': ['id'],
+            },
+        ),
+    ]
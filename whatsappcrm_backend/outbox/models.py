@@ -0,0 +1,51 @@
+# whatsappcrm_backend/outbox/models.py
+
+import uuid
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+class OutboxTask(models.Model):
+    """
+    A Celery task waiting to be published to the broker.
+
+    Rows are written inside the same database transaction as the data the task
+    depends on, so a task exists if and only if that transaction committed. The
+    outbox relay publishes pending rows in batches and deletes them once the
+    broker has accepted them. A row that fails to publish is retried with
+    exponential backoff and marked failed after too many attempts, so it cannot
+    hold up the rows behind it.
+    """
+    task_id = models.UUIDField(
+        default=uuid.uuid4, unique=True, editable=False,
+        help_text=_("Celery task id used when publishing, stable across relay retries.")
+    )
+    task_name = models.CharField(max_length=255, help_text=_("Registered Celery task name."))
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    queue = models.CharField(
+        max_length=100, blank=True, null=True,
+        help_text=_("Queue to publish to. Empty means the task's normal route.")
+    )
+    countdown = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text=_("Seconds after enqueueing before the task should run.")
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0, help_text=_("Number of failed publish attempts."))
+    last_error = models.TextField(blank=True, null=True)
+    next_attempt_at = models.DateTimeField(
+        null=True, blank=True, db_index=True,
+        help_text=_("After a failed publish, the relay skips the row until this time.")
+    )
+    failed_at = models.DateTimeField(
+        null=True, blank=True, db_index=True,
+        help_text=_("Set once the row has used up OUTBOX_MAX_PUBLISH_ATTEMPTS. The relay leaves it alone until retried from the admin.")
+    )
+
+    def __str__(self):
+        return f"{self.task_name} ({self.task_id})"
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = _("Outbox Task")
+        verbose_name_plural = _("Outbox Tasks")
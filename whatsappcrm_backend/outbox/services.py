@@ -0,0 +1,185 @@
+# whatsappcrm_backend/outbox/services.py
+
+import logging
+import time
+from datetime import timedelta
+from typing import Optional, Union
+
+from celery import Task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from whatsappcrm_backend.celery import app as celery_app
+from .models import OutboxTask
+
+logger = logging.getLogger(__name__)
+
+# Redis list the relay blocks on, so rows are published as soon as their transaction commits.
+OUTBOX_WAKEUP_KEY = "outbox:wakeup"
+
+MAX_PUBLISH_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_PUBLISH_ATTEMPTS', 10)
+RETRY_BASE_SECONDS = getattr(settings, 'OUTBOX_RETRY_BASE_SECONDS', 5)
+RETRY_MAX_SECONDS = getattr(settings, 'OUTBOX_RETRY_MAX_SECONDS', 600)
+
+
+def _wake_relay():
+    try:
+        get_redis_connection("default").lpush(OUTBOX_WAKEUP_KEY, 1)
+    except Exception as e:
+        # Not fatal: the relay also polls, it will just pick the row up a little later.
+        logger.warning(f"Could not wake the outbox relay: {e}")
+
+
+def enqueue_task(
+    task: Union[Task, str],
+    args: Optional[list] = None,
+    kwargs: Optional[dict] = None,
+    countdown: Optional[int] = None,
+    queue: Optional[str] = None,
+) -> OutboxTask:
+    """
+    Records a Celery task in the outbox as part of the current database transaction.
+
+    Use this instead of `transaction.on_commit(lambda: task.delay(...))`: the task
+    is published by the outbox relay only if the surrounding transaction commits,
+    and it is not lost if the process dies between the commit and the publish.
+    Arguments must be JSON serializable. `queue` overrides the task's route, e.g.
+    to send a bulk message through the bulk lane.
+    """
+    task_name = task if isinstance(task, str) else task.name
+    outbox_task = OutboxTask.objects.create(
+        task_name=task_name,
+        args=list(args or []),
+        kwargs=dict(kwargs or {}),
+        countdown=countdown,
+        queue=queue,
+    )
+    transaction.on_commit(_wake_relay)
+    return outbox_task
+
+
+def enqueue_tasks(task: Union[Task, str], args_list: list, queue: Optional[str] = None) -> list:
+    """
+    Bulk variant of `enqueue_task`: records one outbox row per entry of
+    `args_list` with a single INSERT.
+    """
+    if not args_list:
+        return []
+    task_name = task if isinstance(task, str) else task.name
+    outbox_tasks = OutboxTask.objects.bulk_create([
+        OutboxTask(task_name=task_name, args=list(args), queue=queue) for args in args_list
+    ])
+    transaction.on_commit(_wake_relay)
+    return outbox_tasks
+
+
+def _publish(outbox_task: OutboxTask, producer, now):
+    options = {'task_id': str(outbox_task.task_id), 'producer': producer}
+    if outbox_task.queue:
+        options['queue'] = outbox_task.queue
+    if outbox_task.countdown:
+        eta = outbox_task.created_at + timedelta(seconds=outbox_task.countdown)
+        if eta > now:
+            options['eta'] = eta
+
+    task = celery_app.tasks.get(outbox_task.task_name)
+    if task is not None:
+        # apply_async keeps task-level options such as a declared queue.
+        task.apply_async(args=outbox_task.args, kwargs=outbox_task.kwargs, **options)
+    else:
+        celery_app.send_task(outbox_task.task_name, args=outbox_task.args, kwargs=outbox_task.kwargs, **options)
+
+
+def _record_publish_failure(outbox_task: OutboxTask, error: Exception, now):
+    """Backs the row off exponentially, or marks it failed once it is out of attempts."""
+    outbox_task.attempts += 1
+    outbox_task.last_error = str(error)[:1000]
+    if outbox_task.attempts >= MAX_PUBLISH_ATTEMPTS:
+        outbox_task.failed_at = now
+        logger.error(
+            f"Outbox task {outbox_task.id} ({outbox_task.task_name}) failed to publish {outbox_task.attempts} times. "
+            f"Giving up; retry it from the admin."
+        )
+    else:
+        delay = min(RETRY_BASE_SECONDS * 2 ** (outbox_task.attempts - 1), RETRY_MAX_SECONDS)
+        outbox_task.next_attempt_at = now + timedelta(seconds=delay)
+
+
+def relay_outbox_batch(batch_size: int = 200) -> int:
+    """
+    Publishes up to `batch_size` pending outbox tasks and removes them from the outbox.
+
+    Rows are claimed with SKIP LOCKED so several relays can run side by side, and the
+    whole batch is published over a single broker connection. The deletes commit only
+    after every publish in the batch has returned; if the relay dies mid-batch the rows
+    are published again with the same task ids. Rows that fail to publish are skipped
+    until their next_attempt_at, and left alone once marked failed.
+    Returns the number of tasks published.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pending = list(
+            OutboxTask.objects.select_for_update(skip_locked=True)
+            .filter(failed_at__isnull=True)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by('id')[:batch_size]
+        )
+        if not pending:
+            return 0
+
+        published_ids = []
+        failed = []
+        with celery_app.producer_or_acquire() as producer:
+            for outbox_task in pending:
+                try:
+                    _publish(outbox_task, producer, now)
+                    published_ids.append(outbox_task.id)
+                except Exception as e:
+                    logger.error(f"Failed to publish outbox task {outbox_task.id} ({outbox_task.task_name}): {e}", exc_info=True)
+                    _record_publish_failure(outbox_task, e, now)
+                    failed.append(outbox_task)
+
+        if published_ids:
+            OutboxTask.objects.filter(id__in=published_ids).delete()
+        if failed:
+            OutboxTask.objects.bulk_update(failed, ['attempts', 'last_error', 'next_attempt_at', 'failed_at'])
+
+    if published_ids:
+        logger.debug(f"Outbox relay published {len(published_ids)} task(s).")
+    return len(published_ids)
+
+
+def drain_outbox(batch_size: int = 200, max_batches: int = 50) -> int:
+    """Publishes outbox batches until the outbox is empty or `max_batches` is reached."""
+    total = 0
+    for _ in range(max_batches):
+        published = relay_outbox_batch(batch_size)
+        total += published
+        if published < batch_size:
+            break
+    return total
+
+
+def retry_failed_outbox_tasks(queryset) -> int:
+    """Gives failed outbox rows in `queryset` a fresh set of publish attempts."""
+    retried = queryset.filter(failed_at__isnull=False).update(failed_at=None, next_attempt_at=None, attempts=0)
+    if retried:
+        transaction.on_commit(_wake_relay)
+    return retried
+
+
+def wait_for_outbox_work(timeout: float):
+    """
+    Blocks until a committed transaction wakes the relay or `timeout` seconds pass.
+    """
+    try:
+        redis_conn = get_redis_connection("default")
+        if redis_conn.blpop(OUTBOX_WAKEUP_KEY, timeout=max(1, int(round(timeout)))):
+            # One drain covers every wakeup queued so far.
+            redis_conn.delete(OUTBOX_WAKEUP_KEY)
+    except Exception as e:
+        logger.warning(f"Outbox relay could not wait on Redis, falling back to sleeping: {e}")
+        time.sleep(timeout)
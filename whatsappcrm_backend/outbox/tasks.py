@@ -0,0 +1,22 @@
+# whatsappcrm_backend/outbox/tasks.py
+
+import logging
+from celery import shared_task
+
+from .services import drain_outbox
+
+logger = logging.getLogger(__name__)
+
+@shared_task(name="outbox.tasks.relay_outbox_task")
+def relay_outbox_task():
+    """
+    Safety net for the `relay_outbox` process: drains any outbox rows that are
+    still pending. Scheduled by Celery Beat.
+    """
+    try:
+        published = drain_outbox()
+        if published:
+            logger.warning(f"Beat relay published {published} outbox task(s). Is the relay_outbox process running?")
+        return f"Published {published} outbox task(s)."
+    except Exception as e:
+        logger.error(f"Error draining the task outbox: {e}", exc_info=True)
@@ -11,6 +11,7 @@ from django.conf import settings
 from .services import PaynowService
 from meta_integration.utils import send_whatsapp_message, create_text_message_data
 from customer_data.models import Payment
+from outbox.services import enqueue_task
 
 logger = logging.getLogger(__name__)
 
@@ -53,11 +54,14 @@ def _fail_payment_and_notify_user(payment_obj: Payment, reason: str):
     Marks a payment as failed in the DB and sends a notification to the user.
     """
     log_prefix = f"[Fail & Notify - Ref: {payment_obj.id}]"
-    failed_payment = _fail_payment_in_db(payment_obj, reason)
+    # The notification is recorded in the outbox in the same transaction that fails the payment.
+    with transaction.atomic():
+        failed_payment = _fail_payment_in_db(payment_obj, reason)
+        if failed_payment and failed_payment.contact:
+            enqueue_task(send_payment_failure_notification_task, args=[str(failed_payment.id)])
     
     if failed_payment and failed_payment.contact:
-        # If the payment was successfully marked as failed, notify the user.
-        send_payment_failure_notification_task.delay(str(failed_payment.id))
+        logger.info(f"{log_prefix} Payment failed in DB; failure notification queued.")
     elif not failed_payment:
         logger.info(f"{log_prefix} Payment was not failed in DB (likely already processed), so no notification will be sent.")
     elif not payment_obj.contact:
@@ -182,7 +186,7 @@ def poll_paynow_transaction_status(self, payment_id: str):
                     logger.info(f"{log_prefix} Successfully processed payment {pending_payment.id}. Amount: {pending_payment.amount}.")
                     
                     # Send confirmation to user
-                    send_giving_confirmation_whatsapp.delay(payment_id=str(pending_payment.id))
+                    enqueue_task(send_giving_confirmation_whatsapp, kwargs={'payment_id': str(pending_payment.id)})
                     return # Task is complete
 
                 elif paynow_status in ['cancelled', 'failed', 'disputed']:
@@ -258,7 +262,7 @@ def process_paynow_ipn_task(ipn_data: dict):
                 payment_to_update.notes = (payment_to_update.notes or "") + f"\nConfirmed via IPN. Paynow Ref: {payment_to_update.transaction_reference}"
                 payment_to_update.save(update_fields=['status', 'transaction_reference', 'notes', 'updated_at'])
                 logger.info(f"{log_prefix} Successfully processed payment. Amount: {payment_to_update.amount}.")
-                send_giving_confirmation_whatsapp.delay(payment_id=str(payment_to_update.id))
+                enqueue_task(send_giving_confirmation_whatsapp, kwargs={'payment_id': str(payment_to_update.id)})
             
             elif paynow_status in ['cancelled', 'failed', 'disputed']:
                 reason = f"Paynow IPN reported status: '{paynow_status}'."
@@ -0,0 +1,45 @@
+# whatsappcrm_backend/stats/management/commands/queue_depths.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from stats.queue_metrics import get_lane_metrics
+
+
+class Command(BaseCommand):
+    """
+    Prints how many tasks are waiting in each Celery queue lane, plus the
+    transactional outbox backlog. Use --watch to keep sampling.
+    """
+    help = 'Shows the number of waiting tasks per Celery queue lane.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            type=int,
+            default=0,
+            help='Re-sample every N seconds until interrupted. Default is a single sample.',
+        )
+        parser.add_argument(
+            '--warn-threshold',
+            type=int,
+            default=None,
+            help='Highlight queues with at least this many waiting tasks. Defaults to QUEUE_DEPTH_WARN_THRESHOLD.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            metrics = get_lane_metrics(options['warn_threshold'])
+            for name, depth in metrics['queues'].items():
+                line = f"{name:<24} {'unavailable' if depth is None else depth}"
+                if name in metrics['backlogged']:
+                    self.stdout.write(self.style.WARNING(line))
+                else:
+                    self.stdout.write(line)
+            self.stdout.write(self.style.NOTICE(f"{'outbox (unpublished)':<24} {metrics['outbox_pending']}"))
+
+            if not options['watch']:
+                return
+            self.stdout.write('')
+            time.sleep(options['watch'])
@@ -0,0 +1,64 @@
+# whatsappcrm_backend/stats/queue_metrics.py
+
+import logging
+from typing import Optional
+
+from django.conf import settings
+from kombu.exceptions import ChannelError
+
+from outbox.models import OutboxTask
+from whatsappcrm_backend.celery import app as celery_app
+
+logger = logging.getLogger(__name__)
+
+# The interactive lanes, in the order they are reported. Other configured queues follow.
+LANE_QUEUES = [
+    settings.QUEUE_FLOW_TURNS,
+    settings.QUEUE_CONVERSATIONAL_SENDS,
+    settings.QUEUE_BULK_SENDS,
+    settings.QUEUE_BACKGROUND_SYNC,
+]
+
+
+def get_queue_depths() -> dict:
+    """
+    Returns {queue_name: waiting_message_count} for every queue in CELERY_TASK_QUEUES,
+    read straight from the broker. A count is None if the broker could not be asked.
+    """
+    configured = [queue.name for queue in celery_app.conf.task_queues or []]
+    queue_names = [name for name in LANE_QUEUES if name in configured] + [
+        name for name in configured if name not in LANE_QUEUES
+    ]
+
+    depths = {}
+    try:
+        with celery_app.connection_for_read() as connection:
+            channel = connection.default_channel
+            for name in queue_names:
+                try:
+                    depths[name] = channel.queue_declare(queue=name, passive=True).message_count
+                except ChannelError:
+                    # The Redis transport drops a queue's list when it empties.
+                    depths[name] = 0
+    except Exception as e:
+        logger.error(f"Could not read queue depths from the broker: {e}")
+        return {name: depths.get(name) for name in queue_names}
+    return depths
+
+
+def get_lane_metrics(warn_threshold: Optional[int] = None) -> dict:
+    """
+    Queue depth per lane plus the number of tasks still waiting in the outbox
+    (committed but not yet published). Lanes at or above `warn_threshold` are
+    listed under 'backlogged'.
+    """
+    if warn_threshold is None:
+        warn_threshold = getattr(settings, 'QUEUE_DEPTH_WARN_THRESHOLD', 500)
+    depths = get_queue_depths()
+    backlogged = [name for name, depth in depths.items() if depth is not None and depth >= warn_threshold]
+    return {
+        'queues': depths,
+        'outbox_pending': OutboxTask.objects.count(),
+        'warn_threshold': warn_threshold,
+        'backlogged': backlogged,
+    }
@@ -72,10 +72,12 @@ def on_new_message(sender, instance, created, **kwargs):
         }
         broadcast_update('chart_update_bot_performance', bot_perf_payload)
 
-@receiver(post_save, sender=Contact)
-def on_contact_change(sender, instance, created, **kwargs):
-    """When a contact is created or updated, broadcast relevant stats."""
-    logger.debug(f"Signal triggered: Contact changed {instance.id}, created={created}")
+def broadcast_contact_stats():
+    """
+    Recalculates and broadcasts the contact stats cards. Called on every contact save,
+    and directly by code that changes contacts with queryset.update(), which sends no
+    post_save (e.g. the human intervention sweeper).
+    """
     now = timezone.now()
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
@@ -87,6 +89,12 @@ def on_contact_change(sender, instance, created, **kwargs):
     }
     broadcast_update('stats_update', stats_payload)
 
+@receiver(post_save, sender=Contact)
+def on_contact_change(sender, instance, created, **kwargs):
+    """When a contact is created or updated, broadcast relevant stats."""
+    logger.debug(f"Signal triggered: Contact changed {instance.id}, created={created}")
+    broadcast_contact_stats()
+
     # --- Activity Log Payload (only for new contacts) ---
     if created:
         activity_payload = {
@@ -6,6 +6,7 @@ from .views import (
     EngagementStatsAPIView,
     MessageVolumeAPIView,
     PrayerRequestStatsAPIView,
+    QueueDepthStatsAPIView,
 )
 
 app_name = 'stats_api'
@@ -18,4 +19,6 @@ urlpatterns = [
     path('engagement/', EngagementStatsAPIView.as_view(), name='engagement_stats'),
     path('messages/', MessageVolumeAPIView.as_view(), name='message_volume_stats'),
     path('prayer-requests/', PrayerRequestStatsAPIView.as_view(), name='prayer_request_stats'),
+    # Operational: waiting tasks per Celery queue lane
+    path('queues/', QueueDepthStatsAPIView.as_view(), name='queue_depth_stats'),
 ]
\ No newline at end of file
@@ -15,6 +15,7 @@ from conversations.models import Contact, Message
 from flows.models import Flow, ContactFlowState
 from meta_integration.models import MetaAppConfig
 from customer_data.models import Payment, PrayerRequest
+from .queue_metrics import get_lane_metrics
 
 import logging
 logger = logging.getLogger(__name__)
@@ -154,6 +155,17 @@ class DashboardSummaryStatsAPIView(APIView):
 
 # --- Robust, Filterable Analytics Endpoints ---
 
+class QueueDepthStatsAPIView(APIView):
+    """
+    Waiting tasks per Celery queue lane, read live from the broker, plus the
+    number of tasks still in the transactional outbox.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response(get_lane_metrics(), status=status.HTTP_200_OK)
+
+
 class BaseAnalyticsView(APIView):
     """
     Base view for analytics endpoints to handle common date filtering.
@@ -0,0 +1,190 @@
+# whatsappcrm_backend/whatsappcrm_backend/pagination.py
+
+import base64
+import json
+import logging
+from datetime import datetime
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+logger = logging.getLogger(__name__)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first keyset (cursor) pagination on (`keyset_field`, id).
+
+    Pages are fetched with `WHERE (field, id) < (cursor values)` instead of an
+    OFFSET, and no COUNT(*) is run, so page 500 of a long conversation costs the
+    same as page 1. The response has the same shape as the page-number pagination
+    minus `count`: `next` holds older rows, `previous` newer ones.
+
+    Query parameters:
+    - `cursor`: opaque position taken from a `next`/`previous` link.
+    - `anchor`: pk of a row to start from, e.g. a message found by search.
+      Combined with `direction=older` (default) or `direction=newer`, returns the
+      rows just before or after it, without the anchor row itself.
+    - `page_size`: rows per page, up to `max_page_size`.
+
+    `keyset_field` may be nullable; NULLs sort after every value, as
+    `DESC NULLS LAST` does. The view's queryset ordering is replaced.
+    """
+    keyset_field = 'timestamp'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    anchor_query_param = 'anchor'
+    direction_query_param = 'direction'
+
+    def get_page_size(self, request) -> int:
+        try:
+            requested = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(requested, self.max_page_size))
+
+    # --- Cursors ---
+    def encode_cursor(self, value, pk, newer: bool) -> str:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        raw = json.dumps({'v': value, 'id': pk, 'n': int(newer)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> tuple:
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            value = data['v']
+            if isinstance(value, str):
+                value = parse_datetime(value) or value
+            return value, int(data['id']), bool(data.get('n'))
+        except (ValueError, KeyError, TypeError):
+            raise NotFound("Invalid cursor.")
+
+    def _position_from_anchor(self, queryset, anchor: str) -> tuple:
+        try:
+            row = queryset.filter(pk=int(anchor)).values_list(self.keyset_field, 'pk').first()
+        except (TypeError, ValueError):
+            row = None
+        if row is None:
+            raise NotFound("Anchor not found.")
+        return row
+
+    # --- Filtering ---
+    # The redundant <= / >= bound lets the database start an index range scan at the
+    # cursor instead of filtering its way there from the first row.
+    def _older_than(self, value, pk, nullable: bool) -> Q:
+        field = self.keyset_field
+        if value is None:
+            return Q(**{f'{field}__isnull': True, 'pk__lt': pk})
+        condition = Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+        return condition | Q(**{f'{field}__isnull': True}) if nullable else condition
+
+    def _newer_than(self, value, pk, nullable: bool) -> Q:
+        field = self.keyset_field
+        if value is None:
+            return Q(**{f'{field}__isnull': False}) | Q(**{f'{field}__isnull': True, 'pk__gt': pk})
+        return Q(**{f'{field}__gte': value}) & (Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_used = self.get_page_size(request)
+        position, newer = None, False
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        anchor = request.query_params.get(self.anchor_query_param)
+        if cursor:
+            *position, newer = self.decode_cursor(cursor)
+        elif anchor:
+            position = self._position_from_anchor(queryset, anchor)
+            newer = request.query_params.get(self.direction_query_param) == 'newer'
+
+        newest_first = (F(self.keyset_field).desc(nulls_last=True), F('pk').desc())
+        oldest_first = (F(self.keyset_field).asc(nulls_first=True), F('pk').asc())
+        if position:
+            nullable = queryset.model._meta.get_field(self.keyset_field).null
+            condition = self._newer_than(*position, nullable) if newer else self._older_than(*position, nullable)
+            queryset = queryset.filter(condition)
+        queryset = queryset.order_by(*(oldest_first if newer else newest_first))
+
+        rows = list(queryset[:self.page_size_used + 1])
+        has_more = len(rows) > self.page_size_used
+        rows = rows[:self.page_size_used]
+        if newer:
+            rows.reverse()
+
+        # A page fetched towards newer rows always has older rows behind it, and vice versa.
+        self.has_older = has_more if not newer else bool(position)
+        self.has_newer = has_more if newer else bool(position)
+        self.page = rows
+        return rows
+
+    # --- Response ---
+    def _link(self, row, newer: bool):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(remove_query_param(url, self.anchor_query_param), self.direction_query_param)
+        cursor = self.encode_cursor(getattr(row, self.keyset_field), row.pk, newer)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.page or not self.has_older:
+            return None
+        return self._link(self.page[-1], newer=False)
+
+    def get_previous_link(self):
+        if not self.page or not self.has_newer:
+            return None
+        return self._link(self.page[0], newer=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class MessageKeysetPagination(KeysetPagination):
+    keyset_field = 'timestamp'
+
+
+class WebhookEventLogKeysetPagination(KeysetPagination):
+    keyset_field = 'received_at'
+
+
+class ContactInboxPagination(KeysetPagination):
+    """
+    Keyset pagination for the inbox, newest conversation first, served by the
+    contact_inbox_order index. Requests that pass `page` (the contacts directory,
+    which shows page numbers and a total) still get page-number pagination.
+    """
+    keyset_field = 'last_message_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if 'page' in request.query_params:
+            self._page_number_paginator = PageNumberPagination()
+            return self._page_number_paginator.paginate_queryset(queryset, request, view)
+        self._page_number_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self._page_number_paginator is not None:
+            return self._page_number_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -58,6 +58,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres', # Full-text and trigram search lookups
 
     # Third-party apps
     'rest_framework',
@@ -80,6 +81,7 @@ INSTALLED_APPS = [
     'customer_data.apps.CustomerDataConfig',
     'church_services.apps.ChurchServicesConfig',
     'notifications.apps.NotificationsConfig',
+    'outbox.apps.OutboxConfig',
 ]
 
 MIDDLEWARE = [
@@ -225,11 +227,34 @@ CELERY_CACHE_BACKEND = 'django-cache'
 # --- Celery Queue Configuration for Mixed Workloads ---
 from kombu import Queue
 
+# Interactive traffic runs in its own lanes so a broadcast or birthday run can't add
+# latency for people who are mid-conversation. Each lane is consumed by its own worker
+# pool (see docker-compose.yml), sized independently.
+#   flow_turns:           running the flow engine for an incoming message
+#   conversational_sends: flow replies, agent messages, read receipts, staff notifications
+#   bulk_sends:           broadcasts, birthday messages and other campaign traffic
+#   background_sync:      media syncs, payment polling and other housekeeping
+QUEUE_FLOW_TURNS = 'flow_turns'
+QUEUE_CONVERSATIONAL_SENDS = 'conversational_sends'
+QUEUE_BULK_SENDS = 'bulk_sends'
+QUEUE_BACKGROUND_SYNC = 'background_sync'
+# Lanes with at least this many waiting tasks are flagged by the queue-depth metrics.
+QUEUE_DEPTH_WARN_THRESHOLD = int(os.getenv('QUEUE_DEPTH_WARN_THRESHOLD', '500'))
+# Outbox rows the broker refuses are retried with exponential backoff (base doubling up to
+# the max), and marked failed for an operator to retry after OUTBOX_MAX_PUBLISH_ATTEMPTS.
+OUTBOX_MAX_PUBLISH_ATTEMPTS = int(os.getenv('OUTBOX_MAX_PUBLISH_ATTEMPTS', '10'))
+OUTBOX_RETRY_BASE_SECONDS = int(os.getenv('OUTBOX_RETRY_BASE_SECONDS', '5'))
+OUTBOX_RETRY_MAX_SECONDS = int(os.getenv('OUTBOX_RETRY_MAX_SECONDS', '600'))
+
 # Define the default queue for I/O-bound tasks and a new queue for CPU-bound tasks.
 CELERY_TASK_QUEUES = (
     Queue('celery', routing_key='celery'),
     Queue('cpu_intensive', routing_key='cpu_intensive'),
     Queue('celery_beat', routing_key='celery_beat'), # Dedicated queue for beat tasks
+    Queue(QUEUE_FLOW_TURNS, routing_key=QUEUE_FLOW_TURNS),
+    Queue(QUEUE_CONVERSATIONAL_SENDS, routing_key=QUEUE_CONVERSATIONAL_SENDS),
+    Queue(QUEUE_BULK_SENDS, routing_key=QUEUE_BULK_SENDS),
+    Queue(QUEUE_BACKGROUND_SYNC, routing_key=QUEUE_BACKGROUND_SYNC),
 )
 
 CELERY_DEFAULT_QUEUE = 'celery'
@@ -242,13 +267,42 @@ CELERY_TASK_ROUTES = {
         'queue': 'cpu_intensive',
         'routing_key': 'cpu_intensive',
     },
+    'conversations.tasks.dispatch_broadcast_task': {
+        'queue': 'cpu_intensive',
+        'routing_key': 'cpu_intensive',
+    },
     # Route all beat schedule tasks to the 'celery_beat' queue.
     # This ensures they are picked up by a worker that is not busy with other tasks.
     'customer_data.tasks.check_for_birthdays_and_dispatch_messages': {'queue': 'celery_beat'},
     'notifications.tasks.check_and_send_24h_window_reminders': {'queue': 'celery_beat'},
     'conversations.tasks.run_fail_stuck_messages_command': {'queue': 'celery_beat'},
+    'conversations.tasks.flush_broadcast_counters_task': {'queue': 'celery_beat'},
+    'conversations.tasks.flush_contact_last_seen_task': {'queue': 'celery_beat'},
+    'conversations.tasks.ensure_table_partitions_task': {'queue': 'celery_beat'},
+    'outbox.tasks.relay_outbox_task': {'queue': 'celery_beat'},
+    'flows.tasks.sweep_expired_human_interventions_task': {'queue': 'celery_beat'},
+    'flows.tasks.reap_stale_flow_states_task': {'queue': 'celery_beat'},
+    'meta_integration.tasks.drain_parked_messages_task': {'queue': 'celery_beat'},
     # It's good practice to also route the debug task if you use it with beat for testing.
     'whatsappcrm_backend.celery.debug_task': {'queue': 'celery_beat'},
+
+    # --- Lanes ---
+    'flows.tasks.process_flow_for_message_task': {'queue': QUEUE_FLOW_TURNS},
+    'flows.tasks.process_flow_timer_events_task': {'queue': QUEUE_FLOW_TURNS},
+    'flows.tasks.process_flow_state_timeouts_task': {'queue': QUEUE_FLOW_TURNS},
+    # send_whatsapp_message_task defaults to the conversational lane; bulk callers
+    # (broadcasts, birthdays, dead-letter requeues) pass queue=QUEUE_BULK_SENDS explicitly.
+    'meta_integration.tasks.send_whatsapp_message_task': {'queue': QUEUE_CONVERSATIONAL_SENDS},
+    'meta_integration.tasks.send_message_sequence_task': {'queue': QUEUE_CONVERSATIONAL_SENDS},
+    'meta_integration.tasks.send_read_receipt_task': {'queue': QUEUE_CONVERSATIONAL_SENDS},
+    'flows.tasks.resolve_human_intervention_after_timeout': {'queue': QUEUE_CONVERSATIONAL_SENDS},
+    'notifications.tasks.dispatch_notification_task': {'queue': QUEUE_CONVERSATIONAL_SENDS},
+    'paynow_integration.send_payment_failure_notification_task': {'queue': QUEUE_CONVERSATIONAL_SENDS},
+    'paynow_integration.send_giving_confirmation_whatsapp': {'queue': QUEUE_CONVERSATIONAL_SENDS},
+    'customer_data.tasks.send_birthday_whatsapp_message': {'queue': QUEUE_BULK_SENDS},
+    'paynow_integration.poll_paynow_transaction_status': {'queue': QUEUE_BACKGROUND_SYNC},
+    'paynow_integration.process_paynow_ipn_task': {'queue': QUEUE_BACKGROUND_SYNC},
+    'media_manager.tasks.check_and_resync_whatsapp_media': {'queue': QUEUE_BACKGROUND_SYNC},
 }
 
 # Explicitly define all modules that contain Celery tasks.
@@ -260,6 +314,7 @@ CELERY_IMPORTS = (
     'media_manager.tasks',
     'meta_integration.tasks',
     'notifications.tasks',
+    'outbox.tasks',
     'paynow_integration.tasks',
     'whatsappcrm_backend.celery', # For the debug_task
 )
@@ -280,6 +335,34 @@ CHANNEL_LAYERS = {
     },
 }
 
+# --- Cache Configuration ---
+# django-redis backs the default cache. Besides regular caching, its raw client
+# (django_redis.get_redis_connection("default")) is used for shared counters and
+# buffers that must be visible across web and worker processes.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        # Database 2 keeps cache keys apart from the Celery broker (0) and channel layer (1).
+        "LOCATION": os.getenv('REDIS_CACHE_URL', 'redis://localhost:6379/2'),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        },
+    },
+    # Side cache for large flow context values (e.g. query_model results), see
+    # flows.context_store. Values are plain JSON-like data, so they are stored
+    # msgpack-encoded and compressed rather than pickled.
+    "flow_context": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.getenv('REDIS_CACHE_URL', 'redis://localhost:6379/2'),
+        "KEY_PREFIX": "flowctx",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "SERIALIZER": "django_redis.serializers.msgpack.MSGPackSerializer",
+            "COMPRESSOR": "django_redis.compressors.zlib.ZlibCompressor",
+        },
+    },
+}
+
 # For Celery Beat (scheduled tasks)
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 CELERY_BEAT_SCHEDULE = {
@@ -301,12 +384,112 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': crontab(minute='*/10'),
         'args': (),
     },
+    'flush-broadcast-counters': {
+        'task': 'conversations.tasks.flush_broadcast_counters_task',
+        # Folds the Redis-buffered broadcast status counters into the database.
+        'schedule': timedelta(seconds=int(os.getenv('BROADCAST_COUNTER_FLUSH_SECONDS', '15'))),
+        'args': (),
+    },
+    'flush-contact-last-seen': {
+        'task': 'conversations.tasks.flush_contact_last_seen_task',
+        # Writes the Redis-buffered last_seen of contacts with new inbound messages.
+        'schedule': timedelta(seconds=int(os.getenv('CONTACT_LAST_SEEN_FLUSH_SECONDS', '5'))),
+        'args': (),
+    },
+    'ensure-table-partitions': {
+        'task': 'conversations.tasks.ensure_table_partitions_task',
+        # Creates next months' partitions of partitioned tables; a no-op until they are converted.
+        'schedule': crontab(hour=3, minute=30),
+        'args': (),
+    },
+    'drain-parked-messages': {
+        'task': 'meta_integration.tasks.drain_parked_messages_task',
+        # Probes a half-open Meta API circuit and drains messages parked during an outage.
+        'schedule': timedelta(seconds=30),
+        'args': (),
+    },
+    'sweep-expired-human-interventions': {
+        'task': 'flows.tasks.sweep_expired_human_interventions_task',
+        # Re-enables the bot for contacts whose human handover timed out.
+        'schedule': timedelta(seconds=int(os.getenv('HUMAN_INTERVENTION_SWEEP_SECONDS', '30'))),
+        'args': (),
+    },
+    'reap-stale-flow-states': {
+        'task': 'flows.tasks.reap_stale_flow_states_task',
+        # Removes flow states (and their context blobs) left idle beyond their flow's TTL.
+        'schedule': crontab(minute=15),
+        'args': (),
+    },
+    'relay-outbox-fallback': {
+        'task': 'outbox.tasks.relay_outbox_task',
+        # Safety net in case the relay_outbox process is down; normally finds nothing to do.
+        'schedule': timedelta(seconds=30),
+        'args': (),
+    },
 }
 
 
 # --- Application-Specific Settings ---
 CONVERSATION_EXPIRY_DAYS = int(os.getenv('CONVERSATION_EXPIRY_DAYS', '60'))
+# Expired messages and webhook logs are archived to gzipped JSON Lines files before deletion.
+# An 'archive' entry in STORAGES (e.g. an S3 bucket) takes precedence over ARCHIVE_ROOT.
+ARCHIVE_ROOT = os.getenv('ARCHIVE_ROOT', str(BASE_DIR / 'archive'))
+ARCHIVE_MAX_ROWS_PER_FILE = int(os.getenv('ARCHIVE_MAX_ROWS_PER_FILE', '50000'))
+# Monthly partitioning of Message and WebhookEventLog (manage.py partition_tables --convert).
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+PARTITION_LOCK_TIMEOUT = os.getenv('PARTITION_LOCK_TIMEOUT', '10s')
 ADMIN_WHATSAPP_NUMBER = os.getenv('ADMIN_WHATSAPP_NUMBER', None) # e.g., '15551234567'
+# --- Meta Graph API Circuit Breaker ---
+# The circuit opens when, over the rolling window, the share of failed (network/5xx/429)
+# or slow calls reaches its threshold. While open, outbound messages are parked.
+META_API_CIRCUIT_WINDOW_SECONDS = int(os.getenv('META_API_CIRCUIT_WINDOW_SECONDS', '60'))
+META_API_CIRCUIT_MIN_CALLS = int(os.getenv('META_API_CIRCUIT_MIN_CALLS', '10'))
+META_API_CIRCUIT_ERROR_RATE = float(os.getenv('META_API_CIRCUIT_ERROR_RATE', '0.5'))
+META_API_CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv('META_API_CIRCUIT_SLOW_CALL_SECONDS', '5'))
+META_API_CIRCUIT_SLOW_RATE = float(os.getenv('META_API_CIRCUIT_SLOW_RATE', '0.5'))
+META_API_CIRCUIT_OPEN_SECONDS = int(os.getenv('META_API_CIRCUIT_OPEN_SECONDS', '30'))
+
+# Transient send failures are retried with exponential backoff and full jitter, capped
+# at META_SEND_RETRY_MAX_SECONDS. Permanent Meta errors are dead-lettered immediately.
+META_SEND_RETRY_BASE_SECONDS = int(os.getenv('META_SEND_RETRY_BASE_SECONDS', '5'))
+META_SEND_RETRY_MAX_SECONDS = int(os.getenv('META_SEND_RETRY_MAX_SECONDS', '600'))
+
+# How long a flow-initiated human handover waits for staff before the bot takes over again.
+HUMAN_INTERVENTION_TIMEOUT_SECONDS = int(os.getenv('HUMAN_INTERVENTION_TIMEOUT_SECONDS', '300'))
+# Idle time after which a contact's flow state is reaped, for flows without their own state_ttl_seconds.
+FLOW_STATE_DEFAULT_TTL_SECONDS = int(os.getenv('FLOW_STATE_DEFAULT_TTL_SECONDS', str(7 * 86400)))
+# Size budget for a contact's flow context. Values over the per-value limit move to the
+# 'flow_context' side cache (kept as long as the owning flow state can live, and at least
+# FLOW_CONTEXT_SIDE_CACHE_TTL_SECONDS); the largest values are dropped if the whole context
+# is still over budget.
+FLOW_CONTEXT_MAX_BYTES = int(os.getenv('FLOW_CONTEXT_MAX_BYTES', str(32 * 1024)))
+FLOW_CONTEXT_MAX_VALUE_BYTES = int(os.getenv('FLOW_CONTEXT_MAX_VALUE_BYTES', str(4 * 1024)))
+FLOW_CONTEXT_SIDE_CACHE_TTL_SECONDS = int(os.getenv('FLOW_CONTEXT_SIDE_CACHE_TTL_SECONDS', '86400'))
+# query_model results on these (catalogue-style) models are shared between contacts and
+# invalidated on save/delete of the model; QUERY_MODEL_CACHE_TTL_SECONDS bounds staleness otherwise.
+QUERY_MODEL_CACHE_MODELS = [
+    label.strip() for label in
+    os.getenv('QUERY_MODEL_CACHE_MODELS', 'church_services.Event,church_services.Sermon,church_services.Ministry').split(',')
+    if label.strip()
+]
+QUERY_MODEL_CACHE_TTL_SECONDS = int(os.getenv('QUERY_MODEL_CACHE_TTL_SECONDS', '300'))
+# Contact detail responses carry only the latest messages; older ones page through the
+# keyset messages endpoint. The window is cached per contact and latest message.
+CONTACT_DETAIL_MESSAGE_WINDOW = int(os.getenv('CONTACT_DETAIL_MESSAGE_WINDOW', '50'))
+CONTACT_DETAIL_CACHE_TTL_SECONDS = int(os.getenv('CONTACT_DETAIL_CACHE_TTL_SECONDS', '300'))
+# Message search ranks only this many of the newest full-text matches.
+SEARCH_MESSAGE_RANK_CANDIDATES = int(os.getenv('SEARCH_MESSAGE_RANK_CANDIDATES', '1000'))
+# Conversation WebSocket events are buffered per process and published in batches this often.
+REALTIME_FLUSH_INTERVAL_MS = int(os.getenv('REALTIME_FLUSH_INTERVAL_MS', '100'))
+# Clients reconnecting with ?since=<seq> are backfilled from a per-conversation Redis ring
+# buffer of this many events; conversations stay "watched" this long after a disconnect.
+REALTIME_STREAM_BUFFER_SIZE = int(os.getenv('REALTIME_STREAM_BUFFER_SIZE', '200'))
+REALTIME_STREAM_BUFFER_TTL_SECONDS = int(os.getenv('REALTIME_STREAM_BUFFER_TTL_SECONDS', '3600'))
+REALTIME_RESUME_GRACE_SECONDS = int(os.getenv('REALTIME_RESUME_GRACE_SECONDS', '120'))
+
+# Broadcast audiences at or above this size are personalized and dispatched by a task on the
+# cpu_intensive lane instead of during the send-template request.
+BROADCAST_RENDER_TASK_THRESHOLD = int(os.getenv('BROADCAST_RENDER_TASK_THRESHOLD', '5000'))
 
 # --- Church Details ---
 # Centralized details for use in templates, exports, and messages.
@@ -347,6 +530,7 @@ LOGGING = {
         'conversations': {'handlers': ['console'], 'level': 'DEBUG', 'propagate': True},
         'flows': {'handlers': ['console'], 'level': 'DEBUG', 'propagate': True},
         'customer_data': {'handlers': ['console'], 'level': 'DEBUG', 'propagate': True},
+        'outbox': {'handlers': ['console'], 'level': 'INFO', 'propagate': True},
     },
 }
 